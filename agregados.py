@@ -0,0 +1,167 @@
+"""Resumen de cumplimiento por finca, lote, motosierrista y mes.
+
+El almacén mantiene la tabla ``agregados`` al día en la misma transacción en
+que guarda, cambia o borra tocones: cada tocón aporta un conteo, sus banderas
+de cumplimiento y la suma y suma de cuadrados de cada ratio, y al cambiar se
+resta su aporte anterior. Con sumas (en lugar de medias) los aportes se
+pueden quitar y los meses se pueden juntar, así que el tablero solo lee unas
+pocas filas. No importa Kivy.
+"""
+import json
+import math
+from dataclasses import asdict, dataclass
+
+from calculos import calcular_ratios_tocon
+
+DIMENSIONES = ['finca', 'lote', 'motosierrista']
+# Fila con el total de todas las evaluaciones
+TOTAL = 'total'
+
+_CONTADORES = ['n', 'n_ct_ok', 'n_cd_ok', 'n_ab_ok', 'n_cumple',
+               'suma_ct', 'suma2_ct', 'suma_cd', 'suma2_cd', 'suma_ab', 'suma2_ab']
+
+ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS agregados (
+    dimension TEXT NOT NULL,
+    clave TEXT NOT NULL,
+    mes TEXT NOT NULL,
+    evaluaciones INTEGER NOT NULL DEFAULT 0,
+    {', '.join(f'{c} REAL NOT NULL DEFAULT 0' for c in _CONTADORES)},
+    PRIMARY KEY (dimension, clave, mes)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+
+@dataclass
+class Agregado:
+    """Resumen de un grupo; los ratios se expresan en % como en el formulario."""
+    clave: str
+    evaluaciones: int
+    n: int
+    n_ct_ok: int
+    n_cd_ok: int
+    n_ab_ok: int
+    n_cumple: int
+    suma_ct: float
+    suma2_ct: float
+    suma_cd: float
+    suma2_cd: float
+    suma_ab: float
+    suma2_ab: float
+
+    def tasa(self, contador):
+        return getattr(self, contador) / self.n * 100 if self.n else math.nan
+
+    def media(self, ratio):
+        return getattr(self, f'suma_{ratio}') / self.n if self.n else math.nan
+
+    def varianza(self, ratio):
+        """Varianza muestral del ratio ('ct', 'cd' o 'ab')."""
+        if self.n < 2:
+            return math.nan
+        suma = getattr(self, f'suma_{ratio}')
+        return max(0.0, (getattr(self, f'suma2_{ratio}') - suma * suma / self.n) / (self.n - 1))
+
+    def desviacion(self, ratio):
+        return math.sqrt(self.varianza(ratio))
+
+
+def firma_umbrales(umbrales):
+    return json.dumps(asdict(umbrales), sort_keys=True)
+
+
+def claves_grupo(finca, lote, motosierrista, fecha_evaluacion):
+    """Grupos (dimension, clave, mes) a los que aporta un tocón de esta evaluación."""
+    mes = (fecha_evaluacion or '')[:7]
+    return [(TOTAL, '', mes), ('finca', finca, mes),
+            ('lote', f'{finca} / {lote}', mes), ('motosierrista', motosierrista, mes)]
+
+
+def aporte(d, ct, cd, ab, umbrales):
+    """Aporte de un tocón a los contadores, o None si sus ratios no se pueden calcular."""
+    if d is None:
+        return None
+    ct_d, cd_d, ab_d, ct_ok, cd_ok, ab_ok = calcular_ratios_tocon(d, ct, cd, ab, umbrales)
+    if ct_d != ct_d or cd_d != cd_d or ab_d != ab_d:
+        return None
+    return (1, ct_ok, cd_ok, ab_ok, ct_ok and cd_ok and ab_ok,
+            ct_d, ct_d * ct_d, cd_d, cd_d * cd_d, ab_d, ab_d * ab_d)
+
+
+_SQL_APLICAR = (
+    f'INSERT INTO agregados (dimension, clave, mes, evaluaciones, {", ".join(_CONTADORES)}) '
+    f'VALUES (?, ?, ?, ?, {", ".join("?" * len(_CONTADORES))}) '
+    'ON CONFLICT (dimension, clave, mes) DO UPDATE SET evaluaciones = evaluaciones + excluded.evaluaciones, '
+    + ', '.join(f'{c} = {c} + excluded.{c}' for c in _CONTADORES))
+
+
+def aplicar(con, grupos, valores=None, signo=1, evaluaciones=0):
+    """Suma (o resta, con ``signo=-1``) un aporte a cada grupo dentro de la transacción de ``con``."""
+    if valores is None and not evaluaciones:
+        return
+    valores = [signo * float(v) for v in valores] if valores else [0.0] * len(_CONTADORES)
+    con.executemany(_SQL_APLICAR, [(*grupo, signo * evaluaciones, *valores) for grupo in grupos])
+
+
+def reconstruir(con, umbrales):
+    """Recalcula la tabla desde cero (p. ej. tras cambiar los umbrales)."""
+    totales = {}
+
+    def sumar(grupo, valores, evaluaciones):
+        fila = totales.setdefault(grupo, [0] + [0.0] * len(_CONTADORES))
+        fila[0] += evaluaciones
+        if valores:
+            for i, valor in enumerate(valores, 1):
+                fila[i] += valor
+
+    for fila in con.execute("SELECT finca, lote, motosierrista, fecha_evaluacion, estado "
+                            "FROM evaluaciones WHERE estado = 'completa'"):
+        for grupo in claves_grupo(*tuple(fila)[:4]):
+            sumar(grupo, None, 1)
+    for fila in con.execute('SELECT e.finca, e.lote, e.motosierrista, e.fecha_evaluacion, '
+                            't.d, t.ct, t.cd, t.ab FROM tocones t '
+                            'JOIN evaluaciones e ON e.id = t.evaluacion_id'):
+        valores = aporte(*tuple(fila)[4:], umbrales)
+        if valores is not None:
+            for grupo in claves_grupo(*tuple(fila)[:4]):
+                sumar(grupo, valores, 0)
+    con.execute('DELETE FROM agregados')
+    con.executemany(_SQL_APLICAR, [(*grupo, *valores) for grupo, valores in totales.items()])
+    con.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('umbrales_agregados', ?)",
+                (firma_umbrales(umbrales),))
+
+
+def al_dia(con, umbrales):
+    fila = con.execute("SELECT valor FROM meta WHERE clave = 'umbrales_agregados'").fetchone()
+    return fila is not None and fila[0] == firma_umbrales(umbrales)
+
+
+def consultar(con, dimension, mes=None):
+    """Agregados de una dimensión (de todos los meses o de uno 'aaaa-mm'), peor cumplimiento primero."""
+    condiciones, parametros = ['dimension = ?'], [dimension]
+    if mes is not None:
+        condiciones.append('mes = ?')
+        parametros.append(mes)
+    filas = con.execute(
+        f'SELECT clave, SUM(evaluaciones), {", ".join(f"SUM({c})" for c in _CONTADORES)} '
+        f'FROM agregados WHERE {" AND ".join(condiciones)} GROUP BY clave '
+        'HAVING SUM(n) > 0.5 OR SUM(evaluaciones) > 0', parametros).fetchall()
+    agregados = []
+    for fila in filas:
+        clave, evaluaciones, *valores = tuple(fila)
+        # Las restas en coma flotante dejan residuos; los conteos se redondean
+        enteros = [int(round(v)) for v in valores[:5]]
+        agregados.append(Agregado(clave, int(evaluaciones), *enteros, *valores[5:]))
+    agregados.sort(key=lambda a: (a.tasa('n_cumple') if a.n else 101, a.clave))
+    return agregados
+
+
+def meses(con):
+    return [fila[0] for fila in con.execute(
+        "SELECT DISTINCT mes FROM agregados WHERE dimension = ? AND mes != '' "
+        'AND n > 0.5 ORDER BY mes DESC', (TOTAL,))]
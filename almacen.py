@@ -0,0 +1,435 @@
+"""Almacén local de evaluaciones en SQLite.
+
+Guarda el encabezado y cada tocón a medida que se ingresan, de modo que un
+cierre inesperado no pierde la sesión y las evaluaciones pasadas se pueden
+listar, reabrir y volver a exportar sin leer los Excel generados.
+"""
+import sqlite3
+import threading
+import uuid
+from dataclasses import dataclass, field, make_dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import agregados
+from calculos import UMBRALES
+import esquema
+
+CAMPOS_ENCABEZADO = [campo.nombre for campo in esquema.CAMPOS_ENCABEZADO]
+# Tamaño de muestra del protocolo original
+MUESTRA_POR_DEFECTO = 12
+CAMPOS_MEDIDAS = [campo.nombre for campo in esquema.CAMPOS_TOCON]
+CAMPOS_RATIOS = [campo.nombre for campo in esquema.CAMPOS_RATIO]
+# Todo lo que se guarda de un tocón además de su número, en el orden de la tabla
+CAMPOS_GUARDADOS = [campo.nombre for campo in esquema.CAMPOS_TOCON_GUARDADOS]
+
+_TIPO_SQL = {'numero': 'REAL', 'entero': 'INTEGER'}
+_COLUMNAS_TOCON = {campo.nombre: _TIPO_SQL.get(campo.tipo, 'TEXT')
+                   for campo in esquema.CAMPOS_TOCON_GUARDADOS}
+_DEFINICION_TOCON = ''.join(f'    {columna} {tipo},\n' for columna, tipo in _COLUMNAS_TOCON.items())
+
+_ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS evaluaciones (
+    id INTEGER PRIMARY KEY,
+    finca TEXT NOT NULL DEFAULT '',
+    lote TEXT NOT NULL DEFAULT '',
+    especie TEXT NOT NULL DEFAULT '',
+    plantacion TEXT NOT NULL DEFAULT '',
+    evaluacion TEXT NOT NULL DEFAULT '',
+    fecha_evaluacion TEXT,
+    supervisor TEXT NOT NULL DEFAULT '',
+    evaluador TEXT NOT NULL DEFAULT '',
+    motosierrista TEXT NOT NULL DEFAULT '',
+    edad REAL,
+    muestra INTEGER NOT NULL DEFAULT 12,
+    estado TEXT NOT NULL DEFAULT 'en_curso',
+    archivo TEXT,
+    creada TEXT NOT NULL,
+    actualizada TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_evaluaciones_finca_lote ON evaluaciones (finca, lote);
+CREATE INDEX IF NOT EXISTS idx_evaluaciones_lote ON evaluaciones (lote);
+CREATE INDEX IF NOT EXISTS idx_evaluaciones_fecha ON evaluaciones (fecha_evaluacion);
+CREATE INDEX IF NOT EXISTS idx_evaluaciones_motosierrista ON evaluaciones (motosierrista);
+
+CREATE TABLE IF NOT EXISTS tocones (
+    evaluacion_id INTEGER NOT NULL REFERENCES evaluaciones (id) ON DELETE CASCADE,
+    numero INTEGER NOT NULL,
+{_DEFINICION_TOCON}    PRIMARY KEY (evaluacion_id, numero)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS firmas (
+    evaluacion_id INTEGER NOT NULL REFERENCES evaluaciones (id) ON DELETE CASCADE,
+    rol TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (evaluacion_id, rol)
+) WITHOUT ROWID;
+
+-- Evaluaciones completas pendientes de subir al servidor central
+CREATE TABLE IF NOT EXISTS bandeja_salida (
+    evaluacion_id INTEGER PRIMARY KEY REFERENCES evaluaciones (id) ON DELETE CASCADE,
+    clave TEXT NOT NULL UNIQUE,
+    encolada TEXT NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    proximo_intento TEXT NOT NULL,
+    ultimo_error TEXT,
+    enviada TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_bandeja_pendientes ON bandeja_salida (enviada, proximo_intento);
+"""
+
+# Columnas agregadas después de la primera versión: (tabla, columna, definición).
+# Las de tocones salen del esquema: un campo nuevo en él se agrega solo.
+_MIGRACIONES = [('evaluaciones', 'muestra', 'INTEGER NOT NULL DEFAULT 12')] + [
+    ('tocones', columna, tipo) for columna, tipo in _COLUMNAS_TOCON.items()]
+
+
+def _como_datos(self):
+    """Devuelve el tocón como el dict numérico que usan las pantallas."""
+    return {campo: getattr(self, campo) for campo in CAMPOS_GUARDADOS}
+
+
+_TIPO_PYTHON = {'numero': float, 'entero': int}
+# Un tocón guardado: su número y un atributo por campo de CAMPOS_TOCON_GUARDADOS
+Tocon = make_dataclass(
+    'Tocon',
+    [('numero', int)] + [(campo.nombre, Optional[_TIPO_PYTHON.get(campo.tipo, str)],
+                          field(default=None))
+                         for campo in esquema.CAMPOS_TOCON_GUARDADOS],
+    namespace={'como_datos': _como_datos})
+Tocon.__module__ = __name__
+
+
+@dataclass
+class Evaluacion:
+    id: int
+    finca: str
+    lote: str
+    especie: str
+    plantacion: str
+    evaluacion: str
+    supervisor: str
+    evaluador: str
+    motosierrista: str
+    edad: Optional[float]
+    muestra: int
+    estado: str
+    archivo: Optional[str]
+    creada: str
+    actualizada: str
+    num_tocones: int = 0
+    tocones: List[Tocon] = field(default_factory=list)
+    # Firmas en formato vectorial de ``firmas.serializar``, por rol
+    firmas: Dict[str, bytes] = field(default_factory=dict)
+
+    def encabezado(self):
+        """Devuelve el encabezado como el dict de texto que usan las pantallas."""
+        datos = {campo: getattr(self, campo) for campo in CAMPOS_ENCABEZADO}
+        datos['edad'] = '' if self.edad is None else str(self.edad)
+        return datos
+
+
+def numero_o_nada(texto):
+    """Convierte el texto de un campo a float; acepta coma decimal y '65.0% ✅'."""
+    if texto is None:
+        return None
+    if isinstance(texto, (int, float)):
+        return float(texto)
+    texto = texto.strip().split('%')[0].strip().replace(',', '.')
+    try:
+        return float(texto)
+    except ValueError:
+        return None
+
+
+def fecha_iso(texto):
+    try:
+        return datetime.strptime(texto, '%d/%m/%Y').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+
+def _ahora():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class AlmacenEvaluaciones:
+    """Acceso a la base SQLite (modo WAL) compartido entre la UI y los hilos de trabajo.
+
+    ``umbrales`` decide qué tocones cuentan como cumplidos en los agregados.
+    """
+
+    def __init__(self, ruta, umbrales=UMBRALES):
+        self.ruta = ruta
+        self.umbrales = umbrales
+        self._bloqueo = threading.RLock()
+        self._con = sqlite3.connect(ruta, check_same_thread=False)
+        self._con.row_factory = sqlite3.Row
+        self._con.execute('PRAGMA journal_mode=WAL')
+        # En WAL, NORMAL solo arriesga la última transacción ante un corte de luz
+        self._con.execute('PRAGMA synchronous=NORMAL')
+        self._con.execute('PRAGMA foreign_keys=ON')
+        with self._con:
+            self._con.executescript(_ESQUEMA)
+            self._con.executescript(agregados.ESQUEMA)
+            self._migrar()
+            if not agregados.al_dia(self._con, umbrales):
+                agregados.reconstruir(self._con, umbrales)
+
+    def _migrar(self):
+        existentes = {}
+        for tabla, columna, definicion in _MIGRACIONES:
+            if tabla not in existentes:
+                existentes[tabla] = {fila['name'] for fila in
+                                     self._con.execute(f'PRAGMA table_info({tabla})')}
+            if columna not in existentes[tabla]:
+                self._con.execute(f'ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}')
+
+    def cerrar(self):
+        with self._bloqueo:
+            self._con.close()
+
+    def guardar_encabezado(self, datos, evaluacion_id=None):
+        """Crea o actualiza el encabezado y devuelve el id de la evaluación."""
+        valores = {campo: datos.get(campo, '') for campo in CAMPOS_ENCABEZADO}
+        valores['edad'] = numero_o_nada(valores['edad'])
+        valores['muestra'] = int(valores['muestra'] or MUESTRA_POR_DEFECTO)
+        valores['fecha_evaluacion'] = fecha_iso(valores['evaluacion'])
+        valores['actualizada'] = _ahora()
+        with self._bloqueo, self._con:
+            if evaluacion_id is not None:
+                anteriores = self._grupos(evaluacion_id)
+                asignaciones = ', '.join(f'{campo} = :{campo}' for campo in valores)
+                cursor = self._con.execute(
+                    f'UPDATE evaluaciones SET {asignaciones} WHERE id = :id',
+                    dict(valores, id=evaluacion_id))
+                if cursor.rowcount:
+                    if self._grupos(evaluacion_id) != anteriores:
+                        self._mover_aportes(evaluacion_id, anteriores)
+                    return evaluacion_id
+            valores['creada'] = valores['actualizada']
+            columnas = ', '.join(valores)
+            marcadores = ', '.join(f':{campo}' for campo in valores)
+            cursor = self._con.execute(
+                f'INSERT INTO evaluaciones ({columnas}) VALUES ({marcadores})', valores)
+            return cursor.lastrowid
+
+    def guardar_tocon(self, evaluacion_id, tocon):
+        columnas = ['evaluacion_id', 'numero'] + CAMPOS_GUARDADOS
+        valores = [evaluacion_id, tocon.numero] + [getattr(tocon, campo) for campo in CAMPOS_GUARDADOS]
+        with self._bloqueo, self._con:
+            grupos = self._grupos(evaluacion_id)
+            anterior = self._con.execute(
+                'SELECT d, ct, cd, ab FROM tocones WHERE evaluacion_id = ? AND numero = ?',
+                (evaluacion_id, tocon.numero)).fetchone()
+            if anterior is not None:
+                agregados.aplicar(self._con, grupos, self._aporte(*anterior), -1)
+            self._con.execute(
+                f'INSERT OR REPLACE INTO tocones ({", ".join(columnas)}) '
+                f'VALUES ({", ".join("?" * len(columnas))})', valores)
+            agregados.aplicar(self._con, grupos,
+                              self._aporte(tocon.d, tocon.ct, tocon.cd, tocon.ab))
+            self._con.execute('UPDATE evaluaciones SET actualizada = ? WHERE id = ?',
+                              (_ahora(), evaluacion_id))
+
+    def guardar_firma(self, evaluacion_id, rol, vector):
+        """Guarda la firma de un rol ('evaluador' o 'motosierrista'); None la borra."""
+        with self._bloqueo, self._con:
+            if vector is None:
+                self._con.execute('DELETE FROM firmas WHERE evaluacion_id = ? AND rol = ?',
+                                  (evaluacion_id, rol))
+            else:
+                self._con.execute(
+                    'INSERT OR REPLACE INTO firmas (evaluacion_id, rol, vector) VALUES (?, ?, ?)',
+                    (evaluacion_id, rol, vector))
+
+    def marcar_exportada(self, evaluacion_id, archivo):
+        with self._bloqueo, self._con:
+            fila = self._con.execute('SELECT estado FROM evaluaciones WHERE id = ?',
+                                     (evaluacion_id,)).fetchone()
+            if fila is not None and fila['estado'] != 'completa':
+                agregados.aplicar(self._con, self._grupos(evaluacion_id), evaluaciones=1)
+            self._con.execute(
+                "UPDATE evaluaciones SET estado = 'completa', archivo = ?, actualizada = ? "
+                "WHERE id = ?", (archivo, _ahora(), evaluacion_id))
+
+    def eliminar(self, evaluacion_id):
+        with self._bloqueo, self._con:
+            self._quitar_aportes(evaluacion_id, self._grupos(evaluacion_id))
+            self._con.execute('DELETE FROM evaluaciones WHERE id = ?', (evaluacion_id,))
+
+    # --- Agregados de cumplimiento -------------------------------------------
+
+    def _aporte(self, d, ct, cd, ab):
+        return agregados.aporte(d, ct, cd, ab, self.umbrales)
+
+    def _grupos(self, evaluacion_id):
+        fila = self._con.execute(
+            'SELECT finca, lote, motosierrista, fecha_evaluacion FROM evaluaciones WHERE id = ?',
+            (evaluacion_id,)).fetchone()
+        return None if fila is None else agregados.claves_grupo(*fila)
+
+    def _quitar_aportes(self, evaluacion_id, grupos, signo=-1):
+        if grupos is None:
+            return
+        completa = self._con.execute('SELECT estado FROM evaluaciones WHERE id = ?',
+                                     (evaluacion_id,)).fetchone()['estado'] == 'completa'
+        agregados.aplicar(self._con, grupos, signo=signo, evaluaciones=int(completa))
+        for tocon in self._con.execute('SELECT d, ct, cd, ab FROM tocones WHERE evaluacion_id = ?',
+                                       (evaluacion_id,)).fetchall():
+            agregados.aplicar(self._con, grupos, self._aporte(*tocon), signo)
+
+    def _mover_aportes(self, evaluacion_id, anteriores):
+        self._quitar_aportes(evaluacion_id, anteriores)
+        self._quitar_aportes(evaluacion_id, self._grupos(evaluacion_id), signo=1)
+
+    def resumen_cumplimiento(self, dimension, mes=None):
+        """Agregados por 'finca', 'lote', 'motosierrista' o 'total', peor cumplimiento primero."""
+        with self._bloqueo:
+            return agregados.consultar(self._con, dimension, mes)
+
+    def meses_con_datos(self):
+        with self._bloqueo:
+            return agregados.meses(self._con)
+
+    def listar_evaluaciones(self, finca=None, lote=None, motosierrista=None,
+                            desde=None, hasta=None, estado=None, limite=100, inicio=0):
+        """Lista evaluaciones (sin tocones) de la más reciente a la más antigua.
+
+        ``desde`` y ``hasta`` son fechas de evaluación en formato dd/mm/aaaa;
+        ``inicio`` salta las primeras evaluaciones, para listar por páginas.
+        """
+        condiciones = []
+        parametros = []
+        for columna, valor in (('finca', finca), ('lote', lote),
+                               ('motosierrista', motosierrista), ('estado', estado)):
+            if valor is not None:
+                condiciones.append(f'e.{columna} = ?')
+                parametros.append(valor)
+        if desde is not None:
+            condiciones.append('e.fecha_evaluacion >= ?')
+            parametros.append(fecha_iso(desde))
+        if hasta is not None:
+            condiciones.append('e.fecha_evaluacion <= ?')
+            parametros.append(fecha_iso(hasta))
+        donde = f'WHERE {" AND ".join(condiciones)}' if condiciones else ''
+        parametros.extend((limite, inicio))
+        with self._bloqueo:
+            filas = self._con.execute(
+                'SELECT e.*, (SELECT COUNT(*) FROM tocones t WHERE t.evaluacion_id = e.id) '
+                f'AS num_tocones FROM evaluaciones e {donde} '
+                'ORDER BY e.fecha_evaluacion DESC, e.id DESC LIMIT ? OFFSET ?', parametros).fetchall()
+        return [self._evaluacion(fila) for fila in filas]
+
+    def contar_evaluaciones(self):
+        with self._bloqueo:
+            return self._con.execute('SELECT COUNT(*) FROM evaluaciones').fetchone()[0]
+
+    def obtener_evaluacion(self, evaluacion_id):
+        """Devuelve la evaluación con sus tocones, o None si no existe."""
+        with self._bloqueo:
+            fila = self._con.execute('SELECT * FROM evaluaciones WHERE id = ?',
+                                     (evaluacion_id,)).fetchone()
+            if fila is None:
+                return None
+            tocones = self._con.execute(
+                'SELECT * FROM tocones WHERE evaluacion_id = ? ORDER BY numero',
+                (evaluacion_id,)).fetchall()
+            firmas = self._con.execute(
+                'SELECT rol, vector FROM firmas WHERE evaluacion_id = ?',
+                (evaluacion_id,)).fetchall()
+        evaluacion = self._evaluacion(fila)
+        evaluacion.firmas = {firma['rol']: firma['vector'] for firma in firmas}
+        evaluacion.tocones = [Tocon(**{k: t[k] for k in t.keys() if k != 'evaluacion_id'})
+                              for t in tocones]
+        evaluacion.num_tocones = len(evaluacion.tocones)
+        return evaluacion
+
+    def ultima_en_curso(self):
+        """Evaluación sin exportar más reciente, para retomar tras un cierre."""
+        with self._bloqueo:
+            fila = self._con.execute(
+                "SELECT id FROM evaluaciones WHERE estado = 'en_curso' "
+                'ORDER BY actualizada DESC LIMIT 1').fetchone()
+        return None if fila is None else self.obtener_evaluacion(fila['id'])
+
+    def nombres_usados(self, rol):
+        """Nombres distintos ya registrados como 'supervisor', 'evaluador' o 'motosierrista'."""
+        if rol not in ('supervisor', 'evaluador', 'motosierrista'):
+            raise ValueError(f'Rol desconocido: {rol}')
+        with self._bloqueo:
+            return [fila[0] for fila in self._con.execute(
+                f"SELECT DISTINCT {rol} FROM evaluaciones WHERE {rol} NOT IN ('', 'Seleccione')")]
+
+    # --- Bandeja de salida -------------------------------------------------
+
+    def encolar_envio(self, evaluacion_id):
+        """Pone la evaluación en la bandeja de salida y devuelve su clave de idempotencia.
+
+        Si ya estaba (p. ej. se volvió a exportar), conserva la clave para que el
+        servidor la reconozca y la vuelve a dejar pendiente.
+        """
+        ahora = _ahora()
+        with self._bloqueo, self._con:
+            self._con.execute(
+                'INSERT INTO bandeja_salida (evaluacion_id, clave, encolada, proximo_intento) '
+                'VALUES (?, ?, ?, ?) ON CONFLICT (evaluacion_id) DO UPDATE SET '
+                'encolada = excluded.encolada, intentos = 0, '
+                'proximo_intento = excluded.proximo_intento, ultimo_error = NULL, enviada = NULL',
+                (evaluacion_id, uuid.uuid4().hex, ahora, ahora))
+            return self._con.execute('SELECT clave FROM bandeja_salida WHERE evaluacion_id = ?',
+                                     (evaluacion_id,)).fetchone()['clave']
+
+    def pendientes_envio(self, limite=20):
+        """Devuelve [(clave, Evaluacion)] listas para enviar, las más antiguas primero."""
+        with self._bloqueo:
+            filas = self._con.execute(
+                'SELECT evaluacion_id, clave FROM bandeja_salida '
+                'WHERE enviada IS NULL AND proximo_intento <= ? '
+                'ORDER BY encolada LIMIT ?', (_ahora(), limite)).fetchall()
+        return [(fila['clave'], self.obtener_evaluacion(fila['evaluacion_id'])) for fila in filas]
+
+    def contar_pendientes_envio(self):
+        with self._bloqueo:
+            return self._con.execute(
+                'SELECT COUNT(*) FROM bandeja_salida WHERE enviada IS NULL').fetchone()[0]
+
+    def marcar_enviadas(self, claves):
+        with self._bloqueo, self._con:
+            self._con.executemany(
+                'UPDATE bandeja_salida SET enviada = ?, ultimo_error = NULL WHERE clave = ?',
+                [(_ahora(), clave) for clave in claves])
+
+    def registrar_fallo_envio(self, claves, error, espera):
+        """Anota el fallo y aplaza el próximo intento ``espera(intentos)`` segundos."""
+        with self._bloqueo, self._con:
+            for clave in claves:
+                fila = self._con.execute('SELECT intentos FROM bandeja_salida WHERE clave = ?',
+                                         (clave,)).fetchone()
+                if fila is None:
+                    continue
+                intentos = fila['intentos'] + 1
+                proximo = datetime.now() + timedelta(seconds=espera(intentos))
+                self._con.execute(
+                    'UPDATE bandeja_salida SET intentos = ?, proximo_intento = ?, ultimo_error = ? '
+                    'WHERE clave = ?',
+                    (intentos, proximo.isoformat(timespec='seconds'), str(error)[:500], clave))
+
+    def proximo_envio(self):
+        """Momento (ISO) del próximo intento pendiente, o None si la bandeja está vacía."""
+        with self._bloqueo:
+            fila = self._con.execute(
+                'SELECT MIN(proximo_intento) FROM bandeja_salida WHERE enviada IS NULL').fetchone()
+        return fila[0]
+
+    @staticmethod
+    def _evaluacion(fila):
+        datos = {k: fila[k] for k in fila.keys() if k != 'fecha_evaluacion'}
+        return Evaluacion(**datos)
+
+
+def tocon_desde_formulario(numero, datos):
+    """Convierte el dict de FormularioToconScreen en un Tocon."""
+    return Tocon(numero, **{campo.nombre: numero_o_nada(datos.get(campo.nombre))
+                            if campo.tipo in _TIPO_PYTHON else datos.get(campo.nombre) or None
+                            for campo in esquema.CAMPOS_TOCON_GUARDADOS})
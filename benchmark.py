@@ -0,0 +1,445 @@
+"""Mediciones de rendimiento del flujo de tocones sin pantalla.
+
+Cubre la importación en frío, el arranque de la app (si hay Kivy y una
+pantalla, p. ej. con xvfb-run), el cálculo de ratios, la exportación, la
+generación de QR y la captura de trazos de firma. Cada caso se repite y se
+guarda el mínimo y la mediana; el resultado es JSON y se puede comparar con
+una referencia guardada para detectar regresiones.
+
+Uso:
+    python benchmark.py --salida actual.json
+    python benchmark.py --guardar-referencia referencia.json
+    python benchmark.py --comparar referencia.json [--tolerancia 0.25]
+    python benchmark.py --solo ratios,exportacion --rapido
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+_AQUI = os.path.dirname(os.path.abspath(__file__))
+MODULOS_LOGICA = ['almacen', 'calculos', 'exportador', 'firmas', 'transferencia_qr',
+                  'sincronizacion', 'agregados', 'historico', 'informes', 'fotos', 'lotes']
+
+
+class Omitido(Exception):
+    """El caso no se puede medir en este equipo (falta un módulo o la pantalla)."""
+
+
+def medir(funcion, repeticiones=5):
+    """Ejecuta ``funcion`` varias veces y devuelve los segundos de cada ejecución."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def _resultado(tiempos, **extras):
+    return dict({'min_s': min(tiempos), 'mediana_s': statistics.median(tiempos),
+                 'repeticiones': len(tiempos)}, **extras)
+
+
+def _tocones(cantidad, semilla=1):
+    azar = random.Random(semilla)
+    tocones = {}
+    for numero in range(1, cantidad + 1):
+        d = azar.uniform(15, 45)
+        tocones[numero] = {'d': round(d, 1), 'altura': round(azar.uniform(5, 15), 1),
+                           'ct': round(d * azar.uniform(0.55, 0.75), 1),
+                           'cd': round(d * azar.uniform(0.15, 0.3), 1),
+                           'ab': round(d * azar.uniform(0.02, 0.14), 1),
+                           'altura1': round(azar.uniform(0.1, 0.4), 2)}
+    return tocones
+
+
+def _encabezado(numero=1):
+    return {'finca': 'La Esperanza', 'lote': f'L-{numero % 40}', 'especie': 'Teca',
+            'plantacion': '01/05/2016', 'evaluacion': '15/03/2026', 'supervisor': 'Supervisor',
+            'evaluador': 'Evaluador', 'motosierrista': f'Motosierrista {numero % 12}',
+            'edad': '9.9', 'muestra': 12}
+
+
+# --- Casos ------------------------------------------------------------------
+
+def caso_importacion(rapido):
+    """Importación en frío de los módulos de lógica, en un intérprete nuevo cada vez."""
+    codigo = ('import time; inicio = time.perf_counter(); '
+              f'import {", ".join(MODULOS_LOGICA)}; '
+              'print(time.perf_counter() - inicio)')
+    tiempos = []
+    for _ in range(3 if rapido else 7):
+        salida = subprocess.run([sys.executable, '-c', codigo], cwd=_AQUI, check=True,
+                                capture_output=True, text=True).stdout
+        tiempos.append(float(salida.strip().splitlines()[-1]))
+    return {'logica': _resultado(tiempos)}
+
+
+def caso_arranque(rapido):
+    """Arranque completo de la app hasta el primer cuadro y la precarga de pantallas."""
+    try:
+        import kivy  # noqa: F401
+    except ImportError:
+        raise Omitido('Kivy no está instalado') from None
+    resultados = []
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, 'arranque.jsonl')
+        entorno = dict(os.environ, TOCONES_INFORME_ARRANQUE=ruta, KIVY_NO_ARGS='1',
+                       KIVY_NO_CONSOLELOG='1')
+        for _ in range(2 if rapido else 5):
+            try:
+                subprocess.run([sys.executable, os.path.join(_AQUI, 'supervisores.py')],
+                               cwd=_AQUI, env=entorno, check=True, capture_output=True,
+                               timeout=120)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+                raise Omitido(f'la app no arrancó (¿sin pantalla?): {e}') from None
+        with open(ruta, encoding='utf-8') as f:
+            resultados = [json.loads(linea) for linea in f if linea.strip()]
+    if not resultados:
+        raise Omitido('la app no escribió el informe de arranque')
+    medidas = {'total': [r['total_ms'] / 1000 for r in resultados]}
+    for fase in resultados[0]['fases_ms']:
+        medidas[fase] = [r['fases_ms'].get(fase, 0) / 1000 for r in resultados]
+    return {fase: _resultado(tiempos) for fase, tiempos in medidas.items()}
+
+
+def caso_ratios(rapido):
+    import calculos
+    resultados = {}
+    for cantidad in (12, 1000, 100000):
+        tocones = list(_tocones(cantidad).values())
+        columnas = [[t[c] for t in tocones] for c in ('d', 'ct', 'cd', 'ab')]
+        repeticiones = 3 if cantidad >= 100000 else 20
+        for motor in ('python', 'numpy'):
+            if motor == 'numpy' and not calculos._cargar_numpy():
+                continue
+            if motor == 'python':
+                def funcion():
+                    calculos._ratios_python(*columnas, calculos.UMBRALES)
+            else:
+                def funcion():
+                    calculos._ratios_numpy(calculos._numpy, *columnas, calculos.UMBRALES)
+            tiempos = medir(funcion, 2 if rapido else repeticiones)
+            resultados[f'{motor}_{cantidad}'] = _resultado(tiempos, tocones=cantidad)
+        tiempos = medir(lambda: calculos.calcular_ratios(*columnas), 2 if rapido else repeticiones)
+        resultados[f'calcular_ratios_{cantidad}'] = _resultado(tiempos, tocones=cantidad)
+    return resultados
+
+
+def caso_exportacion(rapido):
+    from exportador import COLUMNAS_EVALUACION, escribir_filas, filas_evaluaciones
+    tocones = _tocones(12)
+    resultados = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        for cantidad in (1, 100, 10000):
+            if rapido and cantidad > 100:
+                continue
+            evaluaciones = [(_encabezado(i), tocones) for i in range(cantidad)]
+            for extension in ('xlsx', 'csv'):
+                ruta = os.path.join(carpeta, f'bench.{extension}')
+                tiempos = medir(lambda: escribir_filas(ruta, COLUMNAS_EVALUACION,
+                                                       filas_evaluaciones(evaluaciones)),
+                                1 if cantidad >= 10000 else 5)
+                resultados[f'{extension}_{cantidad}'] = _resultado(
+                    tiempos, evaluaciones=cantidad, bytes=os.path.getsize(ruta))
+    return resultados
+
+
+def caso_historico(rapido):
+    """Archivo de un año de evaluaciones y consulta de lo que va del año."""
+    from historico import Historico
+    cantidad = 500 if rapido else 5000
+    evaluaciones = []
+    for i in range(cantidad):
+        encabezado = dict(_encabezado(i), finca=f'Finca {i % 8}',
+                          evaluacion=f'{1 + i % 28:02d}/{1 + i * 12 // cantidad:02d}/2026')
+        evaluaciones.append((i + 1, encabezado, _tocones(12, semilla=i)))
+    resultados = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, 'historico.tch')
+        historico = Historico(ruta)
+        tiempos = medir(lambda: historico.agregar(*evaluaciones[0]), 20)
+        resultados['agregar_1'] = _resultado(tiempos)
+        historico.agregar_varias(evaluaciones)
+        historico.compactar()
+        tocones = cantidad * 12
+        resultados['resumen_anio'] = _resultado(
+            medir(lambda: historico.resumen(desde='01/01/2026', hasta='31/12/2026')),
+            tocones=tocones, bytes=os.path.getsize(ruta))
+        resultados['resumen_finca_trimestre'] = _resultado(
+            medir(lambda: historico.resumen(desde='01/01/2026', hasta='31/03/2026',
+                                            finca='Finca 3')))
+        resultados['leer_4_columnas'] = _resultado(
+            medir(lambda: historico.leer(['d', 'ct', 'cd', 'ab'])), tocones=tocones)
+    return resultados
+
+
+def caso_informe(rapido):
+    """Informe PDF de una evaluación; el primero paga las cachés de fuente y plantillas."""
+    import informes
+    from firmas import serializar
+    trazo = [v for x in range(0, 300, 3) for v in (x, 40 + 30 * math.sin(x / 15))]
+    firma = serializar([trazo], 300, 100)
+    firmas = {'evaluador': firma, 'motosierrista': firma}
+    resultados = {}
+    for cantidad in (12, 200):
+        tocones = _tocones(cantidad)
+        informes._plantilla_grafico.cache_clear()
+        informes.ancho_texto.cache_clear()
+        primero = medir(lambda: informes.informe_pdf(_encabezado(), tocones, firmas), 1)
+        tiempos = medir(lambda: informes.informe_pdf(_encabezado(), tocones, firmas),
+                        5 if rapido else 30)
+        resultados[f'pdf_{cantidad}'] = _resultado(
+            tiempos, primero_s=primero[0], tocones=cantidad,
+            bytes=len(informes.informe_pdf(_encabezado(), tocones, firmas)))
+    return resultados
+
+
+def caso_qr(rapido):
+    from transferencia_qr import matriz_qr, partes_evaluacion, png_qr, rgba_qr
+    resultados = {}
+    for cantidad in (12, 200):
+        tocones = _tocones(cantidad)
+        tiempos = medir(lambda: partes_evaluacion(_encabezado(), tocones), 20)
+        partes = partes_evaluacion(_encabezado(), tocones)
+        resultados[f'codificar_{cantidad}'] = _resultado(tiempos, partes=len(partes))
+        try:
+            tiempos = medir(lambda: [rgba_qr(matriz_qr(parte)) for parte in partes],
+                            2 if rapido else 5)
+        except ImportError:
+            continue
+        resultados[f'matrices_{cantidad}'] = _resultado(tiempos, partes=len(partes))
+    if 'matrices_12' not in resultados:
+        resultados['matrices'] = {'omitido': 'qrcode no está instalado'}
+    else:
+        matriz = matriz_qr(partes_evaluacion(_encabezado(), _tocones(12))[0])
+        resultados['png_compartir'] = _resultado(medir(lambda: png_qr(matriz), 5))
+    return resultados
+
+
+def caso_fotos(rapido):
+    """Reducción de una foto de cámara y miniaturas de una lista de 200 tocones."""
+    try:
+        from PIL import Image
+    except ImportError:
+        raise Omitido('PIL no está instalado') from None
+    from fotos import CacheLRU, decodificar_miniatura, procesar_foto, ruta_miniatura
+    resultados = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        captura = os.path.join(carpeta, 'captura.jpg')
+        # 12 MP, como la cámara de una tableta
+        Image.effect_noise((4000, 3000), 40).convert('RGB').save(captura, quality=90)
+        nombres = []
+        tiempos = medir(lambda: nombres.append(procesar_foto(captura, carpeta)),
+                        2 if rapido else 5)
+        resultados['procesar_12mp'] = _resultado(tiempos)
+        cache = CacheLRU(8 * 1024 * 1024)
+
+        def miniaturas():
+            for i in range(200):
+                ancho, alto, pixeles = decodificar_miniatura(
+                    ruta_miniatura(carpeta, nombres[i % len(nombres)]))
+                cache.poner(i, pixeles, len(pixeles))
+
+        resultados['miniaturas_200'] = _resultado(medir(miniaturas, 5), cache_bytes=cache.bytes,
+                                                  en_cache=len(cache))
+    return resultados
+
+
+def _lotes_geojson(lado, tamano=0.005, vertices=12):
+    """FeatureCollection de ``lado``×``lado`` lotes poligonales contiguos."""
+    features = []
+    for i in range(lado):
+        for j in range(lado):
+            cx, cy = -84.5 + (i + 0.5) * tamano, 9.5 + (j + 0.5) * tamano
+            anillo = [[cx + tamano / 2 * math.cos(2 * math.pi * k / vertices),
+                       cy + tamano / 2 * math.sin(2 * math.pi * k / vertices)]
+                      for k in range(vertices)]
+            features.append({'type': 'Feature',
+                             'properties': {'finca': f'Finca {i // 25}', 'lote': f'L-{i}-{j}'},
+                             'geometry': {'type': 'Polygon', 'coordinates': [anillo + anillo[:1]]}})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def caso_lotes(rapido):
+    """Índice de lotes: armarlo desde GeoJSON, leerlo de la caché y resolver posiciones."""
+    from lotes import cargar_indice
+    resultados = {}
+    azar = random.Random(5)
+    with tempfile.TemporaryDirectory() as carpeta:
+        for lado in (50, 100) if rapido else (50, 200):
+            ruta = os.path.join(carpeta, f'lotes_{lado}.geojson')
+            with open(ruta, 'w', encoding='utf-8') as f:
+                json.dump(_lotes_geojson(lado), f)
+            cache = os.path.join(carpeta, f'lotes_{lado}.indice')
+
+            def armar():
+                if os.path.exists(cache):
+                    os.remove(cache)
+                cargar_indice([ruta], cache)
+
+            tiempos = medir(armar, 1 if lado > 100 else 3)
+            resultados[f'armar_{lado * lado}'] = _resultado(tiempos,
+                                                            geojson_bytes=os.path.getsize(ruta))
+            resultados[f'cache_{lado * lado}'] = _resultado(
+                medir(lambda: cargar_indice([ruta], cache)), bytes=os.path.getsize(cache))
+            indice = cargar_indice([ruta], cache)
+            puntos = [(-84.5 + azar.random() * lado * 0.005, 9.5 + azar.random() * lado * 0.005)
+                      for _ in range(1000)]
+            tiempos = medir(lambda: [indice.buscar(lon, lat) for lon, lat in puntos])
+            resultados[f'buscar_1000_de_{lado * lado}'] = _resultado(
+                tiempos, encontrados=sum(indice.buscar(*punto) is not None for punto in puntos))
+    return resultados
+
+
+def _toques_firma(frecuencia=120, segundos=3.0, semilla=3):
+    """Eventos de toque de una firma: trazos curvos a ``frecuencia`` Hz con temblor de mano."""
+    azar = random.Random(semilla)
+    eventos = []
+    pasos = int(frecuencia * segundos)
+    trazos = 4
+    for trazo in range(trazos):
+        puntos = []
+        desfase = azar.uniform(0, math.pi)
+        for paso in range(pasos // trazos):
+            t = paso / frecuencia
+            x = 60 + trazo * 140 + 80 * t + 30 * math.sin(9 * t + desfase)
+            y = 120 + 50 * math.sin(5 * t + desfase) + azar.uniform(-0.6, 0.6)
+            puntos.append((x, y))
+        eventos.append(puntos)
+    return eventos
+
+
+def caso_firma(rapido):
+    """Ingesta de puntos con el mismo TrazoEnCurso de SignaturePad, sin la parte gráfica."""
+    from firmas import DESCARTADO, TrazoEnCurso, rasterizar, serializar
+    resultados = {}
+    for frecuencia in (60, 120, 240):
+        eventos = _toques_firma(frecuencia)
+        total = sum(len(trazo) for trazo in eventos)
+        guardados = []
+
+        def ingerir():
+            guardados.clear()
+            for puntos in eventos:
+                en_curso = TrazoEnCurso(*puntos[0])
+                for x, y in puntos[1:]:
+                    if en_curso.agregar(x, y) != DESCARTADO:
+                        en_curso.cortar_si_lleno()
+                en_curso.trazo.simplificar()
+                guardados.append(en_curso.trazo)
+
+        tiempos = medir(ingerir, 5 if rapido else 20)
+        resultados[f'ingesta_{frecuencia}hz'] = _resultado(
+            tiempos, eventos=total, puntos_guardados=sum(len(t) for t in guardados),
+            us_por_evento=min(tiempos) / total * 1e6,
+            # Presupuesto de un cuadro a 60 fps dedicado a este evento
+            fraccion_cuadro=min(tiempos) / total / (1 / 60))
+    vector = serializar(guardados, 640, 240)
+    resultados['serializar'] = _resultado(medir(lambda: serializar(guardados, 640, 240), 20),
+                                          bytes=len(vector))
+    resultados['rasterizar'] = _resultado(medir(lambda: rasterizar(vector), 5))
+    return resultados
+
+
+CASOS = {
+    'importacion': caso_importacion,
+    'arranque': caso_arranque,
+    'ratios': caso_ratios,
+    'exportacion': caso_exportacion,
+    'historico': caso_historico,
+    'informe': caso_informe,
+    'qr': caso_qr,
+    'fotos': caso_fotos,
+    'lotes': caso_lotes,
+    'firma': caso_firma,
+}
+
+
+def ejecutar(nombres=None, rapido=False, informar=print):
+    resultados = {}
+    for nombre, caso in CASOS.items():
+        if nombres and nombre not in nombres:
+            continue
+        inicio = time.perf_counter()
+        try:
+            resultados[nombre] = caso(rapido)
+        except Omitido as e:
+            resultados[nombre] = {'omitido': str(e)}
+        informar(f'{nombre}: {time.perf_counter() - inicio:.1f}s')
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'entorno': {'python': platform.python_version(), 'plataforma': platform.platform(),
+                    'procesador': platform.machine(), 'nucleos': os.cpu_count()},
+        'resultados': resultados,
+    }
+
+
+def comparar(actual, referencia, tolerancia=0.25):
+    """Devuelve [(caso, medida, referencia_s, actual_s, cambio)] de los que empeoraron más de ``tolerancia``."""
+    regresiones = []
+    for caso, medidas in actual['resultados'].items():
+        for medida, valores in medidas.items():
+            anterior = referencia.get('resultados', {}).get(caso, {}).get(medida)
+            if not isinstance(valores, dict) or 'min_s' not in valores or not anterior \
+                    or 'min_s' not in anterior:
+                continue
+            # Por debajo de 1 ms el ruido domina; se compara con un piso
+            base = max(anterior['min_s'], 1e-3)
+            cambio = (valores['min_s'] - anterior['min_s']) / base
+            if cambio > tolerancia:
+                regresiones.append((caso, medida, anterior['min_s'], valores['min_s'], cambio))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mide el rendimiento del flujo de tocones.')
+    parser.add_argument('--solo', help=f'casos separados por coma ({", ".join(CASOS)})')
+    parser.add_argument('--rapido', action='store_true', help='menos repeticiones y tamaños')
+    parser.add_argument('--salida', help='archivo JSON con los resultados')
+    parser.add_argument('--guardar-referencia', metavar='RUTA',
+                        help='guarda los resultados como nueva referencia')
+    parser.add_argument('--comparar', metavar='RUTA', help='referencia con la que comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help='empeoramiento relativo aceptado (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, _AQUI)
+    nombres = set(args.solo.split(',')) if args.solo else None
+    desconocidos = (nombres or set()) - set(CASOS)
+    if desconocidos:
+        parser.error(f'casos desconocidos: {", ".join(sorted(desconocidos))}')
+    informe = ejecutar(nombres, args.rapido, informar=lambda texto: print(texto, file=sys.stderr))
+
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    for ruta in (args.salida, args.guardar_referencia):
+        if ruta:
+            with open(ruta, 'w', encoding='utf-8') as f:
+                f.write(texto + '\n')
+    if not args.salida and not args.guardar_referencia:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            referencia = json.load(f)
+        regresiones = comparar(informe, referencia, args.tolerancia)
+        for caso, medida, antes, ahora, cambio in regresiones:
+            print(f'REGRESIÓN {caso}.{medida}: {antes * 1000:.2f}ms -> {ahora * 1000:.2f}ms '
+                  f'(+{cambio:.0%})', file=sys.stderr)
+        if regresiones:
+            return 1
+        print(f'Sin regresiones respecto a {args.comparar}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""Cálculo de ratios de tocones (CT/d, CD/d, AB/d) y su cumplimiento.
+
+Es el único lugar donde se calculan los ratios: lo usan el formulario, la
+exportación y las herramientas por lotes. Trabaja sobre columnas completas
+en una sola pasada; con muchos tocones usa NumPy si está instalado.
+"""
+import math
+from dataclasses import dataclass
+from typing import Sequence
+
+# Por debajo de este tamaño no compensa cargar NumPy (p. ej. en el formulario)
+MIN_TOCONES_NUMPY = 256
+
+_numpy = None
+
+
+def _cargar_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+
+@dataclass(frozen=True)
+class Umbrales:
+    """Criterios de cumplimiento; los valores por defecto son los del protocolo."""
+    ct_objetivo: float = 65.0
+    ct_tolerancia: float = 0.1
+    cd_min: float = 20.0
+    cd_max: float = 25.0
+    ab_max: float = 10.0
+
+
+UMBRALES = Umbrales()
+
+
+@dataclass
+class ResultadoRatios:
+    """Ratios (en %) y banderas de cumplimiento, una entrada por tocón.
+
+    Los ratios de un tocón sin diámetro válido son NaN y no cumplen.
+    """
+    ct_d: Sequence[float]
+    cd_d: Sequence[float]
+    ab_d: Sequence[float]
+    ct_ok: Sequence[bool]
+    cd_ok: Sequence[bool]
+    ab_ok: Sequence[bool]
+
+    def __len__(self):
+        return len(self.ct_d)
+
+    @property
+    def cumple(self):
+        return [a and b and c for a, b, c in zip(self.ct_ok, self.cd_ok, self.ab_ok)]
+
+    def filas(self):
+        """Itera (ct_d, cd_d, ab_d, ct_ok, cd_ok, ab_ok) con tipos de Python."""
+        columnas = [c.tolist() if hasattr(c, 'tolist') else c
+                    for c in (self.ct_d, self.cd_d, self.ab_d,
+                              self.ct_ok, self.cd_ok, self.ab_ok)]
+        return zip(*columnas)
+
+
+def _como_float(valor):
+    if valor is None:
+        return math.nan
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def cumplimiento(ct_d, cd_d, ab_d, umbrales=UMBRALES):
+    """Banderas (ct_ok, cd_ok, ab_ok) de un tocón; NaN nunca cumple."""
+    return (abs(ct_d - umbrales.ct_objetivo) < umbrales.ct_tolerancia,
+            umbrales.cd_min <= cd_d <= umbrales.cd_max,
+            ab_d <= umbrales.ab_max)
+
+
+def _ratios_python(d, ct, cd, ab, umbrales):
+    ct_d, cd_d, ab_d = [], [], []
+    for di, cti, cdi, abi in zip(d, ct, cd, ab):
+        di = _como_float(di)
+        if di > 0:
+            ct_d.append(_como_float(cti) / di * 100)
+            cd_d.append(_como_float(cdi) / di * 100)
+            ab_d.append(_como_float(abi) / di * 100)
+        else:
+            ct_d.append(math.nan)
+            cd_d.append(math.nan)
+            ab_d.append(math.nan)
+    banderas = [cumplimiento(*ratios, umbrales) for ratios in zip(ct_d, cd_d, ab_d)]
+    ct_ok, cd_ok, ab_ok = (list(col) for col in zip(*banderas)) if banderas else ([], [], [])
+    return ResultadoRatios(ct_d, cd_d, ab_d, ct_ok, cd_ok, ab_ok)
+
+
+def _ratios_numpy(np, d, ct, cd, ab, umbrales):
+    d, ct, cd, ab = (np.asarray(col, dtype=float) for col in (d, ct, cd, ab))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = np.where(d > 0, 100.0 / d, np.nan)
+        ct_d = ct * factor
+        cd_d = cd * factor
+        ab_d = ab * factor
+        return ResultadoRatios(
+            ct_d, cd_d, ab_d,
+            np.abs(ct_d - umbrales.ct_objetivo) < umbrales.ct_tolerancia,
+            (cd_d >= umbrales.cd_min) & (cd_d <= umbrales.cd_max),
+            ab_d <= umbrales.ab_max,
+        )
+
+
+def calcular_ratios(d, ct, cd, ab, umbrales=UMBRALES):
+    """Calcula los ratios de cualquier número de tocones a partir de sus columnas.
+
+    Acepta listas, tuplas o arreglos de NumPy; los valores vacíos o no
+    numéricos se tratan como faltantes.
+    """
+    if len(d) >= MIN_TOCONES_NUMPY:
+        np = _cargar_numpy()
+        if np:
+            try:
+                return _ratios_numpy(np, d, ct, cd, ab, umbrales)
+            except (TypeError, ValueError):
+                # Columnas con texto: se resuelven valor a valor
+                pass
+    return _ratios_python(d, ct, cd, ab, umbrales)
+
+
+def calcular_ratios_tocon(d, ct, cd, ab, umbrales=UMBRALES):
+    """Atajo para un solo tocón; devuelve una tupla como ResultadoRatios.filas()."""
+    return next(iter(calcular_ratios([d], [ct], [cd], [ab], umbrales).filas()))
+
+
+def calcular_ratios_tocones(tocones, umbrales=UMBRALES):
+    """Calcula los ratios de una secuencia de dicts con claves d, ct, cd y ab."""
+    return calcular_ratios([t.get('d') for t in tocones], [t.get('ct') for t in tocones],
+                           [t.get('cd') for t in tocones], [t.get('ab') for t in tocones],
+                           umbrales)
+
+
+def formatear_ratios(ct_d, cd_d, ab_d, umbrales=UMBRALES):
+    """Texto para mostrar en pantalla, p. ej. ('65.0% ✅', '20.0% ✅', '12.0% ❌')."""
+    ct_ok, cd_ok, ab_ok = cumplimiento(ct_d, cd_d, ab_d, umbrales)
+    return (f"{ct_d:.1f}% {'✅' if ct_ok else '❌'}",
+            f"{cd_d:.1f}% {'✅' if cd_ok else '❌'}",
+            f"{ab_d:.1f}% {'✅' if ab_ok else '❌'}")
+
+
+# --- Estado de cada tocón -------------------------------------------------
+
+PENDIENTE, INCOMPLETO, CUMPLE, FALLA = 'pendiente', 'incompleto', 'cumple', 'falla'
+
+
+def estado_tocon(datos, umbrales=UMBRALES):
+    """Devuelve (estado, criterios que fallan) de un tocón a partir de sus medidas."""
+    if not datos:
+        return PENDIENTE, ()
+    medidas = [_como_float(datos.get(campo)) for campo in ('d', 'ct', 'cd', 'ab')]
+    if any(valor != valor for valor in medidas) or medidas[0] <= 0:
+        return INCOMPLETO, ()
+    _, _, _, ct_ok, cd_ok, ab_ok = calcular_ratios_tocon(*medidas, umbrales)
+    fallas = tuple(nombre for nombre, ok in (('CT', ct_ok), ('CD', cd_ok), ('AB', ab_ok)) if not ok)
+    return (FALLA if fallas else CUMPLE), fallas
+
+
+class EstadosTocones:
+    """Caché del estado de cada tocón para que la lista no revise los datos uno a uno.
+
+    Se actualiza al guardar o cargar un tocón; consultar es un acceso a dict.
+    """
+
+    def __init__(self, umbrales=UMBRALES):
+        self.umbrales = umbrales
+        self._estados = {}
+
+    def actualizar(self, numero, datos):
+        self._estados[numero] = estado_tocon(datos, self.umbrales)
+        return self._estados[numero]
+
+    def quitar(self, numero):
+        self._estados.pop(numero, None)
+
+    def limpiar(self):
+        self._estados.clear()
+
+    def estado(self, numero):
+        return self._estados.get(numero, (PENDIENTE, ()))
+
+    def sin_terminar(self, numeros):
+        """Números de tocón que aún no tienen medidas completas."""
+        return [numero for numero in numeros
+                if self._estados.get(numero, (PENDIENTE,))[0] in (PENDIENTE, INCOMPLETO)]
@@ -0,0 +1,400 @@
+"""Órdenes de consola para procesar evaluaciones sin la interfaz.
+
+No importa Kivy: se usa en la oficina o en un servidor con
+``python -m supervisores ORDEN ...`` o ``python consola.py ORDEN ...``. Las
+entradas pueden ser almacenes de la app (.db), archivos exportados (.xlsx o
+.csv) o carpetas con ellos. Se leen evaluación por evaluación, los archivos
+se reparten entre procesos que devuelven sus evaluaciones en bloques por una
+cola acotada y las filas se escriben a medida que llegan, así que la memoria
+no depende del tamaño de la entrada.
+
+Uso:
+    python -m supervisores exportar evaluaciones.db salida.xlsx [--desde 01/01/2026]
+    python -m supervisores fusionar salida.csv equipo1.db equipo2.db carpeta/
+    python -m supervisores revalidar carpeta/ salida.xlsx --ct-objetivo 66
+    python -m supervisores resumir carpeta/ evaluaciones.db --por finca
+    python -m supervisores informes evaluaciones.db informes/
+"""
+import argparse
+import csv
+import hashlib
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+
+from almacen import numero_o_nada
+from calculos import UMBRALES, Umbrales, calcular_ratios_tocones
+from esquema import CAMPO_DE_COLUMNA, CAMPOS_ENCABEZADO, CAMPOS_FOTO, CAMPOS_TOCON, fecha_entera
+
+ORDENES = ('exportar', 'fusionar', 'revalidar', 'resumir', 'informes')
+EXTENSIONES_ARCHIVO = ('.xlsx', '.csv')
+DIMENSIONES = ['total', 'finca', 'lote', 'motosierrista', 'mes']
+# Evaluaciones por bloque que un proceso entrega, y bloques que puede adelantar
+EVALUACIONES_POR_BLOQUE = 64
+BLOQUES_EN_COLA = 4
+
+_ENCABEZADO = [campo.nombre for campo in CAMPOS_ENCABEZADO if campo.columna]
+_MEDIDAS = [campo.nombre for campo in CAMPOS_TOCON]
+_TEXTOS_TOCON = [campo.nombre for campo in CAMPOS_FOTO]
+
+
+# --- Lectura de entradas ----------------------------------------------------
+
+def _filas_archivo(ruta):
+    if ruta.lower().endswith('.csv'):
+        with open(ruta, newline='', encoding='utf-8-sig') as f:
+            yield from csv.reader(f)
+    else:
+        from revalidacion import leer_filas_xlsx
+        yield from leer_filas_xlsx(ruta)
+
+
+def leer_archivo(ruta):
+    """Itera las evaluaciones (encabezado, datos_tocones) de un archivo exportado por la app.
+
+    Las filas seguidas con el mismo encabezado forman una evaluación; como el
+    exportador escribe los tocones en orden creciente, un número que se repite
+    o retrocede también empieza otra (dos muestras del mismo lote y día, o dos
+    archivos concatenados). Solo se guarda en memoria la que se está leyendo.
+    """
+    filas = _filas_archivo(ruta)
+    cabecera = next(filas, None) or []
+    posiciones = {CAMPO_DE_COLUMNA[col]: i for i, col in enumerate(cabecera)
+                  if col in CAMPO_DE_COLUMNA}
+    if 'numero' not in posiciones or 'd' not in posiciones:
+        raise ValueError('no parece un archivo de evaluación de tocones')
+
+    def valor(fila, campo):
+        i = posiciones.get(campo)
+        return fila[i] if i is not None and i < len(fila) else None
+
+    actual = None
+    anterior = None
+    ultimo = None
+    for fila in filas:
+        numero = numero_o_nada(valor(fila, 'numero'))
+        if numero is None:
+            continue
+        numero = int(numero)
+        clave = tuple('' if valor(fila, campo) is None else str(valor(fila, campo))
+                      for campo in _ENCABEZADO)
+        if clave != anterior or numero <= ultimo:
+            if actual is not None:
+                yield actual
+            actual = (dict(zip(_ENCABEZADO, clave)), {})
+            anterior = clave
+        ultimo = numero
+        tocon = {campo: numero_o_nada(valor(fila, campo)) for campo in _MEDIDAS}
+        for campo in _TEXTOS_TOCON:
+            if valor(fila, campo):
+                tocon[campo] = str(valor(fila, campo))
+        actual[1][numero] = tocon
+    if actual is not None:
+        yield actual
+
+
+def _leer_archivo_seguro(ruta):
+    """Itera (bloque de evaluaciones, error) de ``ruta``; el error solo en el último.
+
+    Si el archivo falla a mitad de camino, las evaluaciones ya leídas se entregan igual.
+    """
+    bloque = []
+    try:
+        for evaluacion in leer_archivo(ruta):
+            bloque.append(evaluacion)
+            if len(bloque) == EVALUACIONES_POR_BLOQUE:
+                yield bloque, None
+                bloque = []
+    except (OSError, ValueError, KeyError, IndexError, SyntaxError) as e:
+        yield bloque, f'{type(e).__name__}: {e}'
+        return
+    if bloque:
+        yield bloque, None
+
+
+def _leer_archivo_en_cola(ruta, cola):
+    # Corre en otro proceso: ``put`` espera si la cola está llena, así un
+    # archivo grande no se lee más rápido de lo que se consume
+    for bloque, error in _leer_archivo_seguro(ruta):
+        cola.put((bloque, error))
+    cola.put(None)
+
+
+def leer_archivos(rutas, procesos):
+    """Itera (ruta, bloque de evaluaciones, error) de los archivos, en orden.
+
+    Con varios procesos cada uno lee un archivo y entrega sus bloques por una
+    cola de ``BLOQUES_EN_COLA``: en memoria hay a lo sumo esos bloques por proceso.
+    """
+    if procesos <= 1:
+        for ruta in rutas:
+            for bloque, error in _leer_archivo_seguro(ruta):
+                yield ruta, bloque, error
+        return
+    rutas = iter(rutas)
+    # El gestor se cierra antes que el pool: si se deja de iterar, los
+    # procesos que esperan en ``put`` fallan en vez de quedar bloqueados
+    with ProcessPoolExecutor(max_workers=procesos) as pool, multiprocessing.Manager() as gestor:
+        pendientes = deque()
+
+        def lanzar_siguiente():
+            ruta = next(rutas, None)
+            if ruta is not None:
+                cola = gestor.Queue(BLOQUES_EN_COLA)
+                pendientes.append((ruta, cola, pool.submit(_leer_archivo_en_cola, ruta, cola)))
+
+        for _ in range(procesos):
+            lanzar_siguiente()
+        while pendientes:
+            ruta, cola, futuro = pendientes.popleft()
+            while True:
+                try:
+                    elemento = cola.get(timeout=1)
+                except queue.Empty:
+                    if not futuro.done():
+                        continue
+                    # Terminó sin marcar el fin: propaga su excepción si la hubo
+                    futuro.result()
+                    break
+                if elemento is None:
+                    break
+                yield (ruta,) + elemento
+            lanzar_siguiente()
+
+
+class Filtro:
+    """Filtro de evaluaciones por fecha (dd/mm/aaaa, inclusive) y finca."""
+
+    def __init__(self, desde=None, hasta=None, finca=None):
+        self.desde = desde
+        self.hasta = hasta
+        self.finca = finca
+        self._minimo = fecha_entera(desde) if desde else None
+        self._maximo = fecha_entera(hasta) if hasta else None
+
+    def acepta(self, encabezado):
+        if self.finca is not None and encabezado.get('finca') != self.finca:
+            return False
+        if self._minimo is None and self._maximo is None:
+            return True
+        fecha = fecha_entera(encabezado.get('evaluacion'))
+        return ((self._minimo is None or fecha >= self._minimo)
+                and (self._maximo is None or fecha <= self._maximo))
+
+
+def _evaluaciones_almacen(ruta, filtro):
+    from almacen import AlmacenEvaluaciones
+    almacen = AlmacenEvaluaciones(ruta)
+    try:
+        for resumen in almacen.listar_evaluaciones(finca=filtro.finca, desde=filtro.desde,
+                                                   hasta=filtro.hasta, estado='completa',
+                                                   limite=-1):
+            evaluacion = almacen.obtener_evaluacion(resumen.id)
+            if evaluacion is not None:
+                yield evaluacion.encabezado(), {t.numero: t.como_datos()
+                                                for t in evaluacion.tocones}
+    finally:
+        almacen.cerrar()
+
+
+def _archivos(carpeta):
+    for raiz, _, archivos in os.walk(carpeta):
+        for archivo in sorted(archivos):
+            if archivo.lower().endswith(EXTENSIONES_ARCHIVO) and not archivo.startswith('~$'):
+                yield os.path.join(raiz, archivo)
+
+
+def evaluaciones(entradas, filtro=None, procesos=None, errores=None):
+    """Itera (encabezado, datos_tocones) de todas las entradas, en orden.
+
+    Los almacenes se leen en este proceso; los archivos se leen en paralelo.
+    Los archivos ilegibles o que fallan a mitad de camino se anotan en
+    ``errores`` (lista de (ruta, error)).
+    """
+    filtro = filtro or Filtro()
+    procesos = procesos or os.cpu_count() or 1
+    for entrada in entradas:
+        if entrada.lower().endswith('.db'):
+            yield from _evaluaciones_almacen(entrada, filtro)
+            continue
+        rutas = _archivos(entrada) if os.path.isdir(entrada) else [entrada]
+        for ruta, bloque, error in leer_archivos(rutas, procesos):
+            for encabezado, datos_tocones in bloque:
+                if filtro.acepta(encabezado):
+                    yield encabezado, datos_tocones
+            if error is not None and errores is not None:
+                errores.append((ruta, error))
+
+
+def sin_duplicados(evaluaciones):
+    """Descarta evaluaciones repetidas (mismo encabezado y mismas medidas)."""
+    vistas = set()
+    for encabezado, datos_tocones in evaluaciones:
+        huella = hashlib.blake2b(repr((
+            [encabezado.get(campo) or '' for campo in _ENCABEZADO],
+            sorted((num, [datos.get(campo) for campo in _MEDIDAS])
+                   for num, datos in datos_tocones.items()))).encode('utf-8'),
+            digest_size=16).digest()
+        if huella not in vistas:
+            vistas.add(huella)
+            yield encabezado, datos_tocones
+
+
+# --- Órdenes --------------------------------------------------------------
+
+def exportar(entradas, salida, filtro=None, umbrales=UMBRALES, procesos=None, unicas=False):
+    """Escribe las evaluaciones de ``entradas`` en un archivo; devuelve (evaluaciones, filas, errores)."""
+    from exportador import COLUMNAS_EVALUACION, abrir_escritor, filas_evaluacion
+    errores = []
+    flujo = evaluaciones(entradas, filtro, procesos, errores)
+    if unicas:
+        flujo = sin_duplicados(flujo)
+    cantidad = 0
+    with abrir_escritor(salida, COLUMNAS_EVALUACION) as escritor:
+        for encabezado, datos_tocones in flujo:
+            for fila in filas_evaluacion(encabezado, datos_tocones, umbrales):
+                escritor.escribir_fila(fila)
+            cantidad += 1
+    return cantidad, escritor.filas, errores
+
+
+def resumir(entradas, por='finca', filtro=None, umbrales=UMBRALES, procesos=None):
+    """Cumplimiento por grupo: {clave: [evaluaciones, tocones, ct, cd, ab, cumple]}."""
+    grupos = {}
+    errores = []
+    for encabezado, datos_tocones in sin_duplicados(evaluaciones(entradas, filtro, procesos,
+                                                                 errores)):
+        if por == 'total':
+            clave = 'total'
+        elif por == 'mes':
+            fecha = fecha_entera(encabezado.get('evaluacion'))
+            clave = f'{fecha // 10000:04d}-{fecha // 100 % 100:02d}' if fecha else ''
+        elif por == 'lote':
+            clave = f"{encabezado.get('finca') or ''} / {encabezado.get('lote') or ''}"
+        else:
+            clave = encabezado.get(por) or ''
+        ratios = calcular_ratios_tocones([datos_tocones[num] for num in sorted(datos_tocones)],
+                                         umbrales)
+        # Solo cuentan los tocones con medidas completas
+        validos = [i for i, valor in enumerate(ratios.ct_d) if valor == valor]
+        acumulado = grupos.setdefault(clave, [0, 0, 0, 0, 0, 0])
+        acumulado[0] += 1
+        acumulado[1] += len(validos)
+        for j, banderas in enumerate((ratios.ct_ok, ratios.cd_ok, ratios.ab_ok, ratios.cumple), 2):
+            acumulado[j] += sum(1 for i in validos if banderas[i])
+    return grupos, errores
+
+
+def _agregar_umbrales(parser):
+    for campo, valor in asdict(UMBRALES).items():
+        parser.add_argument(f'--{campo.replace("_", "-")}', type=float, default=valor)
+
+
+def _agregar_filtro(parser):
+    parser.add_argument('--desde', help='fecha de evaluación mínima (dd/mm/aaaa)')
+    parser.add_argument('--hasta', help='fecha de evaluación máxima (dd/mm/aaaa)')
+    parser.add_argument('--finca')
+    parser.add_argument('--procesos', type=int, default=None,
+                        help='procesos en paralelo (por defecto, todos los núcleos)')
+
+
+def _umbrales(args):
+    return Umbrales(**{campo: getattr(args, campo) for campo in asdict(UMBRALES)})
+
+
+def _informar_errores(errores):
+    for ruta, error in errores:
+        print(f'{ruta}: {error}', file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='supervisores', description='Procesa evaluaciones de tocones sin abrir la app.')
+    sub = parser.add_subparsers(dest='orden', required=True)
+
+    orden = sub.add_parser('exportar', help='evaluaciones completas de un almacén a .xlsx o .csv')
+    orden.add_argument('entrada', help='almacén (.db), archivo o carpeta')
+    orden.add_argument('salida', help='archivo .xlsx o .csv')
+    _agregar_filtro(orden)
+    _agregar_umbrales(orden)
+
+    orden = sub.add_parser('fusionar', help='une almacenes y archivos en uno, sin duplicados')
+    orden.add_argument('salida', help='archivo .xlsx o .csv')
+    orden.add_argument('entradas', nargs='+', help='almacenes (.db), archivos o carpetas')
+    _agregar_filtro(orden)
+    _agregar_umbrales(orden)
+
+    orden = sub.add_parser('revalidar', help='recalcula ratios de archivos con otros umbrales')
+    orden.add_argument('carpeta', help='carpeta con archivos Evaluacion_Tocones_*.xlsx')
+    orden.add_argument('salida', help='archivo consolidado (.xlsx o .csv)')
+    orden.add_argument('--procesos', type=int, default=None)
+    _agregar_umbrales(orden)
+
+    orden = sub.add_parser('resumir', help='porcentaje de cumplimiento por grupo')
+    orden.add_argument('entradas', nargs='+', help='almacenes (.db), archivos o carpetas')
+    orden.add_argument('--por', choices=DIMENSIONES, default='finca')
+    orden.add_argument('--salida', help='además, escribir el resumen a .xlsx o .csv')
+    _agregar_filtro(orden)
+    _agregar_umbrales(orden)
+
+    orden = sub.add_parser('informes', help='un informe PDF por evaluación completa')
+    orden.add_argument('almacen')
+    orden.add_argument('carpeta')
+    orden.add_argument('--desde')
+    orden.add_argument('--hasta')
+    orden.add_argument('--finca')
+    orden.add_argument('--procesos', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    if args.orden == 'revalidar':
+        from revalidacion import revalidar_carpeta
+        archivos, filas, con_error = revalidar_carpeta(args.carpeta, args.salida, _umbrales(args),
+                                                       args.procesos)
+        print(f'{archivos} archivos, {filas} filas, {con_error} con error '
+              f'en {time.perf_counter() - inicio:.1f}s -> {args.salida}')
+        return 0
+    if args.orden == 'informes':
+        import informes
+        return informes.main([args.almacen, args.carpeta]
+                             + [f'--{opcion}={valor}' for opcion, valor in
+                                (('desde', args.desde), ('hasta', args.hasta),
+                                 ('finca', args.finca), ('procesos', args.procesos))
+                                if valor is not None])
+
+    filtro = Filtro(args.desde, args.hasta, args.finca)
+    if args.orden in ('exportar', 'fusionar'):
+        entradas = [args.entrada] if args.orden == 'exportar' else args.entradas
+        cantidad, filas, errores = exportar(entradas, args.salida, filtro, _umbrales(args),
+                                            args.procesos, unicas=args.orden == 'fusionar')
+        _informar_errores(errores)
+        print(f'{cantidad} evaluaciones, {filas} filas, {len(errores)} archivos con error '
+              f'en {time.perf_counter() - inicio:.1f}s -> {args.salida}')
+        return 1 if errores else 0
+
+    grupos, errores = resumir(args.entradas, args.por, filtro, _umbrales(args), args.procesos)
+    _informar_errores(errores)
+    columnas = [args.por, 'evaluaciones', 'tocones', '% CT', '% CD', '% AB', '% cumple']
+    filas = []
+    for clave, (evaluaciones_grupo, tocones, *cumplen) in sorted(grupos.items()):
+        porcentajes = [round(n / tocones * 100, 1) if tocones else None for n in cumplen]
+        filas.append([clave, evaluaciones_grupo, tocones] + porcentajes)
+    ancho = max([len(columnas[0])] + [len(str(fila[0])) for fila in filas])
+    print(f'{columnas[0]:<{ancho}}  ' + '  '.join(f'{c:>12}' for c in columnas[1:]))
+    for fila in filas:
+        print(f'{fila[0]:<{ancho}}  ' + '  '.join(
+            f'{"-" if v is None else v:>12}' for v in fila[1:]))
+    if args.salida:
+        from exportador import escribir_filas
+        escribir_filas(args.salida, columnas, filas)
+    print(f'{time.perf_counter() - inicio:.1f}s', file=sys.stderr)
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""Bitácora de la sesión en curso para no perder lo escrito si el sistema cierra la app.
+
+Cada cambio de un campo, de una firma o de la pantalla se anota como un
+registro (clave, valor) en memoria; un hilo propio los agrega al archivo en
+tandas cada ``intervalo`` segundos y hace fsync, así escribir en un campo no
+espera al disco. Cada registro lleva su largo y su CRC, de modo que un
+registro a medio escribir al morir la app se descarta al leer. Cuando el
+archivo crece se reescribe con una sola copia del estado actual.
+
+Al arrancar, ``recuperar`` reproduce el archivo (el último valor de cada
+clave gana) y devuelve el estado de la sesión. No importa Kivy.
+"""
+import base64
+import json
+import os
+import struct
+import threading
+import zlib
+
+# Largo y CRC32 del contenido de cada registro
+_REGISTRO = struct.Struct('<II')
+INTERVALO = 1.0
+# Por encima de este tamaño el archivo se compacta al estado actual
+MAX_BYTES = 64 * 1024
+
+
+def _codificar(clave, valor):
+    if isinstance(valor, (bytes, bytearray)):
+        valor = {'b64': base64.b64encode(bytes(valor)).decode('ascii')}
+    contenido = json.dumps([clave, valor], ensure_ascii=False,
+                           separators=(',', ':')).encode('utf-8')
+    return _REGISTRO.pack(len(contenido), zlib.crc32(contenido)) + contenido
+
+
+def _decodificar(contenido):
+    clave, valor = json.loads(contenido)
+    if isinstance(valor, dict) and set(valor) == {'b64'}:
+        valor = base64.b64decode(valor['b64'])
+    return clave, valor
+
+
+def leer_registros(datos):
+    """Itera (clave, valor, fin) de ``datos`` hasta el primer registro incompleto o dañado."""
+    posicion = 0
+    while posicion + _REGISTRO.size <= len(datos):
+        largo, crc = _REGISTRO.unpack_from(datos, posicion)
+        inicio = posicion + _REGISTRO.size
+        contenido = datos[inicio:inicio + largo]
+        if len(contenido) < largo or zlib.crc32(contenido) != crc:
+            return
+        try:
+            clave, valor = _decodificar(contenido)
+        except ValueError:
+            return
+        posicion = inicio + largo
+        yield clave, valor, posicion
+
+
+class Diario:
+    """Bitácora de escritura anticipada de una sesión; ``anotar`` es seguro desde la UI."""
+
+    def __init__(self, ruta, intervalo=INTERVALO, max_bytes=MAX_BYTES):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self.max_bytes = max_bytes
+        self._estado = {}
+        self._pendientes = []
+        self._bloqueo = threading.Lock()
+        # Serializa las escrituras del hilo con vaciar() y descartar() desde la UI
+        self._bloqueo_archivo = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._cerrado = False
+
+    @property
+    def estado(self):
+        with self._bloqueo:
+            return dict(self._estado)
+
+    def recuperar(self):
+        """Lee el archivo y devuelve el estado de la sesión anterior ({} si no había)."""
+        try:
+            with open(self.ruta, 'rb') as f:
+                datos = f.read()
+        except FileNotFoundError:
+            datos = b''
+        estado = {}
+        fin = 0
+        for clave, valor, fin in leer_registros(datos):
+            if valor is None:
+                estado.pop(clave, None)
+            else:
+                estado[clave] = valor
+        with self._bloqueo:
+            self._estado = dict(estado)
+        if fin < len(datos):
+            # Cola dañada: lo que se agregue después debe quedar legible
+            with self._bloqueo_archivo:
+                self._compactar()
+        return estado
+
+    def anotar(self, clave, valor):
+        """Registra el valor actual de ``clave`` (None la borra); no toca el disco."""
+        with self._bloqueo:
+            if self._estado.get(clave) == valor:
+                return
+            if valor is None:
+                self._estado.pop(clave, None)
+            else:
+                self._estado[clave] = valor
+            self._pendientes.append(_codificar(clave, valor))
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name='diario', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while not self._cerrado:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                self.vaciar()
+            except OSError:
+                # Disco lleno o sin permiso: se reintenta en la próxima tanda
+                pass
+
+    def vaciar(self):
+        """Escribe lo pendiente y hace fsync; se llama también al pausar la app."""
+        with self._bloqueo_archivo:
+            with self._bloqueo:
+                pendientes, self._pendientes = self._pendientes, []
+            if not pendientes:
+                return
+            try:
+                with open(self.ruta, 'ab') as f:
+                    f.write(b''.join(pendientes))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    tamano = f.tell()
+            except OSError:
+                with self._bloqueo:
+                    self._pendientes[:0] = pendientes
+                raise
+            if tamano > self.max_bytes:
+                self._compactar()
+
+    def _compactar(self):
+        with self._bloqueo:
+            contenido = b''.join(_codificar(clave, valor) for clave, valor in self._estado.items())
+            # Lo anotado mientras tanto ya está en el estado copiado
+            self._pendientes = []
+        temporal = f'{self.ruta}.tmp'
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta)
+
+    def descartar(self):
+        """Olvida la sesión (p. ej. al terminar de exportar la evaluación)."""
+        with self._bloqueo_archivo:
+            with self._bloqueo:
+                self._estado = {}
+                self._pendientes = []
+            try:
+                os.remove(self.ruta)
+            except FileNotFoundError:
+                pass
+
+    def cerrar(self):
+        self._cerrado = True
+        self._despertar.set()
+        self.vaciar()
@@ -0,0 +1,182 @@
+"""Definición única de los campos de la evaluación de tocones.
+
+Cada campo dice su tipo, unidad, rango válido y columna (y su posición) en
+el archivo exportado. De aquí salen los formularios, la lectura y validación
+de lo que se escribe (una sola vez, a número), las columnas del almacén y el
+orden de columnas del exportador. No importa Kivy.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+
+class ErrorCampo(ValueError):
+    """Valor inválido en un campo; ``str(error)`` se puede mostrar tal cual."""
+
+    def __init__(self, campo, mensaje):
+        super().__init__(f'{campo.etiqueta}: {mensaje}')
+        self.campo = campo
+
+
+@dataclass(frozen=True)
+class Campo:
+    nombre: str
+    etiqueta: str
+    # 'numero', 'entero', 'texto', 'fecha' (dd/mm/aaaa) o 'persona'
+    tipo: str = 'numero'
+    unidad: str = ''
+    minimo: Optional[float] = None
+    maximo: Optional[float] = None
+    obligatorio: bool = True
+    # Columna en el archivo exportado y su posición (desde 0); None si no se exporta
+    columna: Optional[str] = None
+    orden: Optional[int] = None
+    # Título corto para tablas angostas (informe PDF); sin él se usa ``etiqueta``
+    corta: Optional[str] = None
+
+    @property
+    def titulo(self):
+        return f'{self.etiqueta} ({self.unidad})' if self.unidad else self.etiqueta
+
+    @property
+    def titulo_corto(self):
+        return self.corta or self.etiqueta
+
+    def leer(self, texto):
+        """Convierte el texto del formulario al valor del campo o lanza ErrorCampo."""
+        texto = (texto or '').strip()
+        if self.tipo == 'persona' and texto == 'Seleccione':
+            texto = ''
+        if not texto:
+            if self.obligatorio:
+                raise ErrorCampo(self, 'es obligatorio')
+            return None
+        if self.tipo in ('texto', 'persona'):
+            return texto
+        if self.tipo == 'fecha':
+            try:
+                datetime.strptime(texto, '%d/%m/%Y')
+            except ValueError:
+                raise ErrorCampo(self, 'use el formato dd/mm/aaaa') from None
+            return texto
+        try:
+            valor = float(texto.replace(',', '.'))
+            if self.tipo == 'entero':
+                if valor != int(valor):
+                    raise ValueError
+                valor = int(valor)
+        except ValueError:
+            raise ErrorCampo(self, 'debe ser un número entero' if self.tipo == 'entero'
+                             else 'debe ser un número') from None
+        unidad = f' {self.unidad}' if self.unidad else ''
+        if self.minimo is not None and not valor >= self.minimo:
+            raise ErrorCampo(self, f'debe ser al menos {self.minimo:g}{unidad}')
+        if self.maximo is not None and not valor <= self.maximo:
+            raise ErrorCampo(self, f'debe ser como máximo {self.maximo:g}{unidad}')
+        return valor
+
+    def texto(self, valor):
+        """Inverso de ``leer`` para volver a mostrar un valor guardado."""
+        if valor is None:
+            return ''
+        if self.tipo in ('numero', 'entero') and isinstance(valor, (int, float)):
+            return f'{valor:g}'
+        return str(valor)
+
+
+def fecha_entera(texto):
+    """'15/03/2026' -> 20260315 (0 si falta o no es válida)."""
+    try:
+        dia, mes, anio = (int(parte) for parte in (texto or '').split('/'))
+    except ValueError:
+        return 0
+    return anio * 10000 + mes * 100 + dia
+
+
+# Encabezado de la evaluación. El orden es parte del formato binario de
+# transferencia_qr: solo se puede agregar al final.
+CAMPOS_ENCABEZADO = [
+    Campo('finca', 'Finca', 'texto', obligatorio=False, columna='finca', orden=1),
+    Campo('lote', 'Lote', 'texto', obligatorio=False, columna='lote', orden=2),
+    Campo('especie', 'Especie', 'texto', obligatorio=False, columna='especie', orden=3),
+    Campo('plantacion', 'Plantación (dd/mm/aaaa)', 'fecha', columna='plantacion', orden=4),
+    Campo('evaluacion', 'Evaluación (dd/mm/aaaa)', 'fecha', columna='evaluacion', orden=5),
+    Campo('supervisor', 'Supervisor', 'persona', obligatorio=False, columna='supervisor',
+          orden=6),
+    Campo('evaluador', 'Evaluador', 'persona', obligatorio=False, columna='evaluador', orden=7),
+    Campo('motosierrista', 'Motosierrista', 'persona', obligatorio=False,
+          columna='motosierista', orden=8),
+    Campo('edad', 'Edad', unidad='años', obligatorio=False),
+    Campo('muestra', 'Tocones a evaluar', 'entero', minimo=1, maximo=1000),
+]
+# Lo que se escribe en el formulario, en su orden; la edad sale de las fechas
+CAMPOS_ENCABEZADO_FORMULARIO = [campo for campo in CAMPOS_ENCABEZADO if campo.nombre != 'edad']
+
+# El número del tocón va en dos columnas, como en el Excel original
+CAMPOS_NUMERO = [
+    Campo('numero', 'Tocón', 'entero', columna='tocon', orden=0, corta='N°'),
+    Campo('tocon_num', 'Tocón', 'entero', columna='tocon_num', orden=13),
+]
+
+# Medidas de cada tocón. El orden es parte del formato binario de
+# transferencia_qr (un bit por medida): solo se puede agregar al final.
+CAMPOS_TOCON = [
+    Campo('d', 'Diámetro (d)', unidad='cm', minimo=1, maximo=300, columna='diametro', orden=11,
+          corta='d (cm)'),
+    Campo('altura', 'Altura tocon', unidad='cm', minimo=0, maximo=300, obligatorio=False,
+          columna='altura', orden=12, corta='Altura'),
+    Campo('ct', 'Corte de tala (CT)', unidad='cm', minimo=0, maximo=300, columna='CT', orden=14,
+          corta='CT'),
+    Campo('cd', 'Corte de dirección (CD)', unidad='cm', minimo=0, maximo=300, columna='CD',
+          orden=15, corta='CD'),
+    Campo('ab', 'Ancho Bisagra (AB)', unidad='cm', minimo=0, maximo=300,
+          columna='Ancho Bisagra (AB)', orden=16, corta='AB'),
+    Campo('altura1', 'Altura entre CT y CD', unidad='cm', minimo=0, maximo=300,
+          obligatorio=False, columna='Altura entre CT y CD', orden=17, corta='Alt. CT-CD'),
+]
+
+# Resultados calculados que se muestran y exportan
+CAMPOS_RATIO = [
+    Campo('ct_d_ratio', 'CT/d*100', unidad='%', columna='CT/d*100', orden=18, corta='CT/d %'),
+    Campo('cd_d_ratio', 'CD/d*100', unidad='%', columna='CD/d*100', orden=19, corta='CD/d %'),
+    Campo('ab_d_ratio', 'AB/d*100', unidad='%', columna='AB/d*100', orden=20, corta='AB/d %'),
+]
+CAMPOS_CUMPLE = [
+    Campo('ct_ok', 'CT cumple', 'texto', columna='CT cumple', orden=21),
+    Campo('cd_ok', 'CD cumple', 'texto', columna='CD cumple', orden=22),
+    Campo('ab_ok', 'AB cumple', 'texto', columna='AB cumple', orden=23),
+]
+
+# Nombre del JPEG de la foto del tocón, que se adjunta junto al archivo
+CAMPOS_FOTO = [
+    Campo('foto', 'Foto', 'texto', obligatorio=False, columna='foto', orden=24),
+]
+
+CAMPOS_FIRMA = [
+    Campo('firma_evaluador', 'Firma evaluador', 'texto', columna='firma_evaluad', orden=9),
+    Campo('firma_motosierrista', 'Firma motosierrista', 'texto', columna='firma_motosierista',
+          orden=10),
+]
+
+# Lo que el almacén guarda de cada tocón, además de su número
+CAMPOS_TOCON_GUARDADOS = CAMPOS_TOCON + CAMPOS_RATIO + CAMPOS_FOTO
+
+# Columnas del archivo en su orden, igual al Excel original de pandas
+CAMPOS_EXPORTADOS = sorted((campo for grupo in (CAMPOS_NUMERO, CAMPOS_ENCABEZADO, CAMPOS_FIRMA,
+                                                CAMPOS_TOCON, CAMPOS_RATIO, CAMPOS_CUMPLE,
+                                                CAMPOS_FOTO)
+                            for campo in grupo if campo.columna),
+                           key=lambda campo: campo.orden)
+if [campo.orden for campo in CAMPOS_EXPORTADOS] != list(range(len(CAMPOS_EXPORTADOS))):
+    raise ValueError('Las posiciones de las columnas exportadas deben ser 0, 1, 2... sin repetir')
+COLUMNAS_EXPORTACION = [campo.columna for campo in CAMPOS_EXPORTADOS]
+CAMPO_DE_COLUMNA = {campo.columna: campo.nombre for campo in CAMPOS_EXPORTADOS}
+
+
+def leer_campos(campos, textos):
+    """Lee {nombre: texto} con ``campos``; devuelve {nombre: valor} o lanza el primer ErrorCampo."""
+    return {campo.nombre: campo.leer(textos.get(campo.nombre)) for campo in campos}
+
+
+def leer_tocon(textos):
+    return leer_campos(CAMPOS_TOCON, textos)
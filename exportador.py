@@ -0,0 +1,284 @@
+"""Escritura de evaluaciones a .xlsx o .csv sin pandas.
+
+Las filas se escriben en streaming: nunca se construyen listas por columna
+ni se guarda la hoja completa en memoria, así que exportar 12 tocones o
+decenas de miles cuesta lo mismo en RAM.
+"""
+import csv
+import functools
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from calculos import UMBRALES, calcular_ratios_tocones
+from esquema import (CAMPOS_CUMPLE, CAMPOS_ENCABEZADO, CAMPOS_EXPORTADOS, CAMPOS_RATIO,
+                     CAMPOS_TOCON, COLUMNAS_EXPORTACION)
+
+# Mismo orden y nombres de columna que el Excel original generado con pandas
+COLUMNAS_EVALUACION = COLUMNAS_EXPORTACION
+
+_ENCABEZADO_EXPORTADO = [campo.nombre for campo in CAMPOS_ENCABEZADO if campo.columna]
+_MEDIDAS = [campo.nombre for campo in CAMPOS_TOCON]
+# En el orden de las tuplas de ``Ratios.filas``
+_RESULTADOS = [campo.nombre for campo in CAMPOS_RATIO + CAMPOS_CUMPLE]
+_NOMBRES_EXPORTADOS = [campo.nombre for campo in CAMPOS_EXPORTADOS]
+
+# Filas acumuladas antes de pasar el bloque al compresor
+_FILAS_POR_BLOQUE = 256
+
+# Caracteres de control que XML 1.0 no admite
+_CARACTERES_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{hoja}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Estilo 1: cabecera en negrita, igual que la que escribía pandas
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '</styleSheet>'
+)
+
+_INICIO_HOJA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_FIN_HOJA = '</sheetData></worksheet>'
+
+
+def letra_columna(indice):
+    """Convierte un índice base 0 en la letra de columna de Excel (0 -> A)."""
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+@functools.lru_cache(maxsize=2048)
+def _texto_xml(texto):
+    # Los datos del encabezado se repiten en cada fila; la caché evita escaparlos
+    # una y otra vez sin dejar de tener un tamaño acotado
+    return escape(_CARACTERES_INVALIDOS.sub('', texto))
+
+
+def _celda(ref, valor, estilo=''):
+    if valor is None or valor == '':
+        return ''
+    if isinstance(valor, bool):
+        return f'<c r="{ref}" t="b"{estilo}><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        if valor != valor or valor in (float('inf'), float('-inf')):
+            return ''
+        return f'<c r="{ref}"{estilo}><v>{valor!r}</v></c>'
+    texto = _texto_xml(str(valor))
+    return f'<c r="{ref}" t="inlineStr"{estilo}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+class EscritorXlsx:
+    """Escribe una hoja .xlsx fila a fila con memoria constante.
+
+    Se usa como gestor de contexto; el archivo se escribe primero en una ruta
+    temporal y solo se renombra al final, así un fallo no deja un .xlsx roto.
+    """
+
+    def __init__(self, ruta, columnas, hoja='Sheet1'):
+        self.ruta = ruta
+        self.columnas = list(columnas)
+        self.hoja = hoja
+        self.filas = 0
+        self._num_fila = 0
+        self._letras = [letra_columna(i) for i in range(len(self.columnas))]
+        self._temporal = ruta + '.tmp'
+        self._zip = None
+        self._hoja = None
+        self._bloque = []
+
+    def __enter__(self):
+        metodo = zipfile.ZIP_DEFLATED if zipfile.zlib else zipfile.ZIP_STORED
+        self._zip = zipfile.ZipFile(self._temporal, 'w', compression=metodo)
+        self._zip.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        self._zip.writestr('_rels/.rels', _RELS)
+        self._zip.writestr('xl/workbook.xml', _WORKBOOK.format(hoja=escape(self.hoja)))
+        self._zip.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        self._zip.writestr('xl/styles.xml', _STYLES)
+        self._hoja = self._zip.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        self._hoja.write(_INICIO_HOJA.encode('utf-8'))
+        self._escribir(self.columnas, estilo=' s="1"')
+        return self
+
+    def _escribir(self, valores, estilo=''):
+        self._num_fila += 1
+        num = self._num_fila
+        celdas = ''.join(_celda(f'{letra}{num}', valor, estilo)
+                         for letra, valor in zip(self._letras, valores))
+        self._bloque.append(f'<row r="{num}">{celdas}</row>')
+        if len(self._bloque) >= _FILAS_POR_BLOQUE:
+            self._vaciar()
+
+    def _vaciar(self):
+        if self._bloque:
+            self._hoja.write(''.join(self._bloque).encode('utf-8'))
+            self._bloque = []
+
+    def escribir_fila(self, valores):
+        self._escribir(valores)
+        self.filas += 1
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            try:
+                self._vaciar()
+                self._hoja.write(_FIN_HOJA.encode('utf-8'))
+                self._hoja.close()
+                self._zip.close()
+            except BaseException:
+                # Un zip a medio cerrar no debe reemplazar al archivo
+                self._descartar()
+                raise
+            os.replace(self._temporal, self.ruta)
+        else:
+            self._descartar()
+        return False
+
+    def _descartar(self):
+        for cerrable in (self._hoja, self._zip):
+            try:
+                cerrable.close()
+            except Exception:
+                pass
+        if os.path.exists(self._temporal):
+            os.remove(self._temporal)
+
+
+class EscritorCsv:
+    """Alternativa en CSV con la misma interfaz que EscritorXlsx."""
+
+    def __init__(self, ruta, columnas):
+        self.ruta = ruta
+        self.columnas = list(columnas)
+        self.filas = 0
+        self._temporal = ruta + '.tmp'
+        self._archivo = None
+        self._csv = None
+
+    def __enter__(self):
+        # utf-8-sig para que Excel muestre bien las tildes
+        self._archivo = open(self._temporal, 'w', newline='', encoding='utf-8-sig')
+        self._csv = csv.writer(self._archivo)
+        self._csv.writerow(self.columnas)
+        return self
+
+    def escribir_fila(self, valores):
+        self._csv.writerow(['' if valor is None else valor for valor in valores])
+        self.filas += 1
+
+    def __exit__(self, tipo, valor, traza):
+        try:
+            self._archivo.close()
+        except BaseException:
+            if tipo is None:
+                os.remove(self._temporal)
+                raise
+        if tipo is None:
+            os.replace(self._temporal, self.ruta)
+        elif os.path.exists(self._temporal):
+            os.remove(self._temporal)
+        return False
+
+
+def abrir_escritor(ruta, columnas):
+    """Elige el escritor según la extensión del archivo (.xlsx o .csv)."""
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == '.csv':
+        return EscritorCsv(ruta, columnas)
+    if extension == '.xlsx':
+        return EscritorXlsx(ruta, columnas)
+    raise ValueError(f'Formato de exportación no soportado: {extension}')
+
+
+def escribir_filas(ruta, columnas, filas):
+    """Vuelca un iterable de filas al archivo y devuelve cuántas se escribieron."""
+    with abrir_escritor(ruta, columnas) as escritor:
+        for fila in filas:
+            escritor.escribir_fila(fila)
+    return escritor.filas
+
+
+def _redondear(valor):
+    # NaN no se escribe: la celda queda vacía
+    return round(valor, 2) if valor == valor else None
+
+
+def filas_evaluacion(encabezado, datos_tocones, umbrales=UMBRALES,
+                     firma_evaluador=None, firma_motosierrista=None, fotos=None):
+    """Genera las filas de una evaluación en el orden de COLUMNAS_EVALUACION.
+
+    Los ratios y su cumplimiento se recalculan con ``calculos`` a partir de
+    las medidas, así el archivo siempre lleva números y no texto. Las firmas
+    (nombre del PNG adjunto) solo van en la primera fila. ``fotos`` da el
+    nombre del JPEG adjunto de cada tocón; sin él se usa su campo 'foto'.
+    """
+    fila = {campo: encabezado.get(campo) for campo in _ENCABEZADO_EXPORTADO}
+    fila.update(firma_evaluador=firma_evaluador, firma_motosierrista=firma_motosierrista)
+    numeros = sorted(datos_tocones)
+    tocones = [datos_tocones[num] for num in numeros]
+    ratios = calcular_ratios_tocones(tocones, umbrales)
+    for num, tocon, (ct_d, cd_d, ab_d, ct_ok, cd_ok, ab_ok) in zip(numeros, tocones,
+                                                                   ratios.filas()):
+        # Se reusa el dict: solo cambian los valores del tocón
+        fila['numero'] = fila['tocon_num'] = num
+        for campo in _MEDIDAS:
+            fila[campo] = tocon.get(campo)
+        fila.update(zip(_RESULTADOS, (_redondear(ct_d), _redondear(cd_d), _redondear(ab_d),
+                                      ct_ok, cd_ok, ab_ok)))
+        fila['foto'] = tocon.get('foto') if fotos is None else fotos.get(num)
+        yield [fila[campo] for campo in _NOMBRES_EXPORTADOS]
+        fila['firma_evaluador'] = fila['firma_motosierrista'] = None
+
+
+def filas_evaluaciones(evaluaciones, umbrales=UMBRALES):
+    """Encadena varias evaluaciones (encabezado, datos_tocones) en un solo flujo."""
+    for encabezado, datos_tocones in evaluaciones:
+        yield from filas_evaluacion(encabezado, datos_tocones, umbrales)
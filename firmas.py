@@ -0,0 +1,302 @@
+"""Trazos de firma compactos y su simplificación.
+
+Cada trazo guarda sus puntos en un ``array('f')`` (8 bytes por punto en lugar
+de dos objetos float de Python) y descarta en línea los puntos que no aportan
+forma: los que están demasiado cerca del anterior y los que siguen la misma
+dirección. Al terminar el trazo se aplica Douglas-Peucker.
+
+Las firmas se guardan en un formato vectorial compacto y se exportan como PNG
+reducido, generado sin PIL. No importa Kivy.
+"""
+import math
+import struct
+import zlib
+from array import array
+
+# Distancia mínima (px) entre puntos consecutivos guardados
+DISTANCIA_MIN = 2.0
+# Cambio de dirección (grados) por debajo del cual se alarga el último segmento
+ANGULO_MIN = 4.0
+# Tolerancia (px) de Douglas-Peucker al cerrar el trazo
+TOLERANCIA_DP = 0.8
+# Puntos por segmento dibujado: al mover el dedo solo se reenvía el último
+# segmento a la GPU, así el costo por toque no crece con la firma
+PUNTOS_POR_SEGMENTO = 64
+
+DESCARTADO, AGREGADO, REEMPLAZADO = 0, 1, 2
+
+
+class Trazo:
+    """Puntos (x, y) intercalados de un trazo, en coordenadas del panel."""
+
+    __slots__ = ('puntos', '_fijo', '_distancia2', '_coseno', '_direccion')
+
+    def __init__(self, puntos=None, distancia_min=DISTANCIA_MIN, angulo_min=ANGULO_MIN):
+        self.puntos = array('f', puntos or ())
+        # Índice del último punto que ya no puede reemplazarse
+        self._fijo = len(self.puntos) // 2 - 1
+        self._distancia2 = distancia_min * distancia_min
+        self._coseno = math.cos(math.radians(angulo_min))
+        # Dirección con la que nació el último segmento; se compara siempre con
+        # ella para que alargarlo no acumule desvío en curvas suaves
+        self._direccion = None
+
+    def __len__(self):
+        return len(self.puntos) // 2
+
+    def fijar(self):
+        """Impide que el último punto se reemplace (ya se dibujó en otro segmento)."""
+        self._fijo = len(self) - 1
+
+    def agregar(self, x, y):
+        """Agrega un punto y devuelve DESCARTADO, AGREGADO o REEMPLAZADO."""
+        p = self.puntos
+        n = len(p)
+        if n:
+            dx = x - p[n - 2]
+            dy = y - p[n - 1]
+            if dx * dx + dy * dy < self._distancia2:
+                return DESCARTADO
+            if n >= 4 and n // 2 - 1 > self._fijo and self._direccion:
+                # Si el punto sigue la dirección del último segmento, lo alarga
+                bx = x - p[n - 4]
+                by = y - p[n - 3]
+                norma = math.hypot(bx, by)
+                ax, ay = self._direccion
+                if norma and (ax * bx + ay * by) / norma >= self._coseno:
+                    p[n - 2] = x
+                    p[n - 1] = y
+                    return REEMPLAZADO
+            norma = math.hypot(dx, dy)
+            self._direccion = (dx / norma, dy / norma)
+        p.append(x)
+        p.append(y)
+        return AGREGADO
+
+    def simplificar(self, tolerancia=TOLERANCIA_DP):
+        """Aplica Douglas-Peucker al trazo completo y devuelve cuántos puntos quitó."""
+        antes = len(self)
+        if antes > 2:
+            self.puntos = douglas_peucker(self.puntos, tolerancia)
+            self._fijo = len(self) - 1
+        return antes - len(self)
+
+
+class TrazoEnCurso:
+    """Trazo que se está dibujando y los puntos de su segmento visible.
+
+    Los toques llegan en coordenadas de pantalla; el ``Trazo`` los guarda
+    relativos a ``origen`` (la esquina del panel) y ``segmento`` los guarda
+    tal cual, listos para la línea que se dibuja.
+    """
+
+    __slots__ = ('trazo', 'segmento', '_origen_x', '_origen_y')
+
+    def __init__(self, x, y, origen=(0, 0)):
+        self._origen_x, self._origen_y = origen
+        self.trazo = Trazo()
+        self.trazo.agregar(x - self._origen_x, y - self._origen_y)
+        self.segmento = [x, y]
+
+    def agregar(self, x, y):
+        """Agrega un toque y devuelve DESCARTADO, AGREGADO o REEMPLAZADO."""
+        resultado = self.trazo.agregar(x - self._origen_x, y - self._origen_y)
+        if resultado == REEMPLAZADO:
+            self.segmento[-2:] = [x, y]
+        elif resultado == AGREGADO:
+            self.segmento += [x, y]
+        return resultado
+
+    def cortar_si_lleno(self):
+        """Si el segmento tiene PUNTOS_POR_SEGMENTO puntos, lo deja fijo y empieza otro.
+
+        El nuevo segmento continúa desde el último punto. Devuelve True si cortó.
+        """
+        if len(self.segmento) < 2 * PUNTOS_POR_SEGMENTO:
+            return False
+        self.trazo.fijar()
+        self.segmento = self.segmento[-2:]
+        return True
+
+
+def douglas_peucker(puntos, tolerancia):
+    """Simplifica una polilínea intercalada (x0, y0, x1, y1, ...) sin recursión."""
+    n = len(puntos) // 2
+    if n < 3:
+        return array('f', puntos)
+    conservar = bytearray(n)
+    conservar[0] = conservar[n - 1] = 1
+    tolerancia2 = tolerancia * tolerancia
+    pila = [(0, n - 1)]
+    while pila:
+        inicio, fin = pila.pop()
+        x0, y0 = puntos[2 * inicio], puntos[2 * inicio + 1]
+        x1, y1 = puntos[2 * fin], puntos[2 * fin + 1]
+        dx, dy = x1 - x0, y1 - y0
+        largo2 = dx * dx + dy * dy
+        peor, indice = -1.0, -1
+        for i in range(inicio + 1, fin):
+            px, py = puntos[2 * i] - x0, puntos[2 * i + 1] - y0
+            if largo2:
+                cruz = px * dy - py * dx
+                distancia2 = cruz * cruz / largo2
+            else:
+                distancia2 = px * px + py * py
+            if distancia2 > peor:
+                peor, indice = distancia2, i
+        if peor > tolerancia2:
+            conservar[indice] = 1
+            pila.append((inicio, indice))
+            pila.append((indice, fin))
+    resultado = array('f')
+    for i in range(n):
+        if conservar[i]:
+            resultado.append(puntos[2 * i])
+            resultado.append(puntos[2 * i + 1])
+    return resultado
+
+
+# --- Serialización compacta y PNG ---------------------------------------
+
+_MAGIA = b'FIR1'
+# Ancho máximo del PNG de la firma; basta para leerla en un informe
+ANCHO_PNG = 320
+
+
+def _zigzag(valor):
+    return (valor << 1) ^ (valor >> 31)
+
+
+def _escribir_varint(salida, valor):
+    while valor > 0x7F:
+        salida.append((valor & 0x7F) | 0x80)
+        valor >>= 7
+    salida.append(valor)
+
+
+def _leer_varint(datos, pos):
+    valor = desplazamiento = 0
+    while True:
+        byte = datos[pos]
+        pos += 1
+        valor |= (byte & 0x7F) << desplazamiento
+        if byte < 0x80:
+            return valor, pos
+        desplazamiento += 7
+
+
+def serializar(trazos, ancho, alto):
+    """Codifica los trazos en bytes: coordenadas enteras en deltas varint + zlib.
+
+    Una firma típica ocupa unos cientos de bytes.
+    """
+    salida = bytearray(_MAGIA)
+    for valor in (int(round(ancho)), int(round(alto)), len(trazos)):
+        _escribir_varint(salida, valor)
+    for trazo in trazos:
+        puntos = trazo.puntos if isinstance(trazo, Trazo) else trazo
+        _escribir_varint(salida, len(puntos) // 2)
+        x_ant = y_ant = 0
+        for i in range(0, len(puntos) - 1, 2):
+            x, y = int(round(puntos[i])), int(round(puntos[i + 1]))
+            _escribir_varint(salida, _zigzag(x - x_ant))
+            _escribir_varint(salida, _zigzag(y - y_ant))
+            x_ant, y_ant = x, y
+    return _MAGIA + zlib.compress(bytes(salida[len(_MAGIA):]), 9)
+
+
+def deserializar(datos):
+    """Inverso de ``serializar``: devuelve (ancho, alto, [array('f'), ...])."""
+    if not datos.startswith(_MAGIA):
+        raise ValueError('Formato de firma desconocido')
+    datos = zlib.decompress(datos[len(_MAGIA):])
+    ancho, pos = _leer_varint(datos, 0)
+    alto, pos = _leer_varint(datos, pos)
+    num_trazos, pos = _leer_varint(datos, pos)
+    trazos = []
+    for _ in range(num_trazos):
+        num_puntos, pos = _leer_varint(datos, pos)
+        puntos = array('f')
+        x = y = 0
+        for _ in range(num_puntos):
+            dx, pos = _leer_varint(datos, pos)
+            dy, pos = _leer_varint(datos, pos)
+            x += (dx >> 1) ^ -(dx & 1)
+            y += (dy >> 1) ^ -(dy & 1)
+            puntos.append(x)
+            puntos.append(y)
+        trazos.append(puntos)
+    return ancho, alto, trazos
+
+
+def _trazar(mapa, ancho, alto, x0, y0, x1, y1):
+    # Bresenham con un pincel de 2x2 píxeles
+    dx, dy = abs(x1 - x0), -abs(y1 - y0)
+    sx = 1 if x0 < x1 else -1
+    sy = 1 if y0 < y1 else -1
+    error = dx + dy
+    while True:
+        for px in (x0, x0 + 1):
+            for py in (y0, y0 + 1):
+                if 0 <= px < ancho and 0 <= py < alto:
+                    mapa[py * ancho + px] = 1
+        if x0 == x1 and y0 == y1:
+            return
+        e2 = 2 * error
+        if e2 >= dy:
+            error += dy
+            x0 += sx
+        if e2 <= dx:
+            error += dx
+            y0 += sy
+
+
+def rasterizar(datos, ancho_max=ANCHO_PNG):
+    """Dibuja una firma serializada en un mapa de bits reducido.
+
+    Devuelve (ancho, alto, bytearray) con 1 = tinta, fila 0 arriba.
+    """
+    ancho, alto, trazos = deserializar(datos)
+    escala = min(1.0, ancho_max / ancho) if ancho else 1.0
+    ancho_px = max(1, int(ancho * escala))
+    alto_px = max(1, int(alto * escala))
+    mapa = bytearray(ancho_px * alto_px)
+    for puntos in trazos:
+        # Kivy tiene el origen abajo; el PNG, arriba
+        xy = [(int(puntos[i] * escala), alto_px - 1 - int(puntos[i + 1] * escala))
+              for i in range(0, len(puntos), 2)]
+        if len(xy) == 1:
+            xy.append(xy[0])
+        for (x0, y0), (x1, y1) in zip(xy, xy[1:]):
+            _trazar(mapa, ancho_px, alto_px, x0, y0, x1, y1)
+    return ancho_px, alto_px, mapa
+
+
+def _fragmento_png(tipo, contenido):
+    return (struct.pack('>I', len(contenido)) + tipo + contenido
+            + struct.pack('>I', zlib.crc32(tipo + contenido) & 0xFFFFFFFF))
+
+
+def codificar_png(ancho, alto, mapa):
+    """PNG en blanco y negro de 1 bit por píxel a partir de un mapa 0/1."""
+    filas = bytearray()
+    for y in range(alto):
+        filas.append(0)
+        fila = mapa[y * ancho:(y + 1) * ancho]
+        for x in range(0, ancho, 8):
+            byte = 0xFF
+            for bit, tinta in enumerate(fila[x:x + 8]):
+                if tinta:
+                    byte &= ~(0x80 >> bit)
+            filas.append(byte & 0xFF)
+    return (b'\x89PNG\r\n\x1a\n'
+            + _fragmento_png(b'IHDR', struct.pack('>IIBBBBB', ancho, alto, 1, 0, 0, 0, 0))
+            + _fragmento_png(b'IDAT', zlib.compress(bytes(filas), 9))
+            + _fragmento_png(b'IEND', b''))
+
+
+def guardar_png(datos, ruta, ancho_max=ANCHO_PNG):
+    """Renderiza una firma serializada a ``ruta``; pensado para un hilo de trabajo."""
+    with open(ruta, 'wb') as f:
+        f.write(codificar_png(*rasterizar(datos, ancho_max)))
+    return ruta
@@ -0,0 +1,182 @@
+"""Fotos de los tocones: copia reducida, miniatura y caché acotada de miniaturas.
+
+La foto de la cámara no se guarda tal cual. En un hilo de trabajo se
+decodifica ya reducida (los JPEG se escalan al decodificar con ``draft``, sin
+armar la imagen completa en memoria), se guarda una copia de ``LADO_FOTO``
+px, que es la que se exporta, y una miniatura de ``LADO_MINIATURA`` px para la
+lista y el formulario.
+
+Las miniaturas se decodifican en un hilo propio y la interfaz convierte los
+píxeles en textura; ``CacheLRU`` limita por bytes cuántas texturas quedan en
+memoria. Requiere PIL (pillow), que se importa al procesar la primera foto.
+No importa Kivy.
+"""
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from trabajos import ErrorTrabajo
+
+# Lado mayor de la copia que se guarda y se exporta
+LADO_FOTO = 1600
+# Lado mayor de la miniatura; 96 px en RGBA son 36 KB de textura
+LADO_MINIATURA = 96
+CALIDAD_JPEG = 80
+# Alcanza para las miniaturas de 200 tocones con margen
+MAX_BYTES_MINIATURAS = 8 * 1024 * 1024
+
+
+def ruta_foto(carpeta, nombre):
+    return os.path.join(carpeta, f'{nombre}.jpg')
+
+
+def ruta_miniatura(carpeta, nombre):
+    return os.path.join(carpeta, f'{nombre}_min.jpg')
+
+
+def _pil():
+    try:
+        from PIL import Image, ImageOps  # diferido: solo lo necesitan las fotos
+    except ImportError as e:
+        raise ErrorTrabajo('foto', 'Falta el módulo PIL (pillow)', e) from e
+    return Image, ImageOps
+
+
+def _guardar_jpeg(imagen, ruta, calidad):
+    temporal = f'{ruta}.tmp'
+    imagen.save(temporal, 'JPEG', quality=calidad, optimize=True)
+    os.replace(temporal, ruta)
+
+
+def procesar_foto(origen, carpeta, lado=LADO_FOTO, lado_miniatura=LADO_MINIATURA,
+                  calidad=CALIDAD_JPEG, borrar_origen=False):
+    """Guarda la copia reducida y la miniatura de ``origen``; devuelve el nombre de la foto.
+
+    ``borrar_origen`` elimina la captura original de la cámara una vez
+    guardadas las copias. Corre fuera del hilo de la UI.
+    """
+    Image, ImageOps = _pil()
+    nombre = uuid.uuid4().hex[:16]
+    try:
+        os.makedirs(carpeta, exist_ok=True)
+        with Image.open(origen) as original:
+            # En JPEG decodifica directamente a 1/2, 1/4 u 1/8 del tamaño
+            original.draft('RGB', (lado, lado))
+            imagen = ImageOps.exif_transpose(original).convert('RGB')
+        imagen.thumbnail((lado, lado))
+        _guardar_jpeg(imagen, ruta_foto(carpeta, nombre), calidad)
+        imagen.thumbnail((lado_miniatura, lado_miniatura))
+        _guardar_jpeg(imagen, ruta_miniatura(carpeta, nombre), calidad)
+    except OSError as e:
+        raise ErrorTrabajo('foto', f'{origen}\n{e}', e) from e
+    if borrar_origen:
+        try:
+            os.remove(origen)
+        except OSError:
+            pass
+    return nombre
+
+
+def decodificar_miniatura(ruta):
+    """Devuelve (ancho, alto, píxeles RGBA de arriba hacia abajo) de una miniatura."""
+    Image, _ = _pil()
+    with Image.open(ruta) as imagen:
+        imagen = imagen.convert('RGBA')
+        return imagen.width, imagen.height, imagen.tobytes()
+
+
+class CacheLRU:
+    """Diccionario acotado por bytes que descarta lo usado hace más tiempo."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._datos = OrderedDict()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def __contains__(self, clave):
+        return clave in self._datos
+
+    def obtener(self, clave):
+        if clave not in self._datos:
+            return None
+        self._datos.move_to_end(clave)
+        return self._datos[clave][0]
+
+    def poner(self, clave, valor, tamano):
+        self.descartar(clave)
+        self._datos[clave] = (valor, tamano)
+        self.bytes += tamano
+        # El último agregado se queda aunque solo él ya supere el límite
+        while self.bytes > self.max_bytes and len(self._datos) > 1:
+            _, (_, liberado) = self._datos.popitem(last=False)
+            self.bytes -= liberado
+
+    def descartar(self, clave):
+        anterior = self._datos.pop(clave, None)
+        if anterior is not None:
+            self.bytes -= anterior[1]
+
+
+def _despachar_directo(funcion, *args):
+    funcion(*args)
+
+
+class CargadorMiniaturas:
+    """Carga miniaturas sin bloquear la UI y guarda lo que arma ``crear`` en una CacheLRU.
+
+    ``crear(ancho, alto, pixeles)`` corre en el hilo de ``despachar`` (en la
+    app, el de Kivy, que es el único que puede crear texturas).
+    """
+
+    def __init__(self, carpeta, crear, despachar=_despachar_directo,
+                 max_bytes=MAX_BYTES_MINIATURAS):
+        self.carpeta = carpeta
+        self.crear = crear
+        self.despachar = despachar
+        self.cache = CacheLRU(max_bytes)
+        # Un solo hilo: las miniaturas son chicas y así no compiten con la exportación
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='miniaturas')
+        self._esperando = {}
+        self._bloqueo = threading.Lock()
+
+    def pedir(self, nombre, al_listo):
+        """Devuelve la miniatura si está en caché; si no, la carga y llama a ``al_listo(nombre, valor)``.
+
+        ``valor`` es None si la miniatura no existe o no se pudo leer.
+        """
+        valor = self.cache.obtener(nombre)
+        if valor is not None:
+            return valor
+        with self._bloqueo:
+            if nombre in self._esperando:
+                # Ya se está cargando: no se decodifica dos veces
+                self._esperando[nombre].append(al_listo)
+                return None
+            self._esperando[nombre] = [al_listo]
+        self._pool.submit(self._cargar, nombre)
+        return None
+
+    def _cargar(self, nombre):
+        try:
+            decodificada = decodificar_miniatura(ruta_miniatura(self.carpeta, nombre))
+        except Exception:
+            # Cualquier fallo de PIL (no solo OSError) se entrega como None:
+            # si no, la miniatura quedaría esperando para siempre
+            decodificada = None
+        self.despachar(self._entregar, nombre, decodificada)
+
+    def _entregar(self, nombre, decodificada):
+        valor = None
+        if decodificada is not None:
+            ancho, alto, pixeles = decodificada
+            valor = self.crear(ancho, alto, pixeles)
+            self.cache.poner(nombre, valor, len(pixeles))
+        with self._bloqueo:
+            esperando = self._esperando.pop(nombre, [])
+        for al_listo in esperando:
+            al_listo(nombre, valor)
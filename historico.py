@@ -0,0 +1,374 @@
+"""Archivo histórico de evaluaciones completas en formato columnar comprimido.
+
+Un único archivo al que solo se le agregan bloques. Cada bloque guarda un
+conjunto de tocones columna por columna: las medidas como arreglos binarios
+de números, y los nombres (finca, lote, personas) codificados con un
+diccionario por bloque. Cada columna se comprime por separado, así que una
+consulta solo descomprime las columnas que pide, y la cabecera del bloque
+(rango de fechas, fincas, evaluaciones) permite saltar bloques enteros sin
+leerlos. En escritorio el archivo se lee con mmap. No importa Kivy.
+
+Volver a archivar una evaluación reemplaza su versión anterior: al leer solo
+cuenta el último bloque que la contiene, y ``compactar`` borra las copias
+viejas y junta los bloques pequeños.
+
+Uso:
+    python historico.py importar evaluaciones.db historico.tch
+    python historico.py consultar historico.tch --desde 01/01/2026 [--finca NOMBRE]
+"""
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from itertools import compress
+
+from calculos import UMBRALES, calcular_ratios
+from esquema import CAMPOS_RATIO, CAMPOS_TOCON, fecha_entera
+
+MAGIA = b'TCB1'
+# Magia, largo de la cabecera JSON y largo de los datos del bloque
+_CABECERA = struct.Struct('<4sII')
+FILAS_POR_BLOQUE = 4096
+# Con más bloques chicos que esto, ``agregar`` compacta el archivo
+MAX_BLOQUES_CHICOS = 64
+NIVEL_COMPRESION = 6
+
+# Texto que se repite mucho entre tocones: se codifica con diccionario
+COLUMNAS_TEXTO = ['finca', 'lote', 'especie', 'supervisor', 'evaluador', 'motosierrista']
+# Tipo de ``array`` de cada columna numérica; los valores faltantes son NaN
+COLUMNAS_NUMERO = dict(
+    [('evaluacion', 'i'), ('fecha', 'i'), ('numero', 'i'), ('edad', 'd')]
+    + [(campo.nombre, 'd') for campo in CAMPOS_TOCON + CAMPOS_RATIO])
+COLUMNAS = ['evaluacion', 'fecha', 'numero'] + COLUMNAS_TEXTO + list(COLUMNAS_NUMERO)[3:]
+# Los arreglos se guardan en little-endian sea cual sea el equipo
+_INVERTIR_BYTES = sys.byteorder != 'little'
+
+
+def _flotante(valor):
+    if valor is None or valor == '':
+        return math.nan
+    try:
+        return float(str(valor).replace(',', '.'))
+    except ValueError:
+        return math.nan
+
+
+def _filas(evaluacion_id, encabezado, datos_tocones):
+    """Un dict por tocón con las columnas del histórico."""
+    fecha = fecha_entera(encabezado.get('evaluacion'))
+    edad = _flotante(encabezado.get('edad'))
+    textos = {columna: str(encabezado.get(columna) or '') for columna in COLUMNAS_TEXTO}
+    for numero in sorted(datos_tocones):
+        datos = datos_tocones[numero]
+        fila = dict(textos, evaluacion=evaluacion_id, fecha=fecha, numero=numero, edad=edad)
+        for campo in CAMPOS_TOCON + CAMPOS_RATIO:
+            valor = datos.get(campo.nombre)
+            fila[campo.nombre] = math.nan if valor is None else float(valor)
+        yield fila
+
+
+def _codificar_bloque(filas):
+    """Serializa una lista de filas como un bloque completo (cabecera y datos)."""
+    trozos = []
+    posiciones = {}
+    diccionarios = {}
+    inicio = 0
+    for columna in COLUMNAS:
+        valores = [fila[columna] for fila in filas]
+        if columna in COLUMNAS_NUMERO:
+            arreglo = array(COLUMNAS_NUMERO[columna], valores)
+        else:
+            diccionario = sorted(set(valores))
+            codigos = {texto: i for i, texto in enumerate(diccionario)}
+            arreglo = array('H', [codigos[texto] for texto in valores])
+            diccionarios[columna] = diccionario
+        if _INVERTIR_BYTES:
+            arreglo.byteswap()
+        trozo = zlib.compress(arreglo.tobytes(), NIVEL_COMPRESION)
+        posiciones[columna] = [inicio, len(trozo)]
+        inicio += len(trozo)
+        trozos.append(trozo)
+    fechas = [fila['fecha'] for fila in filas]
+    cabecera = json.dumps({
+        'filas': len(filas),
+        'evaluaciones': sorted({fila['evaluacion'] for fila in filas}),
+        'fechas': [min(fechas), max(fechas)],
+        'columnas': posiciones,
+        'diccionarios': diccionarios,
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return b''.join([_CABECERA.pack(MAGIA, len(cabecera), inicio), cabecera] + trozos)
+
+
+def _escribir_bloques(f, filas):
+    """Escribe ``filas`` (agrupadas por evaluación) en bloques de hasta FILAS_POR_BLOQUE.
+
+    Una evaluación nunca se parte entre dos bloques: ``leer`` solo toma el
+    último bloque que la nombra, así que la parte anterior se perdería. Una
+    evaluación más grande que un bloque va sola en uno más grande.
+    """
+    inicio = 0
+    while inicio < len(filas):
+        fin = corte = min(len(filas), inicio + FILAS_POR_BLOQUE)
+        while inicio < corte < len(filas) and \
+                filas[corte]['evaluacion'] == filas[corte - 1]['evaluacion']:
+            corte -= 1
+        if corte > inicio:
+            fin = corte
+        else:
+            # La evaluación sola no cabe: el bloque llega hasta su última fila
+            while fin < len(filas) and filas[fin]['evaluacion'] == filas[fin - 1]['evaluacion']:
+                fin += 1
+        f.write(_codificar_bloque(filas[inicio:fin]))
+        inicio = fin
+
+
+class _Bloque:
+    __slots__ = ('posicion', 'inicio_datos', 'fin', 'filas', 'evaluaciones', 'fechas',
+                 'columnas', 'diccionarios')
+
+    def __init__(self, posicion, inicio_datos, fin, cabecera):
+        self.posicion = posicion
+        self.inicio_datos = inicio_datos
+        self.fin = fin
+        self.filas = cabecera['filas']
+        self.evaluaciones = cabecera['evaluaciones']
+        self.fechas = cabecera['fechas']
+        self.columnas = cabecera['columnas']
+        self.diccionarios = cabecera['diccionarios']
+
+    def columna(self, datos, nombre):
+        inicio, largo = self.columnas[nombre]
+        inicio += self.inicio_datos
+        crudo = zlib.decompress(datos[inicio:inicio + largo])
+        arreglo = array(COLUMNAS_NUMERO.get(nombre, 'H'))
+        arreglo.frombytes(crudo)
+        if _INVERTIR_BYTES:
+            arreglo.byteswap()
+        if nombre in COLUMNAS_NUMERO:
+            return arreglo
+        diccionario = self.diccionarios[nombre]
+        return [diccionario[codigo] for codigo in arreglo]
+
+
+def _leer_bloques(datos):
+    """Índice de bloques de ``datos``; se detiene en el primer bloque incompleto."""
+    bloques = []
+    posicion = 0
+    while posicion + _CABECERA.size <= len(datos):
+        magia, largo_cabecera, largo_datos = _CABECERA.unpack_from(datos, posicion)
+        inicio_datos = posicion + _CABECERA.size + largo_cabecera
+        fin = inicio_datos + largo_datos
+        if magia != MAGIA or fin > len(datos):
+            break
+        try:
+            cabecera = json.loads(bytes(datos[posicion + _CABECERA.size:inicio_datos]))
+        except ValueError:
+            break
+        bloques.append(_Bloque(posicion, inicio_datos, fin, cabecera))
+        posicion = fin
+    return bloques
+
+
+class _Lectura:
+    """Contenido del archivo mapeado en memoria (o leído, si mmap no está disponible)."""
+
+    def __init__(self, ruta):
+        self._archivo = None
+        self._mapa = None
+        try:
+            self._archivo = open(ruta, 'rb')
+        except FileNotFoundError:
+            self.datos = b''
+            return
+        try:
+            self._mapa = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+            self.datos = memoryview(self._mapa)
+        except (OSError, ValueError):
+            # Archivo vacío o sistema sin mmap
+            self.datos = self._archivo.read()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if isinstance(self.datos, memoryview):
+            self.datos.release()
+        if self._mapa is not None:
+            self._mapa.close()
+        if self._archivo is not None:
+            self._archivo.close()
+
+
+class Historico:
+    """Archivo histórico compartido entre la UI y los hilos de trabajo."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._bloqueo = threading.RLock()
+
+    def _bloques(self):
+        with _Lectura(self.ruta) as lectura:
+            return _leer_bloques(lectura.datos)
+
+    def agregar(self, evaluacion_id, encabezado, datos_tocones):
+        """Archiva (o reemplaza) una evaluación; ``encabezado`` es el dict de texto de las pantallas."""
+        self.agregar_varias([(evaluacion_id, encabezado, datos_tocones)])
+
+    def agregar_varias(self, evaluaciones):
+        filas = [fila for evaluacion in evaluaciones for fila in _filas(*evaluacion)]
+        if not filas:
+            return
+        with self._bloqueo:
+            bloques = self._bloques()
+            fin_valido = bloques[-1].fin if bloques else 0
+            with open(self.ruta, 'ab') as f:
+                # Un corte de luz pudo dejar un bloque a medias al final
+                if f.tell() != fin_valido:
+                    f.truncate(fin_valido)
+                    f.seek(fin_valido)
+                _escribir_bloques(f, filas)
+                f.flush()
+                os.fsync(f.fileno())
+            chicos = sum(bloque.filas < FILAS_POR_BLOQUE // 4 for bloque in bloques)
+            if chicos >= MAX_BLOQUES_CHICOS:
+                self.compactar()
+
+    def leer(self, columnas=None, desde=None, hasta=None, finca=None):
+        """Devuelve {columna: valores} de los tocones vigentes que pasan el filtro.
+
+        ``desde`` y ``hasta`` son fechas dd/mm/aaaa inclusive. Solo se
+        descomprimen las columnas pedidas (más las del filtro); los bloques
+        fuera del rango de fechas o sin la finca ni se tocan.
+        """
+        columnas = list(columnas or COLUMNAS)
+        desconocidas = set(columnas) - set(COLUMNAS)
+        if desconocidas:
+            raise ValueError(f'Columnas desconocidas: {", ".join(sorted(desconocidas))}')
+        minimo = fecha_entera(desde) if desde else None
+        maximo = fecha_entera(hasta) if hasta else None
+        resultado = {columna: (array(COLUMNAS_NUMERO[columna]) if columna in COLUMNAS_NUMERO
+                               else []) for columna in columnas}
+        with self._bloqueo, _Lectura(self.ruta) as lectura:
+            bloques = _leer_bloques(lectura.datos)
+            ultimo = {}
+            for i, bloque in enumerate(bloques):
+                for evaluacion_id in bloque.evaluaciones:
+                    ultimo[evaluacion_id] = i
+            for i, bloque in enumerate(bloques):
+                if minimo is not None and bloque.fechas[1] < minimo:
+                    continue
+                if maximo is not None and bloque.fechas[0] > maximo:
+                    continue
+                if finca is not None and finca not in bloque.diccionarios['finca']:
+                    continue
+                vigentes = {e for e in bloque.evaluaciones if ultimo[e] == i}
+                if not vigentes:
+                    continue
+                mascara = self._mascara(lectura.datos, bloque, vigentes, minimo, maximo, finca)
+                for columna in columnas:
+                    valores = bloque.columna(lectura.datos, columna)
+                    resultado[columna].extend(valores if mascara is None
+                                              else compress(valores, mascara))
+        return resultado
+
+    @staticmethod
+    def _mascara(datos, bloque, vigentes, minimo, maximo, finca):
+        """Filas del bloque que pasan el filtro, o None si pasan todas."""
+        condiciones = []
+        if len(vigentes) < len(bloque.evaluaciones):
+            condiciones.append(('evaluacion', vigentes.__contains__))
+        if minimo is not None and bloque.fechas[0] < minimo:
+            condiciones.append(('fecha', lambda fecha: fecha >= minimo))
+        if maximo is not None and bloque.fechas[1] > maximo:
+            condiciones.append(('fecha', lambda fecha: fecha <= maximo))
+        if finca is not None and bloque.diccionarios['finca'] != [finca]:
+            condiciones.append(('finca', finca.__eq__))
+        if not condiciones:
+            return None
+        mascara = [True] * bloque.filas
+        for columna, condicion in condiciones:
+            mascara = [m and condicion(v) for m, v in zip(mascara, bloque.columna(datos, columna))]
+        return mascara
+
+    def compactar(self):
+        """Reescribe el archivo sin versiones reemplazadas y con bloques llenos, ordenado por fecha."""
+        with self._bloqueo:
+            columnas = self.leer()
+            filas = [dict(zip(columnas, valores)) for valores in zip(*columnas.values())]
+            filas.sort(key=lambda fila: (fila['fecha'], fila['evaluacion'], fila['numero']))
+            temporal = f'{self.ruta}.tmp'
+            with open(temporal, 'wb') as f:
+                _escribir_bloques(f, filas)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, self.ruta)
+
+    def resumen(self, desde=None, hasta=None, finca=None, umbrales=UMBRALES):
+        """Tocones, evaluaciones y % de cumplimiento; lee solo las columnas de medidas."""
+        columnas = self.leer(['evaluacion', 'd', 'ct', 'cd', 'ab'], desde, hasta, finca)
+        medidas = [[None if v != v else v for v in columnas[c]] for c in ('d', 'ct', 'cd', 'ab')]
+        ratios = calcular_ratios(*medidas, umbrales)
+        tocones = len(columnas['evaluacion'])
+        cumple = sum(1 for ok in ratios.cumple if ok)
+        return {'tocones': tocones, 'evaluaciones': len(set(columnas['evaluacion'])),
+                'cumple': cumple, 'porcentaje_cumple': cumple / tocones * 100 if tocones else None}
+
+
+def importar_almacen(almacen, historico, lote=200):
+    """Archiva todas las evaluaciones completas del almacén; devuelve cuántas."""
+    ids = [evaluacion.id for evaluacion in
+           almacen.listar_evaluaciones(estado='completa', limite=-1)]
+    for inicio in range(0, len(ids), lote):
+        evaluaciones = []
+        for evaluacion_id in ids[inicio:inicio + lote]:
+            evaluacion = almacen.obtener_evaluacion(evaluacion_id)
+            evaluaciones.append((evaluacion.id, evaluacion.encabezado(),
+                                 {t.numero: t.como_datos() for t in evaluacion.tocones}))
+        historico.agregar_varias(evaluaciones)
+    return len(ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Archivo histórico columnar de evaluaciones.')
+    sub = parser.add_subparsers(dest='orden', required=True)
+    importar = sub.add_parser('importar', help='archiva las evaluaciones completas de un almacén')
+    importar.add_argument('almacen', help='base SQLite de la app (evaluaciones.db)')
+    importar.add_argument('historico')
+    consultar = sub.add_parser('consultar', help='resumen de cumplimiento de un período')
+    consultar.add_argument('historico')
+    consultar.add_argument('--desde', help='dd/mm/aaaa')
+    consultar.add_argument('--hasta', help='dd/mm/aaaa')
+    consultar.add_argument('--finca')
+    compactar = sub.add_parser('compactar', help='quita versiones viejas y junta bloques')
+    compactar.add_argument('historico')
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    if args.orden == 'importar':
+        from almacen import AlmacenEvaluaciones
+        almacen = AlmacenEvaluaciones(args.almacen)
+        try:
+            cantidad = importar_almacen(almacen, Historico(args.historico))
+        finally:
+            almacen.cerrar()
+        print(f'{cantidad} evaluaciones archivadas en {args.historico}')
+    elif args.orden == 'consultar':
+        resumen = Historico(args.historico).resumen(args.desde, args.hasta, args.finca)
+        porcentaje = resumen['porcentaje_cumple']
+        print(f"{resumen['evaluaciones']} evaluaciones, {resumen['tocones']} tocones, "
+              f"{'-' if porcentaje is None else f'{porcentaje:.1f} %'} cumple")
+    else:
+        Historico(args.historico).compactar()
+    print(f'{time.perf_counter() - inicio:.2f}s', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
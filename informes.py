@@ -0,0 +1,486 @@
+"""Informe PDF de una evaluación para el cliente.
+
+Incluye encabezado, resumen de cumplimiento, un gráfico por ratio con su
+banda objetivo, la tabla de tocones, las firmas (como trazos vectoriales) y
+los QR de transferencia. El PDF se escribe directamente, sin reportlab ni
+matplotlib, con las fuentes Helvetica estándar que traen todos los lectores,
+así que no se incrustan fuentes.
+
+Lo que no cambia entre informes se arma una sola vez por proceso: la tabla
+de anchos de la fuente, los textos medidos y la plantilla de cada gráfico
+(marco, banda, ejes y rótulos, como Form XObject comprimido). Cada informe
+solo agrega sus puntos, su tabla y sus firmas. Se genera en un hilo de
+trabajo de la app o por lotes en varios procesos. No importa Kivy.
+
+Uso:
+    python informes.py evaluaciones.db CARPETA [--desde dd/mm/aaaa] [--procesos N]
+"""
+import argparse
+import functools
+import math
+import os
+import sys
+import time
+import unicodedata
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from calculos import UMBRALES, calcular_ratios_tocones
+from esquema import CAMPOS_ENCABEZADO_FORMULARIO, CAMPOS_NUMERO, CAMPOS_RATIO, CAMPOS_TOCON
+from firmas import deserializar
+
+ANCHO_PAGINA, ALTO_PAGINA = 595, 842  # A4 en puntos
+MARGEN = 40
+ANCHO_UTIL = ANCHO_PAGINA - 2 * MARGEN
+
+# Anchos (milésimas de em) de Helvetica para los caracteres 32 a 126
+_ANCHOS_HELVETICA = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+# La negrita es algo más ancha; basta para alinear y recortar
+_FACTOR_NEGRITA = 1.07
+
+# Objetos 1 y 2 de todo PDF: así la plantilla en caché puede referirlos
+_FUENTES = (b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>')
+_RECURSOS_FUENTES = '/Font << /F1 1 0 R /F2 2 0 R >>'
+
+VERDE = (0.18, 0.62, 0.33)
+ROJO = (0.85, 0.2, 0.17)
+GRIS = (0.5, 0.5, 0.5)
+GRIS_CLARO = (0.93, 0.93, 0.93)
+BANDA = (0.85, 0.94, 0.85)
+
+# (campo, título, rango del eje y) de cada gráfico
+GRAFICOS = [('ct_d', 'CT/d (%)', (40, 90)), ('cd_d', 'CD/d (%)', (0, 40)),
+            ('ab_d', 'AB/d (%)', (0, 25))]
+ALTO_GRAFICO = 105
+
+# Títulos cortos de la tabla: N°, una columna por campo de CAMPOS_TOCON, ratios y cumple
+COLUMNAS_TABLA = ([CAMPOS_NUMERO[0].titulo_corto]
+                  + [campo.titulo_corto for campo in CAMPOS_TOCON + CAMPOS_RATIO] + ['Cumple'])
+# Posición en la tabla del primer ratio y de la columna Cumple
+_COLUMNA_RATIOS = 1 + len(CAMPOS_TOCON)
+_COLUMNA_CUMPLE = _COLUMNA_RATIOS + len(CAMPOS_RATIO)
+ALTO_FILA = 14
+
+
+@functools.lru_cache(maxsize=4096)
+def ancho_texto(texto, tamano, negrita=False):
+    """Ancho en puntos de ``texto`` con Helvetica; los textos repetidos salen de la caché."""
+    total = 0
+    for caracter in texto:
+        codigo = ord(caracter)
+        if not 32 <= codigo <= 126:
+            # Letras con tilde: el ancho de la letra base
+            base = unicodedata.normalize('NFKD', caracter)[:1]
+            codigo = ord(base) if base and 32 <= ord(base) <= 126 else 110
+        total += _ANCHOS_HELVETICA[codigo - 32]
+    return total * tamano / 1000 * (_FACTOR_NEGRITA if negrita else 1)
+
+
+def _cadena(texto):
+    crudo = str(texto).encode('cp1252', 'replace')
+    return b'(' + crudo.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _color(rgb):
+    return ' '.join(f'{c:.3f}' for c in rgb)
+
+
+class Lienzo:
+    """Operadores de contenido de una página (origen abajo a la izquierda, en puntos)."""
+
+    def __init__(self):
+        self.partes = []
+
+    def texto(self, x, y, texto, tamano=9, negrita=False, color=None, alinear='izquierda'):
+        if alinear != 'izquierda':
+            ancho = ancho_texto(texto, tamano, negrita)
+            x -= ancho if alinear == 'derecha' else ancho / 2
+        relleno = f'{_color(color)} rg ' if color else ''
+        self.partes.append(f'BT {relleno}/F{2 if negrita else 1} {tamano} Tf {x:.2f} {y:.2f} Td '
+                           .encode('ascii') + _cadena(texto) + b' Tj ET\n')
+        if color:
+            self.partes.append(b'0 g\n')
+
+    def rectangulo(self, x, y, ancho, alto, relleno=None, borde=None, grosor=0.5):
+        ops = [f'{x:.2f} {y:.2f} {ancho:.2f} {alto:.2f} re']
+        if relleno and borde:
+            ops.insert(0, f'{_color(relleno)} rg {_color(borde)} RG {grosor} w')
+            ops.append('B 0 g 0 G')
+        elif relleno:
+            ops.insert(0, f'{_color(relleno)} rg')
+            ops.append('f 0 g')
+        else:
+            ops.insert(0, f'{_color(borde or (0, 0, 0))} RG {grosor} w')
+            ops.append('S 0 G')
+        self.partes.append((' '.join(ops) + '\n').encode('ascii'))
+
+    def linea(self, x0, y0, x1, y1, color=(0, 0, 0), grosor=0.5):
+        self.partes.append(f'{_color(color)} RG {grosor} w {x0:.2f} {y0:.2f} m {x1:.2f} {y1:.2f} l S 0 G\n'
+                           .encode('ascii'))
+
+    def plantilla(self, nombre, x, y):
+        self.partes.append(f'q 1 0 0 1 {x:.2f} {y:.2f} cm /{nombre} Do Q\n'.encode('ascii'))
+
+    def crudo(self, operadores):
+        self.partes.append(operadores)
+
+    def contenido(self):
+        return b''.join(self.partes)
+
+
+@functools.lru_cache(maxsize=32)
+def _plantilla_grafico(campo, umbrales):
+    """Form XObject comprimido con el marco, la banda objetivo y los ejes de un gráfico."""
+    titulo, (minimo, maximo) = next((t, r) for c, t, r in GRAFICOS if c == campo)
+    alto_trazado = ALTO_GRAFICO - 22
+    izquierda = 30
+
+    def y_de(valor):
+        return 8 + (valor - minimo) / (maximo - minimo) * alto_trazado
+
+    if campo == 'ct_d':
+        banda = (umbrales.ct_objetivo - umbrales.ct_tolerancia,
+                 umbrales.ct_objetivo + umbrales.ct_tolerancia)
+        leyenda = f'objetivo {umbrales.ct_objetivo:g} ± {umbrales.ct_tolerancia:g}'
+    elif campo == 'cd_d':
+        banda = (umbrales.cd_min, umbrales.cd_max)
+        leyenda = f'entre {umbrales.cd_min:g} y {umbrales.cd_max:g}'
+    else:
+        banda = (minimo, umbrales.ab_max)
+        leyenda = f'hasta {umbrales.ab_max:g}'
+
+    lienzo = Lienzo()
+    y0, y1 = y_de(max(minimo, banda[0])), y_de(min(maximo, banda[1]))
+    # Una banda muy angosta se ve igual como franja de al menos 2 puntos
+    if y1 - y0 < 2:
+        y0, y1 = (y0 + y1) / 2 - 1, (y0 + y1) / 2 + 1
+    lienzo.rectangulo(izquierda, y0, ANCHO_UTIL - izquierda, y1 - y0, relleno=BANDA)
+    paso = 10 if maximo - minimo > 30 else 5
+    for valor in range(int(minimo), int(maximo) + 1, paso):
+        y = y_de(valor)
+        lienzo.linea(izquierda, y, ANCHO_UTIL, y, color=GRIS_CLARO, grosor=0.3)
+        lienzo.texto(izquierda - 3, y - 2.5, f'{valor}', 7, color=GRIS, alinear='derecha')
+    lienzo.rectangulo(izquierda, 8, ANCHO_UTIL - izquierda, alto_trazado, borde=GRIS)
+    lienzo.texto(izquierda, ALTO_GRAFICO - 10, titulo, 9, negrita=True)
+    lienzo.texto(ANCHO_UTIL, ALTO_GRAFICO - 10, leyenda, 8, color=GRIS, alinear='derecha')
+    datos = zlib.compress(lienzo.contenido(), 6)
+    return (f'<< /Type /XObject /Subtype /Form /BBox [0 0 {ANCHO_UTIL} {ALTO_GRAFICO}] '
+            f'/Resources << {_RECURSOS_FUENTES} >> /Filter /FlateDecode /Length {len(datos)} >>\n'
+            'stream\n').encode('ascii') + datos + b'\nendstream'
+
+
+class _Documento:
+    """Objetos PDF numerados; ``bytes`` arma la tabla xref y el trailer."""
+
+    def __init__(self):
+        self.objetos = list(_FUENTES)
+        self.paginas = []
+        self.plantillas = {}
+
+    def agregar(self, contenido):
+        self.objetos.append(contenido)
+        return len(self.objetos)
+
+    def flujo(self, datos):
+        datos = zlib.compress(datos, 6)
+        return self.agregar(f'<< /Filter /FlateDecode /Length {len(datos)} >>\nstream\n'
+                            .encode('ascii') + datos + b'\nendstream')
+
+    def plantilla(self, nombre, contenido):
+        if nombre not in self.plantillas:
+            self.plantillas[nombre] = self.agregar(contenido)
+        return nombre
+
+    def pagina(self, lienzo):
+        self.paginas.append(self.flujo(lienzo.contenido()))
+
+    def bytes(self):
+        numero_paginas = len(self.objetos) + 1
+        primera_pagina = numero_paginas + 1
+        xobjetos = ' '.join(f'/{nombre} {num} 0 R' for nombre, num in self.plantillas.items())
+        recursos = f'<< {_RECURSOS_FUENTES} /XObject << {xobjetos} >> >>'
+        kids = ' '.join(f'{primera_pagina + i} 0 R' for i in range(len(self.paginas)))
+        objetos = self.objetos + [
+            f'<< /Type /Pages /Kids [{kids}] /Count {len(self.paginas)} >>'.encode('ascii')]
+        for contenido in self.paginas:
+            objetos.append(f'<< /Type /Page /Parent {numero_paginas} 0 R '
+                           f'/MediaBox [0 0 {ANCHO_PAGINA} {ALTO_PAGINA}] '
+                           f'/Resources {recursos} /Contents {contenido} 0 R >>'.encode('ascii'))
+        catalogo = len(objetos) + 1
+        objetos.append(f'<< /Type /Catalog /Pages {numero_paginas} 0 R >>'.encode('ascii'))
+
+        salida = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        posiciones = []
+        for num, contenido in enumerate(objetos, 1):
+            posiciones.append(len(salida))
+            salida += f'{num} 0 obj\n'.encode('ascii') + contenido + b'\nendobj\n'
+        inicio_xref = len(salida)
+        salida += f'xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n'.encode('ascii')
+        salida += b''.join(f'{p:010d} 00000 n \n'.encode('ascii') for p in posiciones)
+        salida += (f'trailer\n<< /Size {len(objetos) + 1} /Root {catalogo} 0 R >>\n'
+                   f'startxref\n{inicio_xref}\n%%EOF\n').encode('ascii')
+        return bytes(salida)
+
+
+def _numero(valor, decimales=1):
+    if valor is None or valor != valor:
+        return ''
+    return f'{valor:.{decimales}f}'
+
+
+def _dibujar_firma(lienzo, vector, x, y, ancho, alto):
+    ancho_panel, alto_panel, trazos = deserializar(vector)
+    if not ancho_panel or not alto_panel:
+        return
+    escala = min(ancho / ancho_panel, alto / alto_panel)
+    ops = ['0.1 0.1 0.4 RG 0.9 w 1 J 1 j']
+    for puntos in trazos:
+        if len(puntos) < 2:
+            continue
+        xy = [(x + puntos[i] * escala, y + puntos[i + 1] * escala) for i in range(0, len(puntos), 2)]
+        if len(xy) == 1:
+            xy.append((xy[0][0] + 0.5, xy[0][1]))
+        ops.append(f'{xy[0][0]:.1f} {xy[0][1]:.1f} m '
+                   + ' '.join(f'{px:.1f} {py:.1f} l' for px, py in xy[1:]) + ' S')
+    ops.append('0 G')
+    lienzo.crudo(('\n'.join(ops) + '\n').encode('ascii'))
+
+
+def _dibujar_qr(lienzo, matriz, x, y, lado):
+    modulo = lado / len(matriz)
+    ops = []
+    for fila, modulos in enumerate(matriz):
+        py = y + lado - (fila + 1) * modulo
+        inicio = None
+        # Un rectángulo por tramo de módulos negros seguidos
+        for columna, negro in enumerate(list(modulos) + [False]):
+            if negro and inicio is None:
+                inicio = columna
+            elif not negro and inicio is not None:
+                ops.append(f'{x + inicio * modulo:.2f} {py:.2f} '
+                           f'{(columna - inicio) * modulo:.2f} {modulo:.2f} re')
+                inicio = None
+    lienzo.crudo(('\n'.join(ops) + '\nf\n').encode('ascii'))
+
+
+def informe_pdf(encabezado, datos_tocones, firmas=None, umbrales=UMBRALES, matrices_qr=None):
+    """Bytes del PDF de una evaluación con los datos tal como los usan las pantallas."""
+    numeros = sorted(datos_tocones)
+    tocones = [datos_tocones[numero] for numero in numeros]
+    ratios = calcular_ratios_tocones(tocones, umbrales)
+    filas_ratios = list(ratios.filas())
+    documento = _Documento()
+    lienzo = Lienzo()
+    y = ALTO_PAGINA - MARGEN
+
+    lienzo.texto(MARGEN, y - 14, 'Evaluación de tocones', 16, negrita=True)
+    lienzo.texto(ANCHO_PAGINA - MARGEN, y - 14, encabezado.get('evaluacion') or '', 10,
+                 alinear='derecha')
+    y -= 34
+    campos = [campo for campo in CAMPOS_ENCABEZADO_FORMULARIO if campo.nombre != 'muestra']
+    mitad = (len(campos) + 1) // 2
+    for i, campo in enumerate(campos):
+        x = MARGEN + (ANCHO_UTIL / 2 if i >= mitad else 0)
+        fila_y = y - (i % mitad) * 13
+        lienzo.texto(x, fila_y, f'{campo.etiqueta.split(" (")[0]}:', 9, negrita=True)
+        lienzo.texto(x + 90, fila_y, encabezado.get(campo.nombre) or '', 9)
+    y -= mitad * 13 + 8
+
+    total = len(tocones)
+    cumplen = sum(1 for ok in ratios.cumple if ok)
+    resumen = [('Tocones', f'{total}')]
+    for nombre, banderas in (('CT', ratios.ct_ok), ('CD', ratios.cd_ok), ('AB', ratios.ab_ok)):
+        resumen.append((f'{nombre} cumple', f'{sum(1 for ok in banderas if ok) / total * 100:.0f} %'
+                        if total else '-'))
+    resumen.append(('Cumple todo', f'{cumplen / total * 100:.0f} %' if total else '-'))
+    ancho_celda = ANCHO_UTIL / len(resumen)
+    lienzo.rectangulo(MARGEN, y - 30, ANCHO_UTIL, 32, relleno=GRIS_CLARO)
+    for i, (titulo, valor) in enumerate(resumen):
+        centro = MARGEN + ancho_celda * (i + 0.5)
+        lienzo.texto(centro, y - 10, titulo, 8, color=GRIS, alinear='centro')
+        lienzo.texto(centro, y - 25, valor, 12, negrita=True, alinear='centro')
+    y -= 44
+
+    for indice, (campo, _, (minimo, maximo)) in enumerate(GRAFICOS):
+        y -= ALTO_GRAFICO
+        nombre = documento.plantilla(f'G{campo}', _plantilla_grafico(campo, umbrales))
+        lienzo.plantilla(nombre, MARGEN, y)
+        izquierda = MARGEN + 30
+        ancho_trazado = ANCHO_UTIL - 30
+        for i, fila in enumerate(filas_ratios):
+            valor, ok = fila[indice], fila[indice + 3]
+            if valor != valor:
+                continue
+            px = izquierda + (i + 0.5) * ancho_trazado / max(1, total)
+            py = y + 8 + (min(max(valor, minimo), maximo) - minimo) / (maximo - minimo) * (ALTO_GRAFICO - 22)
+            lienzo.rectangulo(px - 1.6, py - 1.6, 3.2, 3.2, relleno=VERDE if ok else ROJO)
+        y -= 6
+
+    anchos = [ANCHO_UTIL / len(COLUMNAS_TABLA)] * len(COLUMNAS_TABLA)
+
+    def cabecera_tabla(y):
+        lienzo.rectangulo(MARGEN, y - ALTO_FILA + 3, ANCHO_UTIL, ALTO_FILA, relleno=GRIS_CLARO)
+        x = MARGEN
+        for titulo, ancho in zip(COLUMNAS_TABLA, anchos):
+            lienzo.texto(x + ancho - 3, y - 8, titulo, 7, negrita=True, alinear='derecha')
+            x += ancho
+        return y - ALTO_FILA
+
+    y = cabecera_tabla(y - 4)
+    for i, (numero, datos, fila) in enumerate(zip(numeros, tocones, filas_ratios)):
+        if y < MARGEN + ALTO_FILA:
+            documento.pagina(lienzo)
+            lienzo = Lienzo()
+            y = cabecera_tabla(ALTO_PAGINA - MARGEN)
+        ok = all(fila[3:]) and fila[0] == fila[0]
+        celdas = ([str(numero)] + [_numero(datos.get(campo.nombre)) for campo in CAMPOS_TOCON]
+                  + [_numero(valor) for valor in fila[:3]] + ['Sí' if ok else 'No'])
+        if i % 2:
+            lienzo.rectangulo(MARGEN, y - ALTO_FILA + 3, ANCHO_UTIL, ALTO_FILA, relleno=(0.97, 0.97, 0.97))
+        x = MARGEN
+        for j, (celda, ancho) in enumerate(zip(celdas, anchos)):
+            color = None
+            if _COLUMNA_RATIOS <= j < _COLUMNA_CUMPLE and celda:
+                color = VERDE if fila[j - _COLUMNA_RATIOS + 3] else ROJO
+            elif j == _COLUMNA_CUMPLE:
+                color = VERDE if ok else ROJO
+            lienzo.texto(x + ancho - 3, y - 8, celda, 8, color=color, alinear='derecha')
+            x += ancho
+        y -= ALTO_FILA
+
+    firmas = {rol: vector for rol, vector in (firmas or {}).items() if vector}
+    matrices_qr = matrices_qr or []
+    filas_qr = math.ceil(len(matrices_qr) / 4)
+    alto_final = (120 if firmas else 0) + filas_qr * 130
+    if alto_final and y - 20 - alto_final < MARGEN:
+        documento.pagina(lienzo)
+        lienzo = Lienzo()
+        y = ALTO_PAGINA - MARGEN
+    y -= 20
+    if firmas:
+        for i, rol in enumerate(('evaluador', 'motosierrista')):
+            x = MARGEN + i * (ANCHO_UTIL / 2 + 10)
+            ancho = ANCHO_UTIL / 2 - 10
+            if rol in firmas:
+                _dibujar_firma(lienzo, firmas[rol], x, y - 90, ancho, 85)
+            lienzo.linea(x, y - 95, x + ancho, y - 95, color=GRIS)
+            lienzo.texto(x, y - 107, f'Firma {rol}: {encabezado.get(rol) or ""}', 8)
+        y -= 120
+    for i, matriz in enumerate(matrices_qr):
+        x = MARGEN + (i % 4) * (ANCHO_UTIL / 4)
+        fila_y = y - (i // 4 + 1) * 130
+        _dibujar_qr(lienzo, matriz, x, fila_y + 12, 115)
+        lienzo.texto(x + 57, fila_y, f'QR {i + 1} de {len(matrices_qr)}', 7, color=GRIS,
+                     alinear='centro')
+    documento.pagina(lienzo)
+    return documento.bytes()
+
+
+def guardar_informe(ruta, *args, **kwargs):
+    """Escribe el PDF en ``ruta`` pasando por un temporal; devuelve la ruta."""
+    datos = informe_pdf(*args, **kwargs)
+    temporal = f'{ruta}.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+    return ruta
+
+
+def matrices_evaluacion(encabezado, datos_tocones):
+    """Matrices QR de la evaluación, o [] si no está instalado qrcode."""
+    from transferencia_qr import matriz_qr, partes_evaluacion
+    try:
+        return [matriz_qr(parte) for parte in partes_evaluacion(encabezado, datos_tocones)]
+    except ImportError:
+        return []
+
+
+# --- Lotes en varios procesos ---------------------------------------------
+
+_almacen_proceso = None
+
+
+def _iniciar_proceso(ruta_almacen):
+    global _almacen_proceso
+    from almacen import AlmacenEvaluaciones
+    # Una conexión por proceso; las cachés de fuente y plantillas viven lo mismo
+    _almacen_proceso = AlmacenEvaluaciones(ruta_almacen)
+
+
+def _informe_de_almacen(evaluacion_id, carpeta, umbrales, con_qr):
+    """Genera el informe de una evaluación del almacén; devuelve (id, ruta, error)."""
+    try:
+        evaluacion = _almacen_proceso.obtener_evaluacion(evaluacion_id)
+        encabezado = evaluacion.encabezado()
+        datos_tocones = {t.numero: t.como_datos() for t in evaluacion.tocones}
+        ruta = os.path.join(carpeta, f'Informe_Tocones_{evaluacion_id:06d}.pdf')
+        guardar_informe(ruta, encabezado, datos_tocones, evaluacion.firmas, umbrales,
+                        matrices_evaluacion(encabezado, datos_tocones) if con_qr else None)
+        return evaluacion_id, ruta, None
+    except Exception as e:
+        return evaluacion_id, None, f'{type(e).__name__}: {e}'
+
+
+def generar_informes(ruta_almacen, carpeta, ids, umbrales=UMBRALES, procesos=None, con_qr=True):
+    """Genera un PDF por evaluación repartiendo el trabajo entre procesos.
+
+    Devuelve un iterador de (id, ruta, error) en el orden de ``ids`` a medida
+    que se terminan, para informar el avance sin esperar el lote completo.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    procesos = procesos or os.cpu_count() or 1
+    funcion = functools.partial(_informe_de_almacen, carpeta=carpeta, umbrales=umbrales,
+                                con_qr=con_qr)
+    if procesos <= 1 or len(ids) <= 1:
+        _iniciar_proceso(ruta_almacen)
+        yield from map(funcion, ids)
+        return
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso,
+                             initargs=(ruta_almacen,)) as pool:
+        lote = max(1, min(16, len(ids) // (procesos * 4)))
+        yield from pool.map(funcion, ids, chunksize=lote)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera informes PDF de evaluaciones de tocones.')
+    parser.add_argument('almacen', help='base SQLite de la app (evaluaciones.db)')
+    parser.add_argument('carpeta', help='carpeta de salida de los PDF')
+    parser.add_argument('--desde', help='fecha de evaluación mínima (dd/mm/aaaa)')
+    parser.add_argument('--hasta', help='fecha de evaluación máxima (dd/mm/aaaa)')
+    parser.add_argument('--finca')
+    parser.add_argument('--procesos', type=int, default=None,
+                        help='procesos en paralelo (por defecto, todos los núcleos)')
+    parser.add_argument('--sin-qr', action='store_true', help='no incluir los códigos QR')
+    args = parser.parse_args(argv)
+
+    from almacen import AlmacenEvaluaciones
+    almacen = AlmacenEvaluaciones(args.almacen)
+    try:
+        ids = [evaluacion.id for evaluacion in almacen.listar_evaluaciones(
+            finca=args.finca, desde=args.desde, hasta=args.hasta, estado='completa', limite=-1)]
+    finally:
+        almacen.cerrar()
+
+    inicio = time.perf_counter()
+    errores = 0
+    for evaluacion_id, ruta, error in generar_informes(args.almacen, args.carpeta, ids,
+                                                       procesos=args.procesos,
+                                                       con_qr=not args.sin_qr):
+        if error:
+            errores += 1
+            print(f'{evaluacion_id}: {error}', file=sys.stderr)
+    print(f'{len(ids) - errores} informes, {errores} con error '
+          f'en {time.perf_counter() - inicio:.1f}s -> {args.carpeta}')
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,326 @@
+"""Finca y lote de una posición GPS a partir de los polígonos de lotes en GeoJSON.
+
+Los polígonos se guardan en arreglos planos (coordenadas, inicio de cada
+anillo, inicio de cada polígono y su caja) y se reparten en una rejilla
+uniforme del tamaño medio de un lote. Un polígono que ocuparía más de
+``MAX_CELDAS_POR_POLIGONO`` celdas (una finca entera, un lote muy alargado)
+va a una lista aparte en lugar de repetirse en cada celda. Buscar un punto
+revisa solo los polígonos de su celda y los de esa lista: primero la caja y
+después punto en polígono (par-impar, así los huecos quedan fuera). Con
+decenas de miles de lotes la búsqueda tarda décimas de milisegundo.
+
+Leer el GeoJSON y armar la rejilla se hace una vez: el índice se guarda en un
+archivo binario (cabecera JSON y los arreglos tal cual) junto con el tamaño y
+la fecha de los GeoJSON, y se rehace solo si cambian. No importa Kivy.
+
+Uso:
+    python lotes.py buscar LONGITUD LATITUD lotes.geojson [--cache lotes.indice]
+"""
+import argparse
+import json
+import math
+import os
+import struct
+import sys
+import time
+from array import array
+from itertools import chain
+
+MAGIA = b'LOT1'
+VERSION = 2
+# Magia y largo de la cabecera JSON
+_CABECERA = struct.Struct('<4sI')
+# Arreglos del índice, en el orden en que se guardan
+_ARREGLOS = (('coordenadas', 'd'), ('anillos', 'I'), ('poligonos', 'I'), ('cajas', 'd'),
+             ('lote_de', 'I'), ('celdas', 'I'), ('ids', 'I'), ('grandes', 'I'))
+# Celdas por polígono en promedio, para que lotes dispersos no inflen la rejilla
+CELDAS_POR_POLIGONO = 4
+# Un polígono que cubre más celdas que esto se revisa aparte, en ``grandes``
+MAX_CELDAS_POR_POLIGONO = 64
+
+
+def _poligonos_geometria(geometria):
+    """Anillos de cada polígono de una geometría GeoJSON; ignora puntos y líneas."""
+    if not geometria:
+        return
+    tipo = geometria.get('type')
+    if tipo == 'Polygon':
+        yield geometria['coordinates']
+    elif tipo == 'MultiPolygon':
+        yield from geometria['coordinates']
+    elif tipo == 'GeometryCollection':
+        for parte in geometria.get('geometries', ()):
+            yield from _poligonos_geometria(parte)
+
+
+def firma_geojson(rutas, propiedad_finca='finca', propiedad_lote='lote'):
+    """Tamaño y fecha de los GeoJSON; si cambia, el índice guardado ya no sirve."""
+    firma = [VERSION, propiedad_finca, propiedad_lote]
+    for ruta in sorted(rutas):
+        estado = os.stat(ruta)
+        firma.append([os.path.abspath(ruta), estado.st_size, estado.st_mtime_ns])
+    return firma
+
+
+class IndiceLotes:
+    """Polígonos de lotes con su rejilla; ``buscar(lon, lat)`` devuelve (finca, lote) o None."""
+
+    def __init__(self, nombres, coordenadas, anillos, poligonos, cajas, lote_de,
+                 rejilla, celdas, ids, grandes, firma=None):
+        self.nombres = nombres
+        self.coordenadas = coordenadas
+        self.anillos = anillos
+        self.poligonos = poligonos
+        self.cajas = cajas
+        self.lote_de = lote_de
+        # (x0, y0, ancho de celda, alto de celda, columnas, filas)
+        self.rejilla = rejilla
+        # Polígonos de la celda c: ids[celdas[c]:celdas[c + 1]]
+        self.celdas = celdas
+        self.ids = ids
+        # Polígonos demasiado grandes para repartirlos en la rejilla
+        self.grandes = grandes
+        self.firma = firma
+
+    def __len__(self):
+        return len(self.poligonos) - 1
+
+    @classmethod
+    def desde_features(cls, features, propiedad_finca='finca', propiedad_lote='lote'):
+        nombres = []
+        coordenadas = array('d')
+        anillos = array('I', [0])
+        poligonos = array('I', [0])
+        cajas = array('d')
+        lote_de = array('I')
+        for feature in features:
+            propiedades = feature.get('properties') or {}
+            nombre = tuple('' if propiedades.get(clave) is None else str(propiedades[clave])
+                           for clave in (propiedad_finca, propiedad_lote))
+            agregado = False
+            for anillos_poligono in _poligonos_geometria(feature.get('geometry')):
+                anillos_poligono = [anillo for anillo in anillos_poligono if len(anillo) >= 3]
+                if not anillos_poligono:
+                    continue
+                for anillo in anillos_poligono:
+                    for punto in anillo:
+                        coordenadas.append(punto[0])
+                        coordenadas.append(punto[1])
+                    anillos.append(len(coordenadas))
+                poligonos.append(len(anillos) - 1)
+                # La caja sale del anillo exterior
+                exterior = anillos_poligono[0]
+                xs = [punto[0] for punto in exterior]
+                ys = [punto[1] for punto in exterior]
+                cajas.extend((min(xs), min(ys), max(xs), max(ys)))
+                lote_de.append(len(nombres))
+                agregado = True
+            if agregado:
+                nombres.append(nombre)
+        rejilla, celdas, ids, grandes = cls._armar_rejilla(cajas)
+        return cls(nombres, coordenadas, anillos, poligonos, cajas, lote_de, rejilla, celdas, ids,
+                   grandes)
+
+    @classmethod
+    def desde_geojson(cls, rutas, propiedad_finca='finca', propiedad_lote='lote'):
+        features = []
+        for ruta in rutas:
+            with open(ruta, encoding='utf-8') as f:
+                datos = json.load(f)
+            if datos.get('type') == 'Feature':
+                features.append(datos)
+            else:
+                features.extend(datos.get('features', ()))
+        indice = cls.desde_features(features, propiedad_finca, propiedad_lote)
+        indice.firma = firma_geojson(rutas, propiedad_finca, propiedad_lote)
+        return indice
+
+    @staticmethod
+    def _armar_rejilla(cajas):
+        total = len(cajas) // 4
+        if not total:
+            return (0.0, 0.0, 1.0, 1.0, 0, 0), array('I', [0]), array('I'), array('I')
+        x0, y0 = min(cajas[0::4]), min(cajas[1::4])
+        x1, y1 = max(cajas[2::4]), max(cajas[3::4])
+        # Celda del tamaño medio de un lote: cada uno cae en unas pocas celdas
+        ancho = max(sum(cajas[2::4]) - sum(cajas[0::4]), 1e-9 * total) / total
+        alto = max(sum(cajas[3::4]) - sum(cajas[1::4]), 1e-9 * total) / total
+        columnas = max(1, math.ceil((x1 - x0) / ancho))
+        filas = max(1, math.ceil((y1 - y0) / alto))
+        exceso = columnas * filas / (CELDAS_POR_POLIGONO * total)
+        if exceso > 1:
+            # Lotes muy dispersos: celdas más grandes en lugar de una rejilla casi vacía
+            escala = math.sqrt(exceso)
+            ancho *= escala
+            alto *= escala
+            columnas = max(1, math.ceil((x1 - x0) / ancho))
+            filas = max(1, math.ceil((y1 - y0) / alto))
+
+        def rango(i):
+            c0 = min(columnas - 1, int((cajas[4 * i] - x0) / ancho))
+            c1 = min(columnas - 1, int((cajas[4 * i + 2] - x0) / ancho))
+            f0 = min(filas - 1, int((cajas[4 * i + 1] - y0) / alto))
+            f1 = min(filas - 1, int((cajas[4 * i + 3] - y0) / alto))
+            return c0, c1, f0, f1
+
+        grandes = array('I')
+        en_rejilla = []
+        for i in range(total):
+            c0, c1, f0, f1 = rango(i)
+            if (c1 - c0 + 1) * (f1 - f0 + 1) > MAX_CELDAS_POR_POLIGONO:
+                grandes.append(i)
+            else:
+                en_rejilla.append(i)
+        # Dos pasadas (contar y llenar) para guardar las celdas en un solo arreglo
+        celdas = array('I', bytes(4 * (columnas * filas + 1)))
+        for i in en_rejilla:
+            c0, c1, f0, f1 = rango(i)
+            for fila in range(f0, f1 + 1):
+                for columna in range(c0, c1 + 1):
+                    celdas[fila * columnas + columna + 1] += 1
+        for c in range(1, len(celdas)):
+            celdas[c] += celdas[c - 1]
+        siguiente = array('I', celdas)
+        ids = array('I', bytes(4 * celdas[-1]))
+        for i in en_rejilla:
+            c0, c1, f0, f1 = rango(i)
+            for fila in range(f0, f1 + 1):
+                for columna in range(c0, c1 + 1):
+                    c = fila * columnas + columna
+                    ids[siguiente[c]] = i
+                    siguiente[c] += 1
+        return (x0, y0, ancho, alto, columnas, filas), celdas, ids, grandes
+
+    def _contiene(self, poligono, x, y):
+        c = self.coordenadas
+        dentro = False
+        for anillo in range(self.poligonos[poligono], self.poligonos[poligono + 1]):
+            inicio, fin = self.anillos[anillo], self.anillos[anillo + 1]
+            xj, yj = c[fin - 2], c[fin - 1]
+            for i in range(inicio, fin, 2):
+                xi, yi = c[i], c[i + 1]
+                if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+                    dentro = not dentro
+                xj, yj = xi, yi
+        return dentro
+
+    def buscar(self, lon, lat):
+        x0, y0, ancho, alto, columnas, filas = self.rejilla
+        columna = math.floor((lon - x0) / ancho)
+        fila = math.floor((lat - y0) / alto)
+        if not columnas or not (0 <= columna <= columnas and 0 <= fila <= filas):
+            return None
+        # En el borde este o norte (o por redondeo justo antes) la división da
+        # columnas o filas: se recorta igual que rango() al armar la rejilla
+        columna = min(columnas - 1, columna)
+        fila = min(filas - 1, fila)
+        c = fila * columnas + columna
+        cajas = self.cajas
+        mejor = None
+        for i in chain(self.ids[self.celdas[c]:self.celdas[c + 1]], self.grandes):
+            if not (cajas[4 * i] <= lon <= cajas[4 * i + 2]
+                    and cajas[4 * i + 1] <= lat <= cajas[4 * i + 3]):
+                continue
+            if self._contiene(i, lon, lat):
+                # Si los lotes se solapan gana el más chico
+                area = (cajas[4 * i + 2] - cajas[4 * i]) * (cajas[4 * i + 3] - cajas[4 * i + 1])
+                if mejor is None or area < mejor[0]:
+                    mejor = (area, i)
+        return None if mejor is None else self.nombres[self.lote_de[mejor[1]]]
+
+    def guardar(self, ruta):
+        cabecera = {
+            'version': VERSION,
+            'firma': self.firma,
+            'rejilla': list(self.rejilla),
+            'nombres': self.nombres,
+            'orden': sys.byteorder,
+            'largos': [len(getattr(self, nombre)) for nombre, _ in _ARREGLOS],
+        }
+        contenido = json.dumps(cabecera, ensure_ascii=False).encode('utf-8')
+        temporal = f'{ruta}.tmp'
+        with open(temporal, 'wb') as f:
+            f.write(_CABECERA.pack(MAGIA, len(contenido)))
+            f.write(contenido)
+            for nombre, _ in _ARREGLOS:
+                getattr(self, nombre).tofile(f)
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def leer(cls, ruta):
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+        magia, largo = _CABECERA.unpack_from(datos)
+        if magia != MAGIA:
+            raise ValueError(f'{ruta} no es un índice de lotes')
+        posicion = _CABECERA.size + largo
+        cabecera = json.loads(datos[_CABECERA.size:posicion])
+        if cabecera.get('version') != VERSION:
+            raise ValueError(f'versión de índice {cabecera.get("version")} no soportada')
+        arreglos = {}
+        for (nombre, tipo), cantidad in zip(_ARREGLOS, cabecera['largos']):
+            arreglo = array(tipo)
+            fin = posicion + cantidad * arreglo.itemsize
+            if fin > len(datos):
+                raise ValueError(f'{ruta} está incompleto')
+            arreglo.frombytes(datos[posicion:fin])
+            if cabecera['orden'] != sys.byteorder:
+                arreglo.byteswap()
+            arreglos[nombre] = arreglo
+            posicion = fin
+        return cls([tuple(nombre) for nombre in cabecera['nombres']],
+                   rejilla=tuple(cabecera['rejilla']), firma=cabecera['firma'], **arreglos)
+
+
+def cargar_indice(rutas, ruta_cache, propiedad_finca='finca', propiedad_lote='lote'):
+    """Índice de los GeoJSON de ``rutas``, leído de ``ruta_cache`` si sigue al día.
+
+    Si no, lo arma desde los GeoJSON y lo guarda en ``ruta_cache``. Corre
+    fuera del hilo de la UI: armarlo la primera vez puede tardar segundos.
+    """
+    firma = firma_geojson(rutas, propiedad_finca, propiedad_lote)
+    try:
+        indice = IndiceLotes.leer(ruta_cache)
+        if indice.firma == firma:
+            return indice
+    except (OSError, ValueError, KeyError, struct.error):
+        # Sin caché o dañada: se rehace
+        pass
+    indice = IndiceLotes.desde_geojson(rutas, propiedad_finca, propiedad_lote)
+    try:
+        indice.guardar(ruta_cache)
+    except OSError:
+        # Sin caché igual se puede buscar; se reintenta en el próximo arranque
+        pass
+    return indice
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Finca y lote de una posición según los polígonos de lotes.')
+    sub = parser.add_subparsers(dest='orden', required=True)
+    buscar = sub.add_parser('buscar', help='resuelve una posición (grados decimales)')
+    buscar.add_argument('lon', type=float)
+    buscar.add_argument('lat', type=float)
+    buscar.add_argument('geojson', nargs='+', help='archivos GeoJSON con los polígonos de lotes')
+    buscar.add_argument('--cache', help='archivo del índice (por omisión, junto al primer GeoJSON)')
+    buscar.add_argument('--finca', default='finca', help='propiedad con el nombre de la finca')
+    buscar.add_argument('--lote', default='lote', help='propiedad con el nombre del lote')
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    indice = cargar_indice(args.geojson, args.cache or f'{args.geojson[0]}.indice',
+                           args.finca, args.lote)
+    cargado = time.perf_counter()
+    resultado = indice.buscar(args.lon, args.lat)
+    fin = time.perf_counter()
+    if resultado is None:
+        print('Fuera de los lotes conocidos')
+    else:
+        print(f'Finca: {resultado[0]}  Lote: {resultado[1]}')
+    print(f'{len(indice)} polígonos; índice en {(cargado - inicio) * 1000:.1f} ms, '
+          f'búsqueda en {(fin - cargado) * 1000:.3f} ms', file=sys.stderr)
+    return 0 if resultado is not None else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
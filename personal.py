@@ -0,0 +1,134 @@
+"""Listados de personal (supervisores, evaluadores, motosierristas) y su búsqueda.
+
+Los nombres se leen de ``personal.csv`` (columnas ``rol,nombre``) en la
+carpeta de datos de la app, se completan con los que ya aparecen en el
+almacén y, si no hay archivo, con el listado de fábrica. La búsqueda es por
+prefijo de cualquier palabra del nombre e ignora tildes y mayúsculas:
+"ramirez jul" encuentra "Orozco Ramírez, Juliana". No importa Kivy.
+"""
+import csv
+import os
+import unicodedata
+from bisect import bisect_left
+
+ROLES = ['supervisor', 'evaluador', 'motosierrista']
+
+_EQUIPO_BASE = [
+    "Astudillo Pungo, Elkin Antonio",
+    "Lopez Chandillo, Miguel Angel",
+    "Orozco Ramírez, Juliana",
+    "Hernandez, Erika",
+    "Ramirez Ramirez, Grimaneza",
+    "Tabares Tamayo, Jhon Edward"
+]
+
+# Listado de fábrica, usado mientras no exista personal.csv
+PERSONAL_POR_DEFECTO = {
+    'supervisor': _EQUIPO_BASE,
+    'evaluador': _EQUIPO_BASE,
+    'motosierrista': [
+        "Franco Franco, Ubeimar Ely",
+        "Trejos Rendon, Ivan de Jesus",
+        "Castañeda Vicente, Aldemar",
+        "Hernadez Loaiza, Danover de Jesus",
+        "Gutierrez Parra, Jairo de Jesus",
+        "Jaramillo Ramirez, Rafael Andres",
+        "Cruz Cardona, Cristian Danilo"
+    ],
+}
+
+
+def normalizar(texto):
+    """Minúsculas sin tildes ni signos: 'Castañeda, Aldemar' -> 'castaneda aldemar'."""
+    descompuesto = unicodedata.normalize('NFKD', texto.casefold())
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in sin_tildes).split())
+
+
+class IndicePersonal:
+    """Índice por prefijo de palabra sobre una lista de nombres.
+
+    Guarda una lista ordenada de (palabra normalizada, posición del nombre);
+    cada búsqueda es una bisección por palabra más un filtro sobre pocos
+    candidatos, así que no recorre todo el listado.
+    """
+
+    def __init__(self, nombres):
+        self.nombres = sorted(set(nombre.strip() for nombre in nombres if nombre and nombre.strip()),
+                              key=normalizar)
+        self._palabras_nombre = [normalizar(nombre).split() for nombre in self.nombres]
+        self._palabras = sorted((palabra, i) for i, palabras in enumerate(self._palabras_nombre)
+                                for palabra in set(palabras))
+        self._claves = [palabra for palabra, _ in self._palabras]
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def _con_prefijo(self, prefijo):
+        inicio = bisect_left(self._claves, prefijo)
+        fin = bisect_left(self._claves, prefijo + '\uffff', inicio)
+        return {i for _, i in self._palabras[inicio:fin]}
+
+    def buscar(self, consulta, limite=None):
+        """Nombres en los que cada palabra de ``consulta`` es prefijo de alguna palabra del nombre."""
+        palabras = normalizar(consulta or '').split()
+        if not palabras:
+            return self.nombres[:limite] if limite else list(self.nombres)
+        # La palabra más larga suele ser la más selectiva
+        palabras.sort(key=len, reverse=True)
+        candidatos = self._con_prefijo(palabras[0])
+        resultado = []
+        for i in sorted(candidatos):
+            del_nombre = self._palabras_nombre[i]
+            if all(any(p.startswith(palabra) for p in del_nombre) for palabra in palabras[1:]):
+                resultado.append(self.nombres[i])
+                if limite and len(resultado) >= limite:
+                    break
+        return resultado
+
+
+def leer_listado(ruta):
+    """Lee ``personal.csv`` y devuelve {rol: [nombres]}; un rol vacío o 'todos' vale para los tres."""
+    listado = {rol: [] for rol in ROLES}
+    with open(ruta, newline='', encoding='utf-8-sig') as f:
+        for fila in csv.DictReader(f):
+            nombre = (fila.get('nombre') or '').strip()
+            if not nombre:
+                continue
+            rol = normalizar(fila.get('rol') or '')
+            for destino in (ROLES if rol in ('', 'todos') else [rol]):
+                if destino in listado:
+                    listado[destino].append(nombre)
+    return listado
+
+
+class DirectorioPersonal:
+    """Índices por rol, construidos la primera vez que se piden y rehechos si cambia el archivo."""
+
+    def __init__(self, ruta_listado=None, nombres_usados=None):
+        self.ruta_listado = ruta_listado
+        # Función rol -> nombres ya usados en evaluaciones (p. ej. del almacén)
+        self.nombres_usados = nombres_usados
+        self._indices = {}
+        self._version = None
+
+    def _version_archivo(self):
+        try:
+            return os.path.getmtime(self.ruta_listado) if self.ruta_listado else None
+        except OSError:
+            return None
+
+    def indice(self, rol):
+        version = self._version_archivo()
+        if version != self._version:
+            self._indices.clear()
+            self._version = version
+        if rol not in self._indices:
+            if version is not None:
+                nombres = leer_listado(self.ruta_listado).get(rol, [])
+            else:
+                nombres = list(PERSONAL_POR_DEFECTO.get(rol, []))
+            if self.nombres_usados is not None:
+                nombres += self.nombres_usados(rol)
+            self._indices[rol] = IndicePersonal(nombres)
+        return self._indices[rol]
@@ -0,0 +1,228 @@
+"""Utilidades de rendimiento: importaciones diferidas, informe de arranque y traza.
+
+Este módulo no importa Kivy para que pueda usarse desde herramientas sin
+interfaz gráfica.
+"""
+import functools
+import importlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+
+def importar_diferido(nombre):
+    """Importa un módulo pesado solo cuando se necesita por primera vez."""
+    return importlib.import_module(nombre)
+
+
+def precargar_en_segundo_plano(nombres):
+    """Calienta la caché de importaciones en un hilo sin bloquear la interfaz."""
+    def _precargar():
+        for nombre in nombres:
+            try:
+                importlib.import_module(nombre)
+            except ImportError:
+                # Si falta el módulo el error aparecerá al usarlo de verdad
+                pass
+
+    hilo = threading.Thread(target=_precargar, name='precarga_modulos', daemon=True)
+    hilo.start()
+    return hilo
+
+
+class InformeArranque:
+    """Marcas de tiempo del arranque en frío (importación, build, primer cuadro)."""
+
+    def __init__(self, inicio=None):
+        self.inicio = time.perf_counter() if inicio is None else inicio
+        self.marcas = {}
+        # Datos adicionales que se guardan con el informe (p. ej. tiempos por pantalla)
+        self.extras = {}
+
+    def marcar(self, fase):
+        self.marcas[fase] = (time.perf_counter() - self.inicio) * 1000.0
+        return self.marcas[fase]
+
+    def como_dict(self):
+        fases = {}
+        anterior = 0.0
+        for fase, acumulado in self.marcas.items():
+            fases[fase] = round(acumulado - anterior, 2)
+            anterior = acumulado
+        return {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'fases_ms': fases,
+            'total_ms': round(anterior, 2),
+            **self.extras,
+        }
+
+    def resumen(self):
+        datos = self.como_dict()
+        partes = [f"{fase}={ms:.0f}ms" for fase, ms in datos['fases_ms'].items()]
+        return f"Arranque: {', '.join(partes)} (total {datos['total_ms']:.0f}ms)"
+
+    def guardar(self, ruta):
+        # Una línea JSON por arranque para comparar entre versiones
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        with open(ruta, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.como_dict(), ensure_ascii=False) + '\n')
+
+
+class _MedicionInactiva:
+    """Contexto vacío que se devuelve cuando la traza está apagada."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_INACTIVA = _MedicionInactiva()
+
+
+class _Medicion:
+    __slots__ = ('traza', 'nombre', 'datos', 'inicio')
+
+    def __init__(self, traza, nombre, datos):
+        self.traza = traza
+        self.nombre = nombre
+        self.datos = datos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        ms = (time.perf_counter() - self.inicio) * 1000.0
+        if tipo is not None:
+            self.datos['error'] = tipo.__name__
+        self.traza.evento(self.nombre, ms, **self.datos)
+        return False
+
+
+class Traza:
+    """Registro de tiempos en un archivo JSONL rotativo, activable en marcha.
+
+    Apagada, ``medir`` solo consulta un atributo. Encendida, los eventos se
+    acumulan en memoria y un hilo propio los escribe por bloques, así quien
+    registra nunca espera al disco; al superar ``max_bytes`` el archivo pasa
+    a ``.1`` (y este a ``.2``...) conservando ``archivos``.
+    """
+
+    EVENTOS_POR_ESCRITURA = 64
+
+    def __init__(self, ruta=None, max_bytes=512 * 1024, archivos=3):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.archivos = archivos
+        self.activa = False
+        self._pendientes = []
+        self._bloqueo = threading.Lock()
+        # Ordena las escrituras del hilo escritor y de ``vaciar`` sin frenar a ``evento``
+        self._bloqueo_archivo = threading.Lock()
+        self._hay_pendientes = threading.Event()
+        self._escritor = None
+
+    def configurar(self, ruta=None, activa=None):
+        if ruta is not None:
+            self.vaciar()
+            self.ruta = ruta
+        if activa is not None:
+            if not activa:
+                self.vaciar()
+            self.activa = bool(activa) and self.ruta is not None
+
+    def medir(self, nombre, **datos):
+        """Contexto que registra cuánto tarda el bloque: ``with traza.medir('x'):``."""
+        if not self.activa:
+            return _INACTIVA
+        return _Medicion(self, nombre, datos)
+
+    def medido(self, nombre=None):
+        """Decorador equivalente a envolver la función en ``medir``."""
+        def decorar(funcion):
+            etiqueta = nombre or funcion.__qualname__
+
+            @functools.wraps(funcion)
+            def envoltura(*args, **kwargs):
+                if not self.activa:
+                    return funcion(*args, **kwargs)
+                with _Medicion(self, etiqueta, {}):
+                    return funcion(*args, **kwargs)
+            return envoltura
+        return decorar
+
+    def evento(self, nombre, ms=None, **datos):
+        if not self.activa:
+            return
+        registro = {'t': round(time.time(), 3), 'ev': nombre,
+                    'hilo': threading.current_thread().name}
+        if ms is not None:
+            registro['ms'] = round(ms, 2)
+        registro.update(datos)
+        with self._bloqueo:
+            self._pendientes.append(registro)
+            lleno = len(self._pendientes) >= self.EVENTOS_POR_ESCRITURA
+            if lleno and self._escritor is None:
+                self._escritor = threading.Thread(target=self._escribir_en_segundo_plano,
+                                                  name='traza', daemon=True)
+                self._escritor.start()
+        if lleno:
+            self._hay_pendientes.set()
+
+    def _escribir_en_segundo_plano(self):
+        while True:
+            self._hay_pendientes.wait()
+            self._hay_pendientes.clear()
+            self.vaciar()
+
+    def vaciar(self):
+        """Escribe ya los eventos pendientes en el archivo."""
+        with self._bloqueo_archivo:
+            with self._bloqueo:
+                pendientes, self._pendientes = self._pendientes, []
+            if not pendientes or self.ruta is None:
+                return
+            texto = ''.join(json.dumps(r, ensure_ascii=False, default=str) + '\n'
+                            for r in pendientes)
+            try:
+                os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+                if os.path.exists(self.ruta) and \
+                        os.path.getsize(self.ruta) + len(texto) > self.max_bytes:
+                    self._rotar()
+                with open(self.ruta, 'a', encoding='utf-8') as f:
+                    f.write(texto)
+            except OSError:
+                # La traza nunca debe tumbar la app
+                pass
+
+    def _rotar(self):
+        for i in range(self.archivos - 1, 0, -1):
+            origen = self.ruta if i == 1 else f'{self.ruta}.{i - 1}'
+            if os.path.exists(origen):
+                os.replace(origen, f'{self.ruta}.{i}')
+
+    def exportar(self, destino):
+        """Copia la traza completa (archivos rotados incluidos, del más viejo al más nuevo).
+
+        Devuelve ``destino`` o None si no hay nada registrado.
+        """
+        self.vaciar()
+        if self.ruta is None:
+            return None
+        partes = [f'{self.ruta}.{i}' for i in range(self.archivos - 1, 0, -1)] + [self.ruta]
+        partes = [parte for parte in partes if os.path.exists(parte)]
+        if not partes:
+            return None
+        with open(destino, 'wb') as salida:
+            for parte in partes:
+                with open(parte, 'rb') as f:
+                    salida.write(f.read())
+        return destino
+
+
+# Traza compartida por la app y sus trabajos en segundo plano
+traza = Traza()
@@ -0,0 +1,227 @@
+"""Revalidación masiva de archivos Evaluacion_Tocones_*.xlsx históricos.
+
+Lee las medidas crudas de cada archivo, recalcula ratios y cumplimiento con
+los umbrales actuales y escribe un único archivo consolidado con una fila por
+tocón y una fila de error por cada archivo que no se pudo procesar. Los
+archivos se reparten entre procesos; no depende de Kivy ni de pandas.
+
+Uso:
+    python revalidacion.py CARPETA SALIDA.xlsx [--procesos N] [--ct-objetivo 65] ...
+"""
+import argparse
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from functools import partial
+from xml.etree.ElementTree import iterparse, parse
+
+from calculos import UMBRALES, Umbrales, calcular_ratios
+from esquema import CAMPOS_TOCON
+from exportador import COLUMNAS_EVALUACION, abrir_escritor
+
+PATRON_ARCHIVO = ('Evaluacion_Tocones_', '.xlsx')
+COLUMNAS_REVALIDACION = ['archivo'] + COLUMNAS_EVALUACION + ['error']
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PKG = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Columnas con las medidas que se usan para recalcular
+_MEDIDAS = {campo.nombre: campo.columna for campo in CAMPOS_TOCON
+            if campo.nombre in ('d', 'ct', 'cd', 'ab')}
+
+
+def _indice_columna(ref):
+    indice = 0
+    for caracter in ref:
+        if not caracter.isalpha():
+            break
+        indice = indice * 26 + ord(caracter.upper()) - 64
+    return indice - 1
+
+
+def _ruta_primera_hoja(libro):
+    try:
+        with libro.open('xl/workbook.xml') as f:
+            hoja = parse(f).getroot().find(f'{_NS}sheets/{_NS}sheet')
+        rel_id = hoja.get(f'{_NS_REL}id')
+        with libro.open('xl/_rels/workbook.xml.rels') as f:
+            for rel in parse(f).getroot().iter(f'{_NS_PKG}Relationship'):
+                if rel.get('Id') == rel_id:
+                    destino = rel.get('Target').lstrip('/')
+                    return destino if destino.startswith('xl/') else f'xl/{destino}'
+    except (KeyError, AttributeError):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _textos_compartidos(libro):
+    try:
+        f = libro.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+    textos = []
+    with f:
+        for _, elem in iterparse(f):
+            if elem.tag == f'{_NS}si':
+                textos.append(''.join(t.text or '' for t in elem.iter(f'{_NS}t')))
+                elem.clear()
+    return textos
+
+
+def leer_filas_xlsx(ruta):
+    """Itera las filas de la primera hoja como listas de valores.
+
+    Lee en streaming (las filas ya procesadas se liberan) y entiende tanto
+    los archivos de pandas/openpyxl como los de ``exportador``.
+    """
+    with zipfile.ZipFile(ruta) as libro:
+        compartidos = _textos_compartidos(libro)
+        with libro.open(_ruta_primera_hoja(libro)) as hoja:
+            for _, elem in iterparse(hoja):
+                if elem.tag != f'{_NS}row':
+                    continue
+                fila = []
+                for celda in elem.iter(f'{_NS}c'):
+                    ref = celda.get('r')
+                    if ref:
+                        indice = _indice_columna(ref)
+                        fila.extend([None] * (indice - len(fila)))
+                    tipo = celda.get('t')
+                    if tipo == 'inlineStr':
+                        valor = ''.join(t.text or '' for t in celda.iter(f'{_NS}t'))
+                    else:
+                        v = celda.find(f'{_NS}v')
+                        texto = None if v is None else v.text
+                        if texto is None:
+                            valor = None
+                        elif tipo == 's':
+                            indice = int(texto)
+                            # Un índice negativo tomaría otro texto en silencio
+                            if not 0 <= indice < len(compartidos):
+                                raise ValueError(f'texto compartido {indice} inexistente')
+                            valor = compartidos[indice]
+                        elif tipo == 'b':
+                            valor = texto == '1'
+                        elif tipo in ('str', 'e'):
+                            valor = texto
+                        else:
+                            valor = float(texto)
+                    fila.append(valor)
+                elem.clear()
+                yield fila
+
+
+def _numero(valor):
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    if isinstance(valor, str):
+        texto = valor.strip().split('%')[0].strip().replace(',', '.')
+        if texto:
+            return float(texto)
+    return None
+
+
+def revalidar_archivo(ruta, umbrales=UMBRALES):
+    """Recalcula un archivo; devuelve sus filas en el orden de COLUMNAS_REVALIDACION."""
+    nombre = os.path.basename(ruta)
+    try:
+        filas = leer_filas_xlsx(ruta)
+        cabecera = next(filas, None)
+        if cabecera is None:
+            raise ValueError('archivo vacío')
+        posiciones = {col: i for i, col in enumerate(cabecera) if col is not None}
+        faltantes = [col for col in _MEDIDAS.values() if col not in posiciones]
+        if faltantes:
+            raise ValueError(f'faltan columnas: {", ".join(faltantes)}')
+
+        registros = []
+        medidas = {clave: [] for clave in _MEDIDAS}
+        for fila in filas:
+            if not any(v not in (None, '') for v in fila):
+                continue
+            fila = fila + [None] * (len(cabecera) - len(fila))
+            registro = [fila[posiciones[col]] if col in posiciones else None
+                        for col in COLUMNAS_EVALUACION]
+            for clave, columna in _MEDIDAS.items():
+                medidas[clave].append(_numero(fila[posiciones[columna]]))
+            registros.append(registro)
+    except (OSError, zipfile.BadZipFile, KeyError, ValueError, SyntaxError) as e:
+        return [[nombre] + [None] * len(COLUMNAS_EVALUACION) + [f'{type(e).__name__}: {e}']]
+
+    ratios = calcular_ratios(medidas['d'], medidas['ct'], medidas['cd'], medidas['ab'], umbrales)
+    inicio_ratios = COLUMNAS_EVALUACION.index('CT/d*100')
+    resultado = []
+    for i, (registro, valores) in enumerate(zip(registros, ratios.filas())):
+        for clave, columna in _MEDIDAS.items():
+            registro[COLUMNAS_EVALUACION.index(columna)] = medidas[clave][i]
+        registro[inicio_ratios:inicio_ratios + 6] = [
+            round(v, 2) if v == v else None for v in valores[:3]] + list(valores[3:])
+        error = None if valores[0] == valores[0] else 'medidas incompletas'
+        resultado.append([nombre] + registro + [error])
+    return resultado
+
+
+def buscar_archivos(carpeta, recursivo=True):
+    prefijo, extension = PATRON_ARCHIVO
+    for raiz, carpetas, archivos in os.walk(carpeta):
+        for archivo in sorted(archivos):
+            if archivo.startswith(prefijo) and archivo.endswith(extension):
+                yield os.path.join(raiz, archivo)
+        if not recursivo:
+            break
+
+
+def revalidar_carpeta(carpeta, salida, umbrales=UMBRALES, procesos=None, recursivo=True):
+    """Procesa todos los archivos de ``carpeta`` y devuelve (archivos, filas, errores)."""
+    archivos = list(buscar_archivos(carpeta, recursivo))
+    procesos = procesos or os.cpu_count() or 1
+    funcion = partial(revalidar_archivo, umbrales=umbrales)
+    pool = None
+    if procesos > 1 and len(archivos) > 1:
+        pool = ProcessPoolExecutor(max_workers=procesos)
+        # Lotes de archivos por tarea para no pagar el IPC archivo a archivo
+        lote = max(1, min(64, len(archivos) // (procesos * 4)))
+        resultados = pool.map(funcion, archivos, chunksize=lote)
+    else:
+        resultados = map(funcion, archivos)
+
+    total_filas = errores = 0
+    try:
+        with abrir_escritor(salida, COLUMNAS_REVALIDACION) as escritor:
+            for filas in resultados:
+                for fila in filas:
+                    escritor.escribir_fila(fila)
+                    total_filas += 1
+                    errores += fila[-1] is not None
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return len(archivos), total_filas, errores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Recalcula ratios de evaluaciones de tocones históricas.')
+    parser.add_argument('carpeta', help='carpeta con archivos Evaluacion_Tocones_*.xlsx')
+    parser.add_argument('salida', help='archivo consolidado (.xlsx o .csv)')
+    parser.add_argument('--procesos', type=int, default=None,
+                        help='procesos en paralelo (por defecto, todos los núcleos)')
+    parser.add_argument('--no-recursivo', action='store_true', help='no buscar en subcarpetas')
+    for campo, valor in asdict(UMBRALES).items():
+        parser.add_argument(f'--{campo.replace("_", "-")}', type=float, default=valor)
+    args = parser.parse_args(argv)
+
+    umbrales = Umbrales(**{campo: getattr(args, campo) for campo in asdict(UMBRALES)})
+    inicio = time.perf_counter()
+    archivos, filas, errores = revalidar_carpeta(args.carpeta, args.salida, umbrales,
+                                                 args.procesos, not args.no_recursivo)
+    print(f'{archivos} archivos, {filas} filas, {errores} con error '
+          f'en {time.perf_counter() - inicio:.1f}s -> {args.salida}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""Envío de las evaluaciones completas a un servidor central.
+
+Las evaluaciones exportadas quedan en la bandeja de salida del almacén y se
+suben por lotes cuando hay conexión: un POST por lote con el cuerpo JSON
+comprimido en gzip sobre una única conexión HTTP persistente. Cada
+evaluación lleva su clave de idempotencia, así que reenviar un lote tras un
+corte no la duplica en el servidor. Los lotes que fallan se reintentan con
+espera exponencial. No importa Kivy.
+
+Para probar sin el servidor real:
+    python sincronizacion.py servir --puerto 8765 --salida recibidas.jsonl
+y configurar ``url = http://IP_DEL_EQUIPO:8765/evaluaciones`` en tocones.ini.
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import http.client
+import json
+import random
+import sys
+import threading
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from almacen import CAMPOS_ENCABEZADO
+from trabajos import ErrorTrabajo
+
+VERSION_CARGA = 1
+TAMANO_LOTE = 20
+# Espera entre reintentos: 30 s, 1 min, 2 min... hasta 1 h, con ±20 % de azar
+ESPERA_BASE = 30
+ESPERA_MAX = 3600
+
+
+def espera_reintento(intentos, base=ESPERA_BASE, maximo=ESPERA_MAX):
+    espera = min(maximo, base * 2 ** (intentos - 1))
+    # El azar evita que todos los equipos de una cuadrilla reintenten a la vez
+    return espera * random.uniform(0.8, 1.2)
+
+
+def carga_evaluacion(clave, evaluacion):
+    """Dict serializable a JSON con todo lo que el servidor necesita de la evaluación."""
+    return {
+        'clave': clave,
+        'encabezado': {campo: getattr(evaluacion, campo) for campo in CAMPOS_ENCABEZADO},
+        'archivo': evaluacion.archivo,
+        'actualizada': evaluacion.actualizada,
+        'tocones': [asdict(tocon) for tocon in evaluacion.tocones],
+        'firmas': {rol: base64.b64encode(vector).decode('ascii')
+                   for rol, vector in evaluacion.firmas.items()},
+    }
+
+
+class ClienteSincronizacion:
+    """Cliente HTTP que reutiliza la misma conexión entre lotes y entre ciclos."""
+
+    def __init__(self, url, token=None, tiempo_espera=20):
+        partes = urlsplit(url)
+        if partes.scheme not in ('http', 'https') or not partes.hostname:
+            raise ValueError(f'URL de sincronización inválida: {url!r}')
+        self.url = url
+        self._https = partes.scheme == 'https'
+        self._host = partes.hostname
+        self._puerto = partes.port
+        self._ruta = (partes.path or '/') + (f'?{partes.query}' if partes.query else '')
+        self.token = token
+        self.tiempo_espera = tiempo_espera
+        self._conexion = None
+
+    def _conectar(self):
+        if self._conexion is None:
+            clase = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            self._conexion = clase(self._host, self._puerto, timeout=self.tiempo_espera)
+        return self._conexion
+
+    def cerrar(self):
+        if self._conexion is not None:
+            self._conexion.close()
+            self._conexion = None
+
+    def enviar(self, carga, clave_lote):
+        """Envía un lote; devuelve (estado HTTP, respuesta JSON o None).
+
+        Los errores de red se reintentan una vez con una conexión nueva (el
+        servidor pudo cerrar la anterior por inactividad) y después lanzan
+        ErrorTrabajo('red').
+        """
+        cuerpo = gzip.compress(json.dumps(carga, separators=(',', ':')).encode('utf-8'), 6)
+        cabeceras = {
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+            'Accept-Encoding': 'gzip',
+            'Idempotency-Key': clave_lote,
+        }
+        if self.token:
+            cabeceras['Authorization'] = f'Bearer {self.token}'
+        for intento in (1, 2):
+            try:
+                conexion = self._conectar()
+                conexion.request('POST', self._ruta, body=cuerpo, headers=cabeceras)
+                respuesta = conexion.getresponse()
+                datos = respuesta.read()
+                if respuesta.getheader('Content-Encoding') == 'gzip':
+                    datos = gzip.decompress(datos)
+                if respuesta.will_close:
+                    self.cerrar()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                self.cerrar()
+                if intento == 2:
+                    raise ErrorTrabajo('red', f'Sin conexión con {self._host}: {e}', e) from e
+        try:
+            return respuesta.status, json.loads(datos) if datos else None
+        except ValueError:
+            return respuesta.status, None
+
+
+def _clave_lote(claves):
+    # Misma clave para el mismo conjunto de evaluaciones, aunque se reintente
+    return hashlib.sha256('\n'.join(sorted(claves)).encode('ascii')).hexdigest()[:32]
+
+
+def sincronizar(almacen, cliente, tamano_lote=TAMANO_LOTE, progreso=None, espera=espera_reintento):
+    """Sube la bandeja de salida por lotes; devuelve cuántas evaluaciones aceptó el servidor.
+
+    Se detiene en el primer error de red (no tiene sentido seguir sin
+    conexión); los rechazos del servidor aplazan solo las evaluaciones del lote.
+    """
+    enviadas = 0
+    total = almacen.contar_pendientes_envio()
+    while True:
+        pendientes = almacen.pendientes_envio(tamano_lote)
+        if not pendientes:
+            return enviadas
+        claves = [clave for clave, _ in pendientes]
+        carga = {'version': VERSION_CARGA,
+                 'evaluaciones': [carga_evaluacion(clave, evaluacion)
+                                  for clave, evaluacion in pendientes if evaluacion is not None]}
+        try:
+            estado, respuesta = cliente.enviar(carga, _clave_lote(claves))
+        except ErrorTrabajo as e:
+            almacen.registrar_fallo_envio(claves, e.mensaje, espera)
+            raise
+        # Un proxy puede responder JSON que no es un objeto (una lista, un texto)
+        if not isinstance(respuesta, dict):
+            respuesta = {}
+        if 200 <= estado < 300:
+            aceptadas = set(respuesta.get('aceptadas', claves))
+            almacen.marcar_enviadas([clave for clave in claves if clave in aceptadas])
+            rechazadas = [clave for clave in claves if clave not in aceptadas]
+            if rechazadas:
+                almacen.registrar_fallo_envio(rechazadas, 'rechazada por el servidor', espera)
+            enviadas += len(claves) - len(rechazadas)
+        else:
+            mensaje = str(respuesta.get('error', f'HTTP {estado}'))
+            almacen.registrar_fallo_envio(claves, mensaje, espera)
+            if estado >= 500 or estado in (408, 429):
+                # Servidor saturado o caído: el resto de la bandeja puede esperar
+                raise ErrorTrabajo('servidor', mensaje)
+        if progreso is not None and total:
+            progreso(min(1.0, enviadas / total), f'{enviadas} de {total} evaluaciones enviadas')
+
+
+# --- Servidor de prueba -------------------------------------------------
+
+class _ManejadorPrueba(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        try:
+            datos = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Encoding') == 'gzip':
+                datos = gzip.decompress(datos)
+            carga = json.loads(datos)
+            evaluaciones = carga['evaluaciones']
+        except (ValueError, KeyError, OSError) as e:
+            return self._responder(400, {'error': f'cuerpo inválido: {e}'})
+        aceptadas = self.server.recibir(evaluaciones)
+        self._responder(200, {'aceptadas': aceptadas})
+
+    def _responder(self, estado, contenido):
+        cuerpo = json.dumps(contenido).encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        if self.server.verboso:
+            super().log_message(formato, *args)
+
+
+class ServidorPrueba(ThreadingHTTPServer):
+    """Servidor local que hace de punto de recolección: guarda cada evaluación una vez."""
+
+    daemon_threads = True
+
+    def __init__(self, direccion, salida=None, verboso=False):
+        super().__init__(direccion, _ManejadorPrueba)
+        self.salida = salida
+        self.verboso = verboso
+        self.recibidas = {}
+        self._bloqueo = threading.Lock()
+
+    def recibir(self, evaluaciones):
+        aceptadas = []
+        with self._bloqueo:
+            for evaluacion in evaluaciones:
+                clave = evaluacion.get('clave')
+                if not clave:
+                    continue
+                if clave not in self.recibidas:
+                    self.recibidas[clave] = evaluacion
+                    if self.salida:
+                        with open(self.salida, 'a', encoding='utf-8') as f:
+                            f.write(json.dumps(evaluacion, ensure_ascii=False) + '\n')
+                aceptadas.append(clave)
+        return aceptadas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Utilidades de sincronización de evaluaciones.')
+    sub = parser.add_subparsers(dest='orden', required=True)
+    servir = sub.add_parser('servir', help='levanta un servidor de recolección de prueba')
+    servir.add_argument('--host', default='0.0.0.0')
+    servir.add_argument('--puerto', type=int, default=8765)
+    servir.add_argument('--salida', default='recibidas.jsonl',
+                        help='archivo JSONL donde se guardan las evaluaciones recibidas')
+    args = parser.parse_args(argv)
+
+    servidor = ServidorPrueba((args.host, args.puerto), args.salida, verboso=True)
+    print(f'Escuchando en http://{args.host}:{args.puerto}/evaluaciones -> {args.salida}')
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
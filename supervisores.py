@@ -1,3 +1,14 @@
+import time
+_INICIO_ARRANQUE = time.perf_counter()
+
+import sys
+if __name__ == '__main__' and len(sys.argv) > 1:
+    # Órdenes de consola (python -m supervisores exportar ...): se atienden
+    # antes de importar Kivy, así no se abre ventana ni se carga la GUI
+    from consola import ORDENES, main as main_consola
+    if sys.argv[1] in ORDENES or sys.argv[1] in ('-h', '--help'):
+        sys.exit(main_consola(sys.argv[1:]))
+
 from kivy.app import App
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.uix.boxlayout import BoxLayout
@@ -10,18 +21,38 @@ from kivy.uix.scrollview import ScrollView
 from kivy.uix.popup import Popup
 from kivy.uix.widget import Widget
 from kivy.graphics import Line, Color, Rectangle
+from kivy.graphics.texture import Texture
 from kivy.core.window import Window
 from kivy.metrics import dp
-from kivy.properties import ObjectProperty
+from kivy.properties import NumericProperty, ObjectProperty
+from kivy.clock import Clock
+from kivy.logger import Logger
+from dataclasses import asdict, fields
 from datetime import datetime
-import pandas as pd
-import qrcode
+import json
 import os
-import sys
+import shutil
 from kivy.resources import resource_add_path
 from kivy.uix.image import Image as KivyImage
+from kivy.uix.progressbar import ProgressBar
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recyclegridlayout import RecycleGridLayout
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.utils import platform
 from kivy.config import Config
+from almacen import AlmacenEvaluaciones, tocon_desde_formulario
+from calculos import UMBRALES, EstadosTocones, Umbrales, calcular_ratios_tocon, formatear_ratios
+from personal import DirectorioPersonal
+from esquema import (CAMPOS_ENCABEZADO_FORMULARIO, CAMPOS_RATIO, CAMPOS_TOCON, ErrorCampo,
+                     leer_campos, leer_tocon)
+from firmas import (DESCARTADO, PUNTOS_POR_SEGMENTO, Trazo, TrazoEnCurso, deserializar,
+                    guardar_png, serializar)
+from diario import Diario
+from rendimiento import InformeArranque, importar_diferido, precargar_en_segundo_plano, traza
+from trabajos import ErrorTrabajo, lanzar
+# exportador, fotos, historico, informes, lotes, sincronizacion y transferencia_qr
+# se importan donde se usan: ninguno hace falta para el primer cuadro
 
 # Configuración del teclado
 Config.set('kivy', 'keyboard_mode', 'system')
@@ -29,16 +60,78 @@ Config.set('kivy', 'keyboard_mode', 'system')
 # Configuración multiplataforma
 if platform == 'android':
     from android.storage import primary_external_storage_path
-    from android.permissions import request_permissions, Permission
-    request_permissions([Permission.WRITE_EXTERNAL_STORAGE,
-                        Permission.READ_EXTERNAL_STORAGE])
+
+    def solicitar_permisos():
+        from android.permissions import request_permissions, Permission
+        request_permissions([Permission.WRITE_EXTERNAL_STORAGE,
+                            Permission.READ_EXTERNAL_STORAGE,
+                            Permission.CAMERA,
+                            Permission.ACCESS_FINE_LOCATION,
+                            Permission.ACCESS_COARSE_LOCATION])
 
     def get_downloads_folder():
         path = os.path.join(primary_external_storage_path(), 'Download', 'ToconesApp')
         os.makedirs(path, exist_ok=True)
         return path
 
-    def share_file_android(filename):
+    def capturar_foto(al_capturar):
+        """Abre la cámara y llama a ``al_capturar(ruta, True)`` con la captura temporal."""
+        camara = importar_diferido('plyer').camera
+        ruta = os.path.join(App.get_running_app().user_data_dir,
+                            f'captura_{datetime.now().strftime("%Y%m%d_%H%M%S")}.jpg')
+
+        def terminada(ruta):
+            # plyer avisa desde el hilo de la actividad, también si se canceló
+            if os.path.exists(ruta):
+                despachar_en_ui(al_capturar, ruta, True)
+            # False: la captura la borra procesar_foto al terminar
+            return False
+
+        camara.take_picture(filename=ruta, on_complete=terminada)
+
+    def leer_posicion(al_ubicar, al_fallar, precision, espera):
+        """Enciende el GPS hasta tener una lectura con error menor a ``precision`` metros.
+
+        Llama a ``al_ubicar(lon, lat, precision)`` o, si se vence ``espera``
+        segundos o el GPS está apagado, a ``al_fallar(mensaje)``.
+        """
+        gps = importar_diferido('plyer').gps
+        estado = {'terminado': False, 'mejor': None}
+
+        def terminar(funcion, *args):
+            if estado['terminado']:
+                return
+            estado['terminado'] = True
+            gps.stop()
+            funcion(*args)
+
+        def lectura(lon, lat, error):
+            if error is not None and error > precision:
+                # Todavía impreciso: se guarda por si no llega nada mejor
+                if estado['mejor'] is None or error < estado['mejor'][2]:
+                    estado['mejor'] = (lon, lat, error)
+                return
+            terminar(al_ubicar, lon, lat, error)
+
+        def vencida(dt):
+            if estado['mejor'] is not None:
+                terminar(al_ubicar, *estado['mejor'])
+            else:
+                terminar(al_fallar, 'Sin señal de GPS')
+
+        # plyer avisa desde el hilo de Java: todo se atiende en el de Kivy
+        def ubicacion(**kwargs):
+            despachar_en_ui(lectura, kwargs['lon'], kwargs['lat'], kwargs.get('accuracy'))
+
+        def cambio_estado(tipo, valor):
+            if tipo == 'provider-disabled':
+                despachar_en_ui(terminar, al_fallar, 'El GPS está apagado')
+
+        gps.configure(on_location=ubicacion, on_status=cambio_estado)
+        gps.start(minTime=1000, minDistance=0)
+        Clock.schedule_once(vencida, espera)
+
+    def share_file_android(filename, mime="application/vnd.ms-excel"):
         from jnius import autoclass
         Intent = autoclass('android.content.Intent')
         Uri = autoclass('android.net.Uri')
@@ -46,17 +139,47 @@ if platform == 'android':
 
         intent = Intent()
         intent.setAction(Intent.ACTION_SEND)
-        intent.setType("application/vnd.ms-excel")
+        intent.setType(mime)
         intent.putExtra(Intent.EXTRA_STREAM, Uri.parse("file://" + filename))
         current_activity = PythonActivity.mActivity
         current_activity.startActivity(Intent.createChooser(intent, "Compartir via"))
 else:
+    def solicitar_permisos():
+        pass
+
     def get_downloads_folder():
         path = os.path.join(os.path.expanduser("~"), 'Downloads', 'ToconesApp')
         os.makedirs(path, exist_ok=True)
         return path
 
-    def share_file_android(filename):
+    def capturar_foto(al_capturar):
+        """Sin cámara: se elige una imagen del disco y se llama a ``al_capturar(ruta, False)``."""
+        from kivy.uix.filechooser import FileChooserListView  # diferido: solo al elegir una foto
+        contenido = BoxLayout(orientation='vertical', spacing=dp(5))
+        selector = FileChooserListView(path=os.path.expanduser('~'),
+                                       filters=['*.jpg', '*.jpeg', '*.png'])
+        contenido.add_widget(selector)
+        botones = BoxLayout(size_hint_y=None, height=dp(48), spacing=dp(5))
+        btn_elegir = Button(text='Elegir', background_color=PRIMARY_COLOR, color=LIGHT_TEXT)
+        btn_cancelar = Button(text='Cancelar', background_color=ACCENT_COLOR, color=LIGHT_TEXT)
+        botones.add_widget(btn_elegir)
+        botones.add_widget(btn_cancelar)
+        contenido.add_widget(botones)
+        popup = Popup(title='Foto del tocón', content=contenido, size_hint=(0.9, 0.9))
+
+        def elegir(instance):
+            if selector.selection:
+                popup.dismiss()
+                al_capturar(selector.selection[0], False)
+
+        btn_elegir.bind(on_release=elegir)
+        btn_cancelar.bind(on_release=popup.dismiss)
+        popup.open()
+
+    def leer_posicion(al_ubicar, al_fallar, precision, espera):
+        al_fallar('Este equipo no tiene GPS')
+
+    def share_file_android(filename, mime=None):
         import subprocess
         if sys.platform == 'win32':
             os.startfile(filename)
@@ -72,34 +195,168 @@ ACCENT_COLOR = (0.96, 0.26, 0.21, 1)
 DARK_TEXT = (0.2, 0.2, 0.2, 1)
 LIGHT_TEXT = (1, 1, 1, 1)
 
-# Listas de personas
-SUPERVISORES = [
-    "Astudillo Pungo, Elkin Antonio",
-    "Lopez Chandillo, Miguel Angel",
-    "Orozco Ramírez, Juliana",
-    "Hernandez, Erika",
-    "Ramirez Ramirez, Grimaneza",
-    "Tabares Tamayo, Jhon Edward"
-]
-
-EVALUADORES = [
-    "Astudillo Pungo, Elkin Antonio",
-    "Lopez Chandillo, Miguel Angel",
-    "Orozco Ramírez, Juliana",
-    "Hernandez, Erika",
-    "Ramirez Ramirez, Grimaneza",
-    "Tabares Tamayo, Jhon Edward"
-]
-
-MOTOSIERRISTAS = [
-    "Franco Franco, Ubeimar Ely",
-    "Trejos Rendon, Ivan de Jesus",
-    "Castañeda Vicente, Aldemar",
-    "Hernadez Loaiza, Danover de Jesus",
-    "Gutierrez Parra, Jairo de Jesus",
-    "Jaramillo Ramirez, Rafael Andres",
-    "Cruz Cardona, Cristian Danilo"
-]
+# Formato del archivo de evaluación: 'xlsx' o 'csv' como alternativa ligera
+FORMATO_EXPORTACION = 'xlsx'
+
+# Mensajes para cada fase en la que puede fallar la exportación
+FASES_EXPORTACION = {
+    'archivo': 'No se pudo escribir el archivo',
+    'firmas': 'No se pudieron guardar las firmas',
+    'fotos': 'No se pudieron copiar las fotos',
+    'foto': 'No se pudo procesar la foto',
+    'informe': 'No se pudo generar el informe PDF',
+    'qr': 'No se pudo generar el código QR',
+    'inesperado': 'Error al guardar',
+}
+
+def despachar_en_ui(funcion, *args):
+    Clock.schedule_once(lambda dt: funcion(*args), 0)
+
+def exportar_evaluacion(encabezado, datos_tocones, umbrales, firmas, progreso,
+                        historico=None, evaluacion_id=None, carpeta_fotos=None):
+    """Escribe el archivo de la evaluación, sus firmas y su QR; corre fuera del hilo de la UI.
+
+    Si se da ``historico`` y la evaluación está en el almacén, también se
+    archiva (o se reemplaza su versión anterior) en el histórico columnar;
+    si eso falla solo se anota en el log, porque el archivo ya está escrito.
+    Las fotos de ``carpeta_fotos`` se copian junto al archivo, que las nombra.
+    """
+    from exportador import COLUMNAS_EVALUACION, escribir_filas, filas_evaluacion
+    from fotos import ruta_foto
+    from transferencia_qr import matriz_qr, partes_evaluacion, rgba_qr
+    downloads_folder = get_downloads_folder()
+    base = f"Evaluacion_Tocones_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    filename = os.path.join(downloads_folder, f"{base}.{FORMATO_EXPORTACION}")
+
+    # Las firmas se adjuntan como PNG junto al archivo y este las referencia
+    progreso(0.05, 'Generando firmas...')
+    archivos_firma = {}
+    with traza.medir('exportacion.firmas'):
+        for rol, vector in firmas.items():
+            if vector is None:
+                continue
+            ruta_firma = os.path.join(downloads_folder, f'{base}_firma_{rol}.png')
+            try:
+                guardar_png(vector, ruta_firma)
+            except (OSError, ValueError) as e:
+                raise ErrorTrabajo('firmas', f'{ruta_firma}\n{e}', e) from e
+            archivos_firma[rol] = os.path.basename(ruta_firma)
+
+    # Igual que las firmas: el archivo lleva el nombre del JPEG, no la imagen
+    archivos_foto = {}
+    if carpeta_fotos is not None:
+        progreso(0.1, 'Copiando fotos...')
+        with traza.medir('exportacion.fotos'):
+            for num, datos in sorted(datos_tocones.items()):
+                if not datos.get('foto'):
+                    continue
+                ruta_copia = os.path.join(downloads_folder, f'{base}_foto_tocon_{num}.jpg')
+                try:
+                    shutil.copyfile(ruta_foto(carpeta_fotos, datos['foto']), ruta_copia)
+                except OSError as e:
+                    raise ErrorTrabajo('fotos', f'Tocón {num}\n{e.strerror or e}', e) from e
+                archivos_foto[num] = os.path.basename(ruta_copia)
+
+    progreso(0.2, 'Escribiendo archivo...')
+    try:
+        with traza.medir('exportacion.archivo', tocones=len(datos_tocones),
+                         formato=FORMATO_EXPORTACION):
+            escribir_filas(filename, COLUMNAS_EVALUACION,
+                           filas_evaluacion(encabezado, datos_tocones, umbrales,
+                                            archivos_firma.get('evaluador'),
+                                            archivos_firma.get('motosierrista'),
+                                            archivos_foto))
+    except OSError as e:
+        raise ErrorTrabajo('archivo', f'{filename}\n{e.strerror or e}', e) from e
+
+    if historico is not None and evaluacion_id is not None:
+        progreso(0.4, 'Archivando en el histórico...')
+        try:
+            with traza.medir('exportacion.historico'):
+                historico.agregar(evaluacion_id, encabezado, datos_tocones)
+        except OSError as e:
+            # El histórico es una copia para consultas: no invalida la exportación
+            Logger.error(f'Exportacion: no se pudo archivar en {historico.ruta}: {e.strerror or e}')
+
+    # La evaluación completa viaja en una secuencia de QR para leerla sin red.
+    # Solo se calculan las matrices; la textura se arma en la UI sin pasar por PNG
+    progreso(0.5, 'Generando códigos QR...')
+    medicion_qr = traza.medir('exportacion.qr')
+    with medicion_qr:
+        partes = partes_evaluacion(encabezado, datos_tocones)
+        matrices = []
+        for i, parte in enumerate(partes, 1):
+            try:
+                matrices.append(matriz_qr(parte))
+            except ImportError as e:
+                raise ErrorTrabajo('qr', 'Falta el módulo qrcode', e) from e
+            progreso(0.5 + 0.5 * i / len(partes), f'Código QR {i} de {len(partes)}...')
+        imagenes_qr = [(len(matriz), rgba_qr(matriz)) for matriz in matrices]
+        if traza.activa:
+            medicion_qr.datos['partes'] = len(partes)
+
+    # Con la traza encendida se deja una copia junto al archivo para enviarla con él
+    if traza.activa:
+        traza.exportar(os.path.join(downloads_folder, f'{base}_traza.jsonl'))
+
+    progreso(1.0, 'Listo')
+    return filename, imagenes_qr, matrices
+
+def textura_qr(lado, pixels):
+    textura = Texture.create(size=(lado, lado), colorfmt='rgba')
+    textura.blit_buffer(pixels, colorfmt='rgba', bufferfmt='ubyte')
+    # Las filas vienen de arriba hacia abajo y cada módulo debe verse nítido
+    textura.flip_vertical()
+    textura.mag_filter = 'nearest'
+    textura.min_filter = 'nearest'
+    return textura
+
+def textura_miniatura(ancho, alto, pixels):
+    textura = Texture.create(size=(ancho, alto), colorfmt='rgba')
+    textura.blit_buffer(pixels, colorfmt='rgba', bufferfmt='ubyte')
+    textura.flip_vertical()
+    return textura
+
+def guardar_png_qr(matriz, qr_filename):
+    from transferencia_qr import png_qr
+    try:
+        with open(qr_filename, 'wb') as f:
+            f.write(png_qr(matriz))
+    except OSError as e:
+        raise ErrorTrabajo('qr', f'{qr_filename}\n{e.strerror or e}', e) from e
+    return qr_filename
+
+class CarruselQR(BoxLayout):
+    """Muestra las partes de una transferencia QR una tras otra en bucle."""
+    SEGUNDOS_POR_PARTE = 1.5
+
+    def __init__(self, imagenes_qr, **kwargs):
+        super().__init__(orientation='vertical', spacing=dp(5), **kwargs)
+        # Texturas en memoria: ni archivos ni la caché de imágenes de Kivy
+        with traza.medir('exportacion.texturas_qr', partes=len(imagenes_qr)):
+            self.texturas = [textura_qr(lado, pixels) for lado, pixels in imagenes_qr]
+        self.indice = 0
+        self.imagen = KivyImage(allow_stretch=True)
+        self.add_widget(self.imagen)
+        self.etiqueta = Label(size_hint_y=None, height=dp(30))
+        self.add_widget(self.etiqueta)
+        self._mostrar()
+        self._evento = None
+        if len(self.texturas) > 1:
+            self._evento = Clock.schedule_interval(self._siguiente, self.SEGUNDOS_POR_PARTE)
+
+    def _mostrar(self):
+        self.imagen.texture = self.texturas[self.indice]
+        self.etiqueta.text = f'Parte {self.indice + 1} de {len(self.texturas)}'
+
+    def _siguiente(self, dt):
+        self.indice = (self.indice + 1) % len(self.texturas)
+        self._mostrar()
+
+    def detener(self):
+        if self._evento is not None:
+            self._evento.cancel()
+            self._evento = None
 
 class Logo(KivyImage):
     def __init__(self, **kwargs):
@@ -109,39 +366,104 @@ class Logo(KivyImage):
         self.size = (200, 200)
 
 class SignaturePad(Widget):
+    # Se dispara al terminar un trazo o al limpiar la firma
+    __events__ = ('on_cambio',)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.trazos = []
         self.lines = []
         with self.canvas.before:
             Color(*SECONDARY_COLOR)
             self.rect = Rectangle(pos=self.pos, size=self.size)
+        with self.canvas:
+            Color(*DARK_TEXT)
         self.bind(pos=self.update_rect, size=self.update_rect)
 
     def update_rect(self, *args):
         self.rect.pos = self.pos
         self.rect.size = self.size
 
+    def _nuevo_segmento(self, puntos):
+        line = Line(points=puntos, width=dp(2))
+        self.canvas.add(line)
+        self.lines.append(line)
+        return line
+
     def on_touch_down(self, touch):
         if self.collide_point(*touch.pos):
-            with self.canvas:
-                Color(*DARK_TEXT)
-                touch.ud['line'] = Line(points=[touch.x, touch.y], width=dp(2))
-                self.lines.append(touch.ud['line'])
+            en_curso = TrazoEnCurso(touch.x, touch.y, origen=self.pos)
+            self.trazos.append(en_curso.trazo)
+            touch.ud['trazo'] = en_curso
+            touch.ud['line'] = self._nuevo_segmento(en_curso.segmento)
+            touch.ud['lineas'] = [touch.ud['line']]
             return True
         return super().on_touch_down(touch)
 
     def on_touch_move(self, touch):
-        if 'line' in touch.ud:
-            touch.ud['line'].points += [touch.x, touch.y]
+        if 'trazo' in touch.ud:
+            en_curso = touch.ud['trazo']
+            if en_curso.agregar(touch.x, touch.y) == DESCARTADO:
+                return True
+            touch.ud['line'].points = en_curso.segmento
+            if en_curso.cortar_si_lleno():
+                # El segmento lleno queda fijo y el siguiente continúa desde su último punto
+                touch.ud['line'] = self._nuevo_segmento(en_curso.segmento)
+                touch.ud['lineas'].append(touch.ud['line'])
             return True
         return super().on_touch_move(touch)
 
+    def on_touch_up(self, touch):
+        if 'trazo' in touch.ud:
+            trazo = touch.ud['trazo'].trazo
+            if trazo.simplificar():
+                # Se redibuja una sola vez el trazo ya simplificado
+                for line in touch.ud['lineas']:
+                    self.canvas.remove(line)
+                    self.lines.remove(line)
+                self._dibujar_trazo(trazo)
+            self.dispatch('on_cambio')
+            return True
+        return super().on_touch_up(touch)
+
+    def on_cambio(self):
+        pass
+
+    def _dibujar_trazo(self, trazo):
+        puntos = [valor + (self.x if i % 2 == 0 else self.y)
+                  for i, valor in enumerate(trazo.puntos)]
+        paso = 2 * (PUNTOS_POR_SEGMENTO - 1)
+        for inicio in range(0, max(len(puntos) - 2, 1), paso):
+            self._nuevo_segmento(puntos[inicio:inicio + paso + 2])
+
+    def serializar(self):
+        """Firma en formato vectorial compacto, o None si está vacía."""
+        if not self.trazos:
+            return None
+        return serializar(self.trazos, self.width, self.height)
+
+    def cargar(self, vector):
+        self.clear_canvas()
+        if vector is None:
+            return
+        ancho, alto, trazos = deserializar(vector)
+        escala_x = self.width / ancho if ancho else 1
+        escala_y = self.height / alto if alto else 1
+        for puntos in trazos:
+            trazo = Trazo([valor * (escala_x if i % 2 == 0 else escala_y)
+                           for i, valor in enumerate(puntos)])
+            self.trazos.append(trazo)
+            self._dibujar_trazo(trazo)
+
     def clear_canvas(self):
         self.canvas.clear()
         self.lines = []
+        self.trazos = []
         with self.canvas.before:
             Color(*SECONDARY_COLOR)
             self.rect = Rectangle(pos=self.pos, size=self.size)
+        with self.canvas:
+            Color(*DARK_TEXT)
 
 class SignatureWidget(BoxLayout):
     def __init__(self, title_text='Firma', **kwargs):
@@ -161,9 +483,13 @@ class SignatureWidget(BoxLayout):
                          height=dp(40),
                          background_color=ACCENT_COLOR,
                          color=LIGHT_TEXT)
-        btn_clear.bind(on_release=lambda x: self.signature_pad.clear_canvas())
+        btn_clear.bind(on_release=self.limpiar)
         self.add_widget(btn_clear)
 
+    def limpiar(self, instance=None):
+        self.signature_pad.clear_canvas()
+        self.signature_pad.dispatch('on_cambio')
+
 class MenuPrincipal(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -175,14 +501,20 @@ class MenuPrincipal(Screen):
                     color=DARK_TEXT)
         layout.add_widget(title)
 
-        botones = ['TOCONES', 'CORREDORES', 'CUBICACIÓN', 'MICROPLANEACIÓN']
+        botones = ['TOCONES', 'HISTORIAL', 'TABLERO', 'RECIBIR QR', 'CORREDORES', 'CUBICACIÓN', 'MICROPLANEACIÓN']
+        acciones = {
+            'TOCONES': self.ir_a_tocones,
+            'HISTORIAL': self.ir_a_historial,
+            'TABLERO': self.ir_a_tablero,
+            'RECIBIR QR': self.ir_a_recibir_qr
+        }
         for boton in botones:
             btn = Button(text=boton,
                        size_hint_y=None,
                        height=dp(60),
                        background_color=PRIMARY_COLOR,
                        color=LIGHT_TEXT)
-            btn.bind(on_release=self.ir_a_tocones if boton == 'TOCONES' else self.no_disponible)
+            btn.bind(on_release=acciones.get(boton, self.no_disponible))
             layout.add_widget(btn)
 
         self.add_widget(layout)
@@ -190,18 +522,118 @@ class MenuPrincipal(Screen):
     def ir_a_tocones(self, instance):
         self.manager.current = 'encabezado'
 
+    def ir_a_historial(self, instance):
+        self.manager.current = 'historial'
+
+    def ir_a_tablero(self, instance):
+        self.manager.current = 'tablero'
+
+    def ir_a_recibir_qr(self, instance):
+        self.manager.current = 'recibir_qr'
+
     def no_disponible(self, instance):
         popup = Popup(title='Aviso',
                      content=Label(text='Funcionalidad no disponible aún'),
                      size_hint=(0.7, 0.3))
         popup.open()
 
+class FilaPersona(RecycleDataViewBehavior, Button):
+    def on_release(self):
+        self.parent.parent.al_seleccionar(self.text)
+
+class ListaPersonas(RecycleView):
+    """Resultados de la búsqueda; solo se crean los botones visibles."""
+
+    def __init__(self, al_seleccionar, **kwargs):
+        super().__init__(do_scroll_x=False, **kwargs)
+        self.al_seleccionar = al_seleccionar
+        self.viewclass = FilaPersona
+        layout = RecycleBoxLayout(orientation='vertical',
+                                  spacing=dp(2),
+                                  default_size=(None, dp(48)),
+                                  default_size_hint=(1, None),
+                                  size_hint_y=None)
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+
+class SelectorPersona(Button):
+    """Campo de personal con búsqueda mientras se escribe, en lugar de un Spinner.
+
+    El listado sale de ``App.directorio_personal``; Enter elige el primer
+    resultado o, si no hay ninguno, el texto escrito tal cual.
+    """
+    MAX_RESULTADOS = 300
+
+    def __init__(self, rol, titulo, **kwargs):
+        kwargs.setdefault('text', 'Seleccione')
+        kwargs.setdefault('color', DARK_TEXT)
+        super().__init__(**kwargs)
+        self.rol = rol
+        self.titulo = titulo
+        self._popup = None
+        self._filtrar_diferido = Clock.create_trigger(lambda dt: self._filtrar(), 0.15)
+
+    def on_release(self):
+        if self._popup is None:
+            self._crear_popup()
+        self.busqueda.text = ''
+        self._filtrar()
+        self._popup.open()
+        self.busqueda.focus = True
+
+    def _crear_popup(self):
+        contenido = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(10))
+        self.busqueda = TextInput(multiline=False,
+                                  hint_text='Escriba parte del nombre o apellido',
+                                  size_hint_y=None,
+                                  height=dp(45))
+        self.busqueda.bind(text=lambda *args: self._filtrar_diferido())
+        self.busqueda.bind(on_text_validate=self._elegir_primero)
+        contenido.add_widget(self.busqueda)
+        self.resumen = Label(size_hint_y=None, height=dp(25))
+        contenido.add_widget(self.resumen)
+        self.lista = ListaPersonas(self.elegir)
+        contenido.add_widget(self.lista)
+        btn_cancelar = Button(text='Cancelar',
+                            size_hint_y=None,
+                            height=dp(50),
+                            background_color=ACCENT_COLOR,
+                            color=LIGHT_TEXT)
+        contenido.add_widget(btn_cancelar)
+        self._popup = Popup(title=self.titulo, content=contenido, size_hint=(0.9, 0.9))
+        btn_cancelar.bind(on_release=self._popup.dismiss)
+
+    def _filtrar(self):
+        indice = App.get_running_app().directorio_personal.indice(self.rol)
+        with traza.medir('buscar_personal', rol=self.rol, total=len(indice)):
+            self._resultados = indice.buscar(self.busqueda.text, self.MAX_RESULTADOS)
+        self.lista.data = [{'text': nombre} for nombre in self._resultados]
+        self.lista.scroll_y = 1
+        if len(self._resultados) >= self.MAX_RESULTADOS:
+            self.resumen.text = f'Primeros {self.MAX_RESULTADOS} de {len(indice)}; siga escribiendo'
+        else:
+            self.resumen.text = f'{len(self._resultados)} de {len(indice)}'
+
+    def _elegir_primero(self, instance):
+        self._filtrar_diferido.cancel()
+        self._filtrar()
+        if self._resultados:
+            self.elegir(self._resultados[0])
+        elif self.busqueda.text.strip():
+            self.elegir(self.busqueda.text.strip())
+
+    def elegir(self, nombre):
+        self.text = nombre
+        self._popup.dismiss()
+
 class EncabezadoTocones(Screen):
     datos_encabezado = ObjectProperty({})
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.datos_encabezado = {}
+        # Id de la evaluación en el almacén; None hasta guardar el encabezado
+        self.evaluacion_id = None
 
         scroll = ScrollView(do_scroll_x=False)
         main_layout = BoxLayout(orientation='vertical',
@@ -217,50 +649,36 @@ class EncabezadoTocones(Screen):
                                row_default_height=dp(50))
         form_layout.bind(minimum_height=form_layout.setter('height'))
 
-        campos = [
-            ('Finca', 'finca', 'text'),
-            ('Lote', 'lote', 'text'),
-            ('Especie', 'especie', 'text'),
-            ('Plantación (dd/mm/aaaa)', 'plantacion', 'text'),
-            ('Evaluación (dd/mm/aaaa)', 'evaluacion', 'text'),
-            ('Supervisor', 'supervisor', 'spinner_supervisor'),
-            ('Evaluador', 'evaluador', 'spinner_evaluador'),
-            ('Motosierrista', 'motosierrista', 'spinner_motosierrista')
-        ]
-
         self.inputs = {}
-        for label, name, field_type in campos:
-            lbl = Label(text=label,
+        for campo in CAMPOS_ENCABEZADO_FORMULARIO:
+            lbl = Label(text=campo.titulo,
                       halign='left',
                       color=DARK_TEXT,
                       size_hint_y=None,
                       height=dp(40))
             form_layout.add_widget(lbl)
 
-            if field_type.startswith('spinner'):
-                spinner_values = {
-                    'spinner_supervisor': SUPERVISORES,
-                    'spinner_evaluador': EVALUADORES,
-                    'spinner_motosierrista': MOTOSIERRISTAS
-                }[field_type]
-
-                spinner = Spinner(
-                    text='Seleccione',
-                    values=spinner_values,
+            if campo.tipo == 'persona':
+                selector = SelectorPersona(
+                    rol=campo.nombre,
+                    titulo=campo.etiqueta,
                     size_hint_y=None,
                     height=dp(40),
                     background_color=(1, 1, 1, 1)
                 )
-                self.inputs[name] = spinner
-                form_layout.add_widget(spinner)
+                self.inputs[campo.nombre] = selector
+                form_layout.add_widget(selector)
             else:
                 ti = TextInput(multiline=False,
                              size_hint_y=None,
                              height=dp(40),
-                             background_color=(1, 1, 1, 1))
-                self.inputs[name] = ti
+                             background_color=(1, 1, 1, 1),
+                             input_filter='int' if campo.tipo == 'entero' else None)
+                self.inputs[campo.nombre] = ti
                 form_layout.add_widget(ti)
 
+        self.inputs['muestra'].text = App.get_running_app().config.get('muestreo', 'tocones')
+
         lbl_edad = Label(text='Edad (años)',
                        halign='left',
                        color=DARK_TEXT,
@@ -284,6 +702,20 @@ class EncabezadoTocones(Screen):
         form_layout.add_widget(btn_calcular)
         btn_calcular.bind(on_release=self.calcular_edad)
 
+        # Finca y lote desde la posición, para no escribirlos a mano
+        self.estado_gps = Label(text='',
+                              color=DARK_TEXT,
+                              size_hint_y=None,
+                              height=dp(50))
+        self.btn_gps = Button(text='Detectar finca y lote',
+                            size_hint_y=None,
+                            height=dp(50),
+                            background_color=PRIMARY_COLOR,
+                            color=LIGHT_TEXT)
+        self.btn_gps.bind(on_release=self.detectar_lote)
+        form_layout.add_widget(self.estado_gps)
+        form_layout.add_widget(self.btn_gps)
+
         main_layout.add_widget(form_layout)
 
         firmas_layout = GridLayout(cols=2,
@@ -304,6 +736,14 @@ class EncabezadoTocones(Screen):
 
         main_layout.add_widget(firmas_layout)
 
+        # Cada cambio va a la bitácora de la sesión por si el sistema cierra la app
+        diario = App.get_running_app().diario
+        for nombre, widget in self.inputs.items():
+            widget.bind(text=lambda w, valor, nombre=nombre: diario.anotar(f'encabezado.{nombre}', valor))
+        self.edad_input.bind(text=lambda w, valor: diario.anotar('encabezado.edad', valor))
+        for rol, pad in self.pads().items():
+            pad.bind(on_cambio=lambda pad, rol=rol: diario.anotar(f'firma.{rol}', pad.serializar() or b''))
+
         btn_guardar = Button(text='Guardar y Continuar',
                            size_hint_y=None,
                            height=dp(60),
@@ -315,6 +755,7 @@ class EncabezadoTocones(Screen):
         scroll.add_widget(main_layout)
         self.add_widget(scroll)
 
+    @traza.medido('calcular_edad')
     def calcular_edad(self, instance):
         try:
             fecha_plant = datetime.strptime(self.inputs['plantacion'].text, '%d/%m/%Y')
@@ -328,35 +769,186 @@ class EncabezadoTocones(Screen):
                         size_hint=(0.8, 0.4))
             popup.open()
 
+    def detectar_lote(self, instance):
+        config = App.get_running_app().config
+        self.btn_gps.disabled = True
+        self.estado_gps.text = 'Buscando señal de GPS...'
+        leer_posicion(self._posicion_leida, self._fin_deteccion,
+                      config.getfloat('lotes', 'precision_gps'),
+                      config.getfloat('lotes', 'espera_gps'))
+
+    def _posicion_leida(self, lon, lat, error):
+        self.estado_gps.text = 'Buscando el lote...'
+        app = App.get_running_app()
+        lanzar('lotes', lambda progreso: app.indice_lotes().buscar(lon, lat),
+               al_terminar=lambda resultado: self._lote_encontrado(resultado, error),
+               al_fallar=lambda e: self._fin_deteccion(f'No se pudieron leer los lotes:\n{e.mensaje}'),
+               despachar=despachar_en_ui)
+
+    def _lote_encontrado(self, resultado, error):
+        if resultado is None:
+            self._fin_deteccion('Fuera de los lotes conocidos')
+            return
+        finca, lote = resultado
+        if finca:
+            self.inputs['finca'].text = finca
+        self.inputs['lote'].text = lote
+        precision = f' (±{error:.0f} m)' if error is not None else ''
+        self._fin_deteccion(f'Detectado por GPS{precision}')
+
+    def _fin_deteccion(self, mensaje):
+        self.btn_gps.disabled = False
+        self.estado_gps.text = mensaje
+
     def guardar_y_continuar(self, instance):
         if not self.edad_input.text:
             self.calcular_edad(instance)
             return
 
-        self.datos_encabezado = {
-            'finca': self.inputs['finca'].text,
-            'lote': self.inputs['lote'].text,
-            'especie': self.inputs['especie'].text,
-            'plantacion': self.inputs['plantacion'].text,
-            'evaluacion': self.inputs['evaluacion'].text,
-            'supervisor': self.inputs['supervisor'].text,
-            'evaluador': self.inputs['evaluador'].text,
-            'motosierrista': self.inputs['motosierrista'].text,
-            'edad': self.edad_input.text
-        }
+        try:
+            valores = leer_campos(CAMPOS_ENCABEZADO_FORMULARIO,
+                                  {nombre: widget.text for nombre, widget in self.inputs.items()})
+        except ErrorCampo as e:
+            popup = Popup(title='Error',
+                        content=Label(text=str(e)),
+                        size_hint=(0.8, 0.4))
+            popup.open()
+            return
+        muestra = valores['muestra']
+
+        self.datos_encabezado = {nombre: '' if valor is None else valor
+                                 for nombre, valor in valores.items()}
+        self.datos_encabezado['edad'] = self.edad_input.text
+
+        almacen = App.get_running_app().almacen
+        nueva = self.evaluacion_id is None
+        self.evaluacion_id = almacen.guardar_encabezado(self.datos_encabezado, self.evaluacion_id)
+        App.get_running_app().diario.anotar('evaluacion_id', self.evaluacion_id)
+        for rol, vector in self.firmas().items():
+            almacen.guardar_firma(self.evaluacion_id, rol, vector)
+        ingreso = self.manager.get_screen('ingreso_tocones')
+        ingreso.establecer_muestra(muestra)
+        if nueva:
+            # Los tocones ya ingresados pasan a la nueva evaluación
+            for num, datos in ingreso.datos_tocones.items():
+                if datos:
+                    almacen.guardar_tocon(self.evaluacion_id, tocon_desde_formulario(num, datos))
 
         self.manager.current = 'ingreso_tocones'
 
+    def pads(self):
+        return {'evaluador': self.firma_eval.signature_pad,
+                'motosierrista': self.firma_moto.signature_pad}
+
+    def firmas(self):
+        return {rol: pad.serializar() for rol, pad in self.pads().items()}
+
+    def restaurar(self, estado):
+        """Vuelve a poner lo que la bitácora anotó del encabezado y las firmas."""
+        diario = App.get_running_app().diario
+        for nombre, widget in self.inputs.items():
+            if f'encabezado.{nombre}' in estado:
+                widget.text = estado[f'encabezado.{nombre}']
+        if 'encabezado.edad' in estado:
+            self.edad_input.text = estado['encabezado.edad']
+        if estado.get('evaluacion_id') is not None:
+            self.evaluacion_id = estado['evaluacion_id']
+            diario.anotar('evaluacion_id', self.evaluacion_id)
+        for rol, pad in self.pads().items():
+            vector = estado.get(f'firma.{rol}')
+            if vector is not None:
+                # b'' es una firma borrada a propósito
+                pad.cargar(vector or None)
+                diario.anotar(f'firma.{rol}', vector)
+
+    def cargar_encabezado(self, datos, evaluacion_id, firmas=None):
+        for name, widget in self.inputs.items():
+            valor = datos.get(name)
+            if valor in (None, ''):
+                widget.text = 'Seleccione' if isinstance(widget, SelectorPersona) else ''
+            else:
+                widget.text = str(valor)
+        self.edad_input.text = datos.get('edad', '')
+        self.datos_encabezado = dict(datos)
+        self.evaluacion_id = evaluacion_id
+        firmas = firmas or {}
+        self.firma_eval.signature_pad.cargar(firmas.get('evaluador'))
+        self.firma_moto.signature_pad.cargar(firmas.get('motosierrista'))
+
+# Colores de estado de cada tocón en la lista
+COLORES_ESTADO = {
+    'pendiente': PRIMARY_COLOR,
+    'incompleto': (0.95, 0.6, 0.1, 1),
+    'cumple': (0.3, 0.69, 0.49, 1),
+    'falla': ACCENT_COLOR
+}
+
+class FilaTocon(RecycleDataViewBehavior, Button):
+    numero = NumericProperty(0)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.foto = None
+        self.miniatura = KivyImage(allow_stretch=True, opacity=0)
+        self.add_widget(self.miniatura)
+        self.bind(pos=self._ubicar_miniatura, size=self._ubicar_miniatura)
+
+    def _ubicar_miniatura(self, *args):
+        lado = self.height - dp(8)
+        self.miniatura.size = (lado, lado)
+        self.miniatura.pos = (self.x + dp(4), self.y + dp(4))
+
+    def refresh_view_attrs(self, rv, index, data):
+        data = dict(data)
+        self.mostrar_miniatura(data.pop('foto', None))
+        super().refresh_view_attrs(rv, index, data)
+
+    def mostrar_miniatura(self, foto):
+        # La fila se recicla: una miniatura que llega tarde puede ser de otro tocón
+        self.foto = foto
+        textura = None
+        if foto:
+            textura = App.get_running_app().miniaturas.pedir(foto, self._miniatura_lista)
+        self._poner_miniatura(textura)
+
+    def _miniatura_lista(self, foto, textura):
+        if foto == self.foto:
+            self._poner_miniatura(textura)
+
+    def _poner_miniatura(self, textura):
+        self.miniatura.texture = textura
+        self.miniatura.opacity = 1 if textura is not None else 0
+
+    def on_release(self):
+        # La lista de tocones es el RecycleView dueño del layout
+        self.parent.parent.al_seleccionar(self.numero)
+
+class ListaTocones(RecycleView):
+    """Lista de tocones virtualizada: solo existen los botones visibles."""
+
+    def __init__(self, al_seleccionar, **kwargs):
+        super().__init__(do_scroll_x=False, **kwargs)
+        self.al_seleccionar = al_seleccionar
+        self.viewclass = FilaTocon
+        layout = RecycleGridLayout(cols=2,
+                                   spacing=dp(15),
+                                   default_size=(None, dp(60)),
+                                   default_size_hint=(1, None),
+                                   size_hint_y=None)
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+
 class IngresoToconesScreen(Screen):
     datos_tocones = ObjectProperty({})
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.datos_tocones = {i: {} for i in range(1, 13)}
+        self.datos_tocones = {}
+        # Estado de cada tocón ya calculado, para la lista y la verificación final
+        self.estados = EstadosTocones(App.get_running_app().umbrales)
+        self.establecer_muestra(App.get_running_app().config.getint('muestreo', 'tocones'))
 
-        scroll = ScrollView(do_scroll_x=False)
-        main_layout = BoxLayout(orientation='vertical', spacing=dp(15), padding=dp(20), size_hint_y=None)
-        main_layout.bind(minimum_height=main_layout.setter('height'))
+        main_layout = BoxLayout(orientation='vertical', spacing=dp(15), padding=dp(20))
 
         title = Label(text='Ingreso de Datos de Tocones',
                     font_size=dp(24),
@@ -366,31 +958,8 @@ class IngresoToconesScreen(Screen):
                     height=dp(50))
         main_layout.add_widget(title)
 
-        columns_layout = BoxLayout(orientation='horizontal', spacing=dp(15), size_hint_y=None)
-        columns_layout.bind(minimum_height=columns_layout.setter('height'))
-
-        left_column = BoxLayout(orientation='vertical', spacing=dp(15), size_hint_y=None)
-        left_column.bind(minimum_height=left_column.setter('height'))
-
-        right_column = BoxLayout(orientation='vertical', spacing=dp(15), size_hint_y=None)
-        right_column.bind(minimum_height=right_column.setter('height'))
-
-        for i in range(1, 13):
-            btn = Button(text=f'Tocón {i}',
-                       size_hint_y=None,
-                       height=dp(60),
-                       background_color=PRIMARY_COLOR,
-                       color=LIGHT_TEXT)
-            btn.bind(on_release=lambda instance, num=i: self.abrir_formulario_tocon(num))
-
-            if i <= 6:
-                left_column.add_widget(btn)
-            else:
-                right_column.add_widget(btn)
-
-        columns_layout.add_widget(left_column)
-        columns_layout.add_widget(right_column)
-        main_layout.add_widget(columns_layout)
+        self.lista = ListaTocones(al_seleccionar=self.abrir_formulario_tocon)
+        main_layout.add_widget(self.lista)
 
         btn_guardar_todo = Button(text='Guardar Todos los Datos',
                                 size_hint_y=None,
@@ -408,128 +977,260 @@ class IngresoToconesScreen(Screen):
         btn_volver.bind(on_release=lambda x: setattr(self.manager, 'current', 'encabezado'))
         main_layout.add_widget(btn_volver)
 
-        scroll.add_widget(main_layout)
-        self.add_widget(scroll)
+        self.add_widget(main_layout)
+        self.actualizar_lista()
+
+    def on_pre_enter(self, *args):
+        self.actualizar_lista()
+
+    def establecer_muestra(self, muestra):
+        """Ajusta el número de tocones de la evaluación sin perder los ya ingresados."""
+        for num in range(1, muestra + 1):
+            self.datos_tocones.setdefault(num, {})
+        for num in [n for n in self.datos_tocones if n > muestra]:
+            del self.datos_tocones[num]
+            self.estados.quitar(num)
+
+    def actualizar_lista(self):
+        marcas = {'pendiente': '', 'incompleto': '  …', 'cumple': '  ✅', 'falla': '  ❌'}
+        data = []
+        for num in sorted(self.datos_tocones):
+            estado, fallas = self.estados.estado(num)
+            detalle = f' {"/".join(fallas)}' if fallas else ''
+            data.append({'numero': num,
+                         'foto': self.datos_tocones[num].get('foto'),
+                         'text': f'Tocón {num}{marcas[estado]}{detalle}',
+                         'background_color': COLORES_ESTADO[estado],
+                         'color': LIGHT_TEXT})
+        self.lista.data = data
+
+    def cargar_evaluacion(self, evaluacion):
+        # La bitácora pasa a seguir a esta evaluación
+        diario = App.get_running_app().diario
+        diario.descartar()
+        self.manager.get_screen('encabezado').cargar_encabezado(evaluacion.encabezado(),
+                                                                evaluacion.id, evaluacion.firmas)
+        self.datos_tocones.clear()
+        self.estados.limpiar()
+        self.establecer_muestra(evaluacion.muestra)
+        for tocon in evaluacion.tocones:
+            self.datos_tocones[tocon.numero] = tocon.como_datos()
+            self.estados.actualizar(tocon.numero, self.datos_tocones[tocon.numero])
+        diario.anotar('evaluacion_id', evaluacion.id)
+        self.actualizar_lista()
+
+    def restaurar(self, estado):
+        """Aplica los tocones guardados que anotó la bitácora de la sesión."""
+        diario = App.get_running_app().diario
+        muestra = estado.get('encabezado.muestra', '')
+        if muestra.isdigit() and int(muestra) > 0:
+            self.establecer_muestra(int(muestra))
+        for clave, datos in estado.items():
+            if clave.startswith('tocon.') and datos:
+                numero = int(clave.split('.')[1])
+                self.datos_tocones[numero] = datos
+                self.estados.actualizar(numero, datos)
+                diario.anotar(clave, datos)
+        self.actualizar_lista()
 
     def abrir_formulario_tocon(self, numero_tocon):
-        if not self.manager.has_screen(f'formulario_tocon_{numero_tocon}'):
+        # Un único formulario se reutiliza para todos los tocones
+        if not self.manager.has_screen('formulario_tocon'):
             self.manager.add_widget(FormularioToconScreen(
-                name=f'formulario_tocon_{numero_tocon}',
-                numero_tocon=numero_tocon,
-                datos_tocones=self.datos_tocones
+                name='formulario_tocon',
+                datos_tocones=self.datos_tocones,
+                estados=self.estados
             ))
-        self.manager.current = f'formulario_tocon_{numero_tocon}'
+        self.manager.get_screen('formulario_tocon').vincular(numero_tocon)
+        self.manager.current = 'formulario_tocon'
 
     def guardar_todo_y_generar_excel(self, instance):
         # Verificar que todos los tocones tengan datos
-        for i in range(1, 13):
-            if not self.datos_tocones[i]:
-                popup = Popup(title='Advertencia',
-                            content=Label(text=f'Faltan datos del Tocón {i}'),
-                            size_hint=(0.7, 0.3))
-                popup.open()
-                return
+        sin_terminar = self.estados.sin_terminar(sorted(self.datos_tocones))
+        if sin_terminar:
+            lista = ', '.join(str(num) for num in sin_terminar[:10])
+            mas = f' y {len(sin_terminar) - 10} más' if len(sin_terminar) > 10 else ''
+            popup = Popup(title='Advertencia',
+                        content=Label(text=f'Faltan datos de los tocones {lista}{mas}'
+                                      if len(sin_terminar) > 1 else
+                                      f'Faltan datos del Tocón {sin_terminar[0]}'),
+                        size_hint=(0.7, 0.3))
+            popup.open()
+            return
 
-        try:
-            encabezado = self.manager.get_screen('encabezado').datos_encabezado
-
-            data = {
-                'tocon': list(range(1, 13)),
-                'finca': [encabezado['finca']] * 12,
-                'lote': [encabezado['lote']] * 12,
-                'especie': [encabezado['especie']] * 12,
-                'plantacion': [encabezado['plantacion']] * 12,
-                'evaluacion': [encabezado['evaluacion']] * 12,
-                'supervisor': [encabezado['supervisor']] * 12,
-                'evaluador': [encabezado['evaluador']] * 12,
-                'motosierista': [encabezado['motosierrista']] * 12,
-                'firma_evaluad': ['Firma guardada'] * 12,
-                'firma_motosierista': ['Firma guardada'] * 12,
-                'diametro': [self.datos_tocones[i]['d'] for i in range(1, 13)],
-                'altura': [self.datos_tocones[i]['altura'] for i in range(1, 13)],
-                'tocon_num': list(range(1, 13)),
-                'CT': [self.datos_tocones[i]['ct'] for i in range(1, 13)],
-                'CD': [self.datos_tocones[i]['cd'] for i in range(1, 13)],
-                'Ancho Bisagra (AB)': [self.datos_tocones[i]['ab'] for i in range(1, 13)],
-                'Altura entre CT y CD': [self.datos_tocones[i]['altura1'] for i in range(1, 13)],
-                'CT/d*100': [self.datos_tocones[i]['ct_d_ratio'] for i in range(1, 13)],
-                'CD/d*100': [self.datos_tocones[i]['cd_d_ratio'] for i in range(1, 13)],
-                'AB/d*100': [self.datos_tocones[i]['ab_d_ratio'] for i in range(1, 13)]
-            }
-
-            df = pd.DataFrame(data)
-            downloads_folder = get_downloads_folder()
-            filename = os.path.join(downloads_folder,
-                                  f"Evaluacion_Tocones_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
-            df.to_excel(filename, index=False)
-
-            # Generar QR
-            qr_data = f"""EVALUACIÓN DE TOCONES - DATOS COMPLETOS
-Finca: {encabezado['finca']}
-Lote: {encabezado['lote']}
-Fecha: {encabezado['evaluacion']}
-
-ARCHIVO GENERADO:
-{filename}"""
-
-            qr = qrcode.QRCode(version=1, box_size=10, border=4)
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-
-            qr_img = qr.make_image(fill_color="black", back_color="white")
-            qr_filename = os.path.join(downloads_folder, "qr_tocones.png")
-            qr_img.save(qr_filename)
-
-            # Mostrar popup con opciones
-            content = BoxLayout(orientation='vertical', spacing=10, padding=10)
-            content.add_widget(Label(text='¡Datos guardados con éxito!', size_hint_y=None, height=dp(40)))
-            content.add_widget(Label(text=f'Ubicación: {filename}', size_hint_y=None, height=dp(30)))
-
-            qr_kivy = KivyImage(source=qr_filename, size_hint_y=0.6)
-            content.add_widget(qr_kivy)
-
-            btn_share = Button(text='Compartir Archivo' if platform == 'android' else 'Abrir Carpeta',
-                             size_hint_y=None,
-                             height=dp(50),
-                             background_color=(0.2, 0.8, 0.4, 1))
-            btn_share.bind(on_release=lambda x: share_file_android(filename))
-            content.add_widget(btn_share)
+        pantalla_encabezado = self.manager.get_screen('encabezado')
+        self.iniciar_exportacion(pantalla_encabezado.datos_encabezado, self.datos_tocones,
+                                 pantalla_encabezado.firmas(), pantalla_encabezado.evaluacion_id,
+                                 instance)
+
+    def iniciar_exportacion(self, encabezado, datos_tocones, firmas, evaluacion_id, instance):
+        # Copia de los datos: el hilo de trabajo no debe tocar los widgets
+        encabezado = dict(encabezado)
+        datos_tocones = {num: dict(datos) for num, datos in datos_tocones.items()}
+        app = App.get_running_app()
+        self._inicio_exportacion = time.perf_counter()
+
+        futuro = lanzar('exportacion',
+                        lambda progreso: exportar_evaluacion(encabezado, datos_tocones,
+                                                             app.umbrales, firmas, progreso,
+                                                             app.historico, evaluacion_id,
+                                                             app.carpeta_fotos),
+                        al_progreso=self._progreso_exportacion,
+                        al_terminar=self._exportacion_terminada,
+                        al_fallar=self._exportacion_fallida,
+                        despachar=despachar_en_ui)
+        if futuro is None:
+            # Doble toque: la exportación anterior aún no termina
+            return
 
-            btn_close = Button(text='Cerrar',
-                             size_hint_y=None,
-                             height=dp(50),
-                             background_color=ACCENT_COLOR)
-            btn_close.bind(on_release=lambda x: setattr(self.manager, 'current', 'menu'))
-            content.add_widget(btn_close)
-
-            popup = Popup(title='Operación Exitosa',
-                        content=content,
-                        size_hint=(0.95, 0.95))
-            popup.open()
+        instance.disabled = True
+        self._btn_exportar = instance
+        self._evaluacion_exportada = evaluacion_id
+        # Para el informe PDF, que se pide después desde el popup de éxito
+        self._datos_exportados = (encabezado, datos_tocones, firmas, app.umbrales)
+        self._barra_progreso = ProgressBar(max=1.0, value=0)
+        self._lbl_progreso = Label(text='Preparando exportación...')
+        content = BoxLayout(orientation='vertical', spacing=10, padding=10)
+        content.add_widget(self._lbl_progreso)
+        content.add_widget(self._barra_progreso)
+        self._popup_progreso = Popup(title='Guardando',
+                                     content=content,
+                                     size_hint=(0.8, 0.3),
+                                     auto_dismiss=False)
+        self._popup_progreso.open()
+
+    def _progreso_exportacion(self, fraccion, mensaje):
+        self._barra_progreso.value = fraccion
+        self._lbl_progreso.text = mensaje
+
+    def _fin_exportacion(self):
+        self._popup_progreso.dismiss()
+        self._btn_exportar.disabled = False
+
+    def _exportacion_terminada(self, resultado):
+        self._fin_exportacion()
+        traza.evento('exportacion.total', (time.perf_counter() - self._inicio_exportacion) * 1000)
+        filename, imagenes_qr, matrices_qr = resultado
+
+        if self._evaluacion_exportada is not None:
+            app = App.get_running_app()
+            app.almacen.marcar_exportada(self._evaluacion_exportada, filename)
+            app.almacen.encolar_envio(self._evaluacion_exportada)
+            app.sincronizar()
+            pantalla_encabezado = self.manager.get_screen('encabezado')
+            if pantalla_encabezado.evaluacion_id == self._evaluacion_exportada:
+                # Lo que se ingrese después es una evaluación nueva
+                pantalla_encabezado.evaluacion_id = None
+                app.diario.descartar()
+
+        # Mostrar popup con opciones
+        content = BoxLayout(orientation='vertical', spacing=10, padding=10)
+        content.add_widget(Label(text='¡Datos guardados con éxito!', size_hint_y=None, height=dp(40)))
+        content.add_widget(Label(text=f'Ubicación: {filename}', size_hint_y=None, height=dp(30)))
+
+        carrusel = CarruselQR(imagenes_qr, size_hint_y=0.6)
+        content.add_widget(carrusel)
+
+        # El PNG del QR solo se escribe si se pide compartirlo
+        btn_share_qr = Button(text='Compartir QR',
+                            size_hint_y=None,
+                            height=dp(50),
+                            background_color=PRIMARY_COLOR)
+        btn_share_qr.bind(on_release=lambda x: self.compartir_qr(
+            matrices_qr[carrusel.indice], carrusel.indice + 1))
+        content.add_widget(btn_share_qr)
 
-        except Exception as e:
-            popup = Popup(title='Error',
-                        content=Label(text=f'Error al guardar: {str(e)}'),
-                        size_hint=(0.8, 0.4))
-            popup.open()
+        datos_exportados = self._datos_exportados
+        btn_informe = Button(text='Informe PDF',
+                           size_hint_y=None,
+                           height=dp(50),
+                           background_color=PRIMARY_COLOR)
+        btn_informe.bind(on_release=lambda x: self.compartir_informe(datos_exportados, matrices_qr,
+                                                                     filename))
+        content.add_widget(btn_informe)
+
+        btn_share = Button(text='Compartir Archivo' if platform == 'android' else 'Abrir Carpeta',
+                         size_hint_y=None,
+                         height=dp(50),
+                         background_color=(0.2, 0.8, 0.4, 1))
+        btn_share.bind(on_release=lambda x: share_file_android(filename))
+        content.add_widget(btn_share)
+
+        btn_close = Button(text='Cerrar',
+                         size_hint_y=None,
+                         height=dp(50),
+                         background_color=ACCENT_COLOR)
+        content.add_widget(btn_close)
+
+        popup = Popup(title='Operación Exitosa',
+                    content=content,
+                    size_hint=(0.95, 0.95))
+        popup.bind(on_dismiss=lambda x: carrusel.detener())
+        btn_close.bind(on_release=lambda x: (popup.dismiss(), setattr(self.manager, 'current', 'menu')))
+        popup.open()
+
+    def compartir_qr(self, matriz, parte):
+        qr_filename = os.path.join(get_downloads_folder(), f'qr_tocones_{parte}.png')
+        lanzar('compartir_qr', lambda progreso: guardar_png_qr(matriz, qr_filename),
+               al_terminar=lambda ruta: share_file_android(ruta, 'image/png'),
+               al_fallar=self._mostrar_error_exportacion,
+               despachar=despachar_en_ui)
+
+    def compartir_informe(self, datos_exportados, matrices_qr, filename):
+        encabezado, datos_tocones, firmas, umbrales = datos_exportados
+        ruta = os.path.splitext(filename)[0].replace('Evaluacion_Tocones_', 'Informe_Tocones_') + '.pdf'
+
+        def generar(progreso):
+            from informes import guardar_informe
+            try:
+                with traza.medir('informe_pdf', tocones=len(datos_tocones)):
+                    return guardar_informe(ruta, encabezado, datos_tocones, firmas, umbrales,
+                                           matrices_qr)
+            except OSError as e:
+                raise ErrorTrabajo('informe', f'{ruta}\n{e.strerror or e}', e) from e
+
+        lanzar('informe_pdf', generar,
+               al_terminar=lambda ruta: share_file_android(ruta, 'application/pdf'),
+               al_fallar=self._mostrar_error_exportacion,
+               despachar=despachar_en_ui)
+
+    def _exportacion_fallida(self, error):
+        self._fin_exportacion()
+        self._mostrar_error_exportacion(error)
+
+    def _mostrar_error_exportacion(self, error):
+        Logger.error(f'Exportacion: {error}')
+        if getattr(error, 'traza', None):
+            Logger.error(error.traza)
+        popup = Popup(title='Error',
+                    content=Label(text=f'{FASES_EXPORTACION.get(error.fase, "Error al guardar")}:\n{error.mensaje}'),
+                    size_hint=(0.8, 0.4))
+        popup.open()
 
 class FormularioToconScreen(Screen):
-    def __init__(self, numero_tocon, datos_tocones, **kwargs):
+    def __init__(self, datos_tocones, estados, **kwargs):
         super().__init__(**kwargs)
-        self.numero_tocon = numero_tocon
+        self.numero_tocon = None
         self.datos_tocones = datos_tocones
+        self.estados = estados
+        # Medidas y ratios de lo escrito en este momento, o None si no es válido
+        self.resultado = None
+        # Los ratios se recalculan al dejar de escribir, no en cada tecla
+        self._calcular_diferido = Clock.create_trigger(lambda dt: self.calcular_ratios(), 0.25)
+        # Nombre de la foto del tocón (ver fotos.py), o None
+        self.foto = None
 
         scroll = ScrollView(do_scroll_x=False)
         main_layout = BoxLayout(orientation='vertical', spacing=dp(15), padding=dp(20), size_hint_y=None)
         main_layout.bind(minimum_height=main_layout.setter('height'))
 
-        title = Label(text=f'Datos del Tocón {numero_tocon}',
-                    font_size=dp(24),
-                    bold=True,
-                    color=DARK_TEXT,
-                    size_hint_y=None,
-                    height=dp(50))
-        main_layout.add_widget(title)
+        self.title = Label(text='',
+                         font_size=dp(24),
+                         bold=True,
+                         color=DARK_TEXT,
+                         size_hint_y=None,
+                         height=dp(50))
+        main_layout.add_widget(self.title)
 
         form_layout = GridLayout(cols=2,
                                size_hint_y=None,
@@ -538,18 +1239,9 @@ class FormularioToconScreen(Screen):
                                row_default_height=dp(50))
         form_layout.bind(minimum_height=form_layout.setter('height'))
 
-        campos = [
-            ('Diámetro (d)', 'd'),
-            ('Altura tocon', 'altura'),
-            ('Corte de tala (CT)', 'ct'),
-            ('Corte de dirección (CD)', 'cd'),
-            ('Ancho Bisagra (AB)', 'ab'),
-            ('Altura entre CT y CD', 'altura1')
-        ]
-
         self.inputs = {}
-        for label, name in campos:
-            lbl = Label(text=label,
+        for campo in CAMPOS_TOCON:
+            lbl = Label(text=campo.titulo,
                       halign='left',
                       color=DARK_TEXT,
                       size_hint_y=None,
@@ -560,17 +1252,15 @@ class FormularioToconScreen(Screen):
                          size_hint_y=None,
                          height=dp(40),
                          background_color=(1, 1, 1, 1))
-            self.inputs[name] = ti
+            ti.bind(text=lambda *args: self._calcular_diferido())
+            ti.bind(text=lambda w, valor, nombre=campo.nombre:
+                    App.get_running_app().diario.anotar(f'formulario.{nombre}', valor))
+            self.inputs[campo.nombre] = ti
             form_layout.add_widget(ti)
 
-        resultados = [
-            ('CT/d*100', 'ct_d_ratio'),
-            ('CD/d*100', 'cd_d_ratio'),
-            ('AB/d*100', 'ab_d_ratio')
-        ]
-
-        for label, name in resultados:
-            lbl = Label(text=label,
+        for campo in CAMPOS_RATIO:
+            name = campo.nombre
+            lbl = Label(text=campo.etiqueta,
                       halign='left',
                       color=DARK_TEXT,
                       size_hint_y=None,
@@ -587,13 +1277,21 @@ class FormularioToconScreen(Screen):
 
         main_layout.add_widget(form_layout)
 
-        btn_calcular = Button(text='Calcular',
-                            size_hint_y=None,
-                            height=dp(60),
-                            background_color=(0.3, 0.69, 0.49, 1),
-                            color=LIGHT_TEXT)
-        btn_calcular.bind(on_release=self.calcular_ratios)
-        main_layout.add_widget(btn_calcular)
+        foto_layout = BoxLayout(size_hint_y=None, height=dp(120), spacing=dp(15))
+        self.vista_foto = KivyImage(allow_stretch=True, size_hint_x=None, width=dp(120))
+        foto_layout.add_widget(self.vista_foto)
+        self.btn_foto = Button(text='Tomar foto',
+                               background_color=PRIMARY_COLOR,
+                               color=LIGHT_TEXT)
+        self.btn_foto.bind(on_release=lambda x: capturar_foto(self.procesar_foto))
+        foto_layout.add_widget(self.btn_foto)
+        main_layout.add_widget(foto_layout)
+
+        self.mensaje = Label(text='',
+                           color=COLORES_ESTADO['incompleto'],
+                           size_hint_y=None,
+                           height=dp(30))
+        main_layout.add_widget(self.mensaje)
 
         btn_guardar = Button(text='Guardar',
                            size_hint_y=None,
@@ -613,68 +1311,745 @@ class FormularioToconScreen(Screen):
 
         scroll.add_widget(main_layout)
         self.add_widget(scroll)
+        self.scroll = scroll
+
+    def vincular(self, numero_tocon):
+        """Prepara el formulario para otro tocón reutilizando los mismos widgets."""
+        self.numero_tocon = numero_tocon
+        App.get_running_app().diario.anotar('formulario.numero', numero_tocon)
+        self.title.text = f'Datos del Tocón {numero_tocon}'
+        self.scroll.scroll_y = 1
+        for widget in self.inputs.values():
+            widget.text = ''
 
         # Cargar datos existentes si los hay
-        if numero_tocon in datos_tocones and datos_tocones[numero_tocon]:
-            datos = datos_tocones[numero_tocon]
-            for campo in ['d', 'altura', 'ct', 'cd', 'ab', 'altura1']:
-                if campo in datos:
-                    self.inputs[campo].text = datos[campo]
-            for ratio in ['ct_d_ratio', 'cd_d_ratio', 'ab_d_ratio']:
-                if ratio in datos:
-                    self.inputs[ratio].text = datos[ratio]
-
-    def calcular_ratios(self, instance):
-        try:
-            d = float(self.inputs['d'].text)
-            ct = float(self.inputs['ct'].text)
-            cd = float(self.inputs['cd'].text)
-            ab = float(self.inputs['ab'].text)
+        datos = self.datos_tocones.get(numero_tocon)
+        if datos:
+            for campo in CAMPOS_TOCON:
+                self.inputs[campo.nombre].text = campo.texto(datos.get(campo.nombre))
+        self.mostrar_foto((datos or {}).get('foto'))
+        # Sin esperar al disparador: el formulario se muestra ya calculado
+        self._calcular_diferido.cancel()
+        self.calcular_ratios()
+
+    def restaurar(self, estado):
+        """Vuelve a poner lo escrito en el formulario sin guardar."""
+        for campo in CAMPOS_TOCON:
+            if f'formulario.{campo.nombre}' in estado:
+                self.inputs[campo.nombre].text = estado[f'formulario.{campo.nombre}']
+        if 'formulario.foto' in estado:
+            self.mostrar_foto(estado['formulario.foto'])
+        self._calcular_diferido.cancel()
+        self.calcular_ratios()
+
+    def mostrar_foto(self, foto):
+        self.foto = foto
+        App.get_running_app().diario.anotar('formulario.foto', foto)
+        self.btn_foto.text = 'Cambiar foto' if foto else 'Tomar foto'
+        textura = None
+        if foto:
+            textura = App.get_running_app().miniaturas.pedir(foto, self._miniatura_lista)
+        self.vista_foto.texture = textura
+
+    def _miniatura_lista(self, foto, textura):
+        if foto == self.foto:
+            self.vista_foto.texture = textura
+
+    def procesar_foto(self, ruta, temporal):
+        """Reduce la foto capturada en segundo plano; el original nunca se carga en la UI."""
+        app = App.get_running_app()
+        numero = self.numero_tocon
+        self.btn_foto.disabled = True
+        self.btn_foto.text = 'Procesando foto...'
+
+        def terminada(foto):
+            self.btn_foto.disabled = False
+            if numero == self.numero_tocon:
+                self.mostrar_foto(foto)
+
+        def fallida(error):
+            self.btn_foto.disabled = False
+            self.mostrar_foto(self.foto)
+            Logger.error(f'Foto: {error}')
+            popup = Popup(title='Error',
+                        content=Label(text=f'{FASES_EXPORTACION.get(error.fase, "Error al guardar")}:\n{error.mensaje}'),
+                        size_hint=(0.8, 0.4))
+            popup.open()
 
-            ct_d = (ct / d) * 100
-            cd_d = (cd / d) * 100
-            ab_d = (ab / d) * 100
+        def reducir(progreso):
+            from fotos import procesar_foto
+            return procesar_foto(ruta, app.carpeta_fotos, borrar_origen=temporal)
 
-            self.inputs['ct_d_ratio'].text = f"{ct_d:.1f}% {'✅' if abs(ct_d - 65) < 0.1 else '❌'}"
-            self.inputs['cd_d_ratio'].text = f"{cd_d:.1f}% {'✅' if 20 <= cd_d <= 25 else '❌'}"
-            self.inputs['ab_d_ratio'].text = f"{ab_d:.1f}% {'✅' if ab_d <= 10 else '❌'}"
+        lanzar('foto', reducir,
+               al_terminar=terminada, al_fallar=fallida, despachar=despachar_en_ui)
 
-        except ValueError:
+    def leer_medidas(self):
+        return leer_tocon({campo.nombre: self.inputs[campo.nombre].text for campo in CAMPOS_TOCON})
+
+    def mostrar_ratios(self, ct_d, cd_d, ab_d):
+        (self.inputs['ct_d_ratio'].text,
+         self.inputs['cd_d_ratio'].text,
+         self.inputs['ab_d_ratio'].text) = formatear_ratios(ct_d, cd_d, ab_d,
+                                                            App.get_running_app().umbrales)
+
+    @traza.medido('calcular_ratios')
+    def calcular_ratios(self):
+        """Valida lo escrito y muestra los ratios, o el primer error en la línea de estado."""
+        self.resultado = None
+        try:
+            medidas = self.leer_medidas()
+        except ErrorCampo as e:
+            for campo in CAMPOS_RATIO:
+                self.inputs[campo.nombre].text = ''
+            # Un formulario vacío todavía no es un error
+            vacio = not any(self.inputs[campo.nombre].text.strip() for campo in CAMPOS_TOCON)
+            self.mensaje.text = '' if vacio else str(e)
+            return e
+
+        ct_d, cd_d, ab_d, _, _, _ = calcular_ratios_tocon(medidas['d'], medidas['ct'],
+                                                          medidas['cd'], medidas['ab'],
+                                                          App.get_running_app().umbrales)
+        self.mostrar_ratios(ct_d, cd_d, ab_d)
+        self.mensaje.text = ''
+        self.resultado = dict(medidas, ct_d_ratio=ct_d, cd_d_ratio=cd_d, ab_d_ratio=ab_d)
+        return None
+
+    @traza.medido('guardar_datos')
+    def guardar_datos(self, instance):
+        # Lo último escrito puede no haber pasado aún por el disparador
+        self._calcular_diferido.cancel()
+        error = self.calcular_ratios()
+        if error is not None:
             popup = Popup(title='Error',
-                        content=Label(text='Por favor ingrese valores numéricos válidos'),
+                        content=Label(text=str(error)),
                         size_hint=(0.8, 0.4))
             popup.open()
-
-    def guardar_datos(self, instance):
-        if not self.inputs['ct_d_ratio'].text:
-            self.calcular_ratios(instance)
             return
-
-        self.datos_tocones[self.numero_tocon] = {
-            'd': self.inputs['d'].text,
-            'altura': self.inputs['altura'].text,
-            'ct': self.inputs['ct'].text,
-            'cd': self.inputs['cd'].text,
-            'ab': self.inputs['ab'].text,
-            'altura1': self.inputs['altura1'].text,
-            'ct_d_ratio': self.inputs['ct_d_ratio'].text,
-            'cd_d_ratio': self.inputs['cd_d_ratio'].text,
-            'ab_d_ratio': self.inputs['ab_d_ratio'].text
-        }
+        datos = self.resultado
+        if self.foto:
+            datos['foto'] = self.foto
+        self.datos_tocones[self.numero_tocon] = datos
+        self.estados.actualizar(self.numero_tocon, datos)
+        App.get_running_app().diario.anotar(f'tocon.{self.numero_tocon}', datos)
+
+        evaluacion_id = self.manager.get_screen('encabezado').evaluacion_id
+        if evaluacion_id is not None:
+            App.get_running_app().almacen.guardar_tocon(
+                evaluacion_id, tocon_desde_formulario(self.numero_tocon,
+                                                      self.datos_tocones[self.numero_tocon]))
 
         popup = Popup(title='Éxito',
                     content=Label(text=f'Datos del Tocón {self.numero_tocon} guardados'),
                     size_hint=(0.7, 0.3))
         popup.open()
 
+# Módulos pesados que solo necesita la exportación
+MODULOS_EXPORTACION = ['qrcode', 'exportador', 'transferencia_qr']
+
+informe_arranque = InformeArranque(_INICIO_ARRANQUE)
+informe_arranque.marcar('importacion')
+
+class FilaEvaluacion(RecycleDataViewBehavior, BoxLayout):
+    evaluacion_id = NumericProperty(0)
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation='horizontal', spacing=dp(10), **kwargs)
+        self.etiqueta = Label(color=DARK_TEXT)
+        self.add_widget(self.etiqueta)
+
+        btn_abrir = Button(text='Abrir',
+                         size_hint_x=None,
+                         width=dp(90),
+                         background_color=PRIMARY_COLOR,
+                         color=LIGHT_TEXT)
+        btn_abrir.bind(on_release=lambda x: self.parent.parent.al_abrir(self.evaluacion_id))
+        self.add_widget(btn_abrir)
+
+        btn_exportar = Button(text='Exportar',
+                            size_hint_x=None,
+                            width=dp(90),
+                            background_color=(0.3, 0.69, 0.49, 1),
+                            color=LIGHT_TEXT)
+        btn_exportar.bind(on_release=lambda x: self.parent.parent.al_exportar(self.evaluacion_id, x))
+        self.add_widget(btn_exportar)
+
+    def refresh_view_attrs(self, rv, index, data):
+        data = dict(data)
+        self.etiqueta.text = data.pop('texto')
+        super().refresh_view_attrs(rv, index, data)
+
+class ListaEvaluaciones(RecycleView):
+    """Evaluaciones guardadas; solo se crean las filas visibles."""
+
+    def __init__(self, al_abrir, al_exportar, **kwargs):
+        super().__init__(do_scroll_x=False, **kwargs)
+        self.al_abrir = al_abrir
+        self.al_exportar = al_exportar
+        self.viewclass = FilaEvaluacion
+        layout = RecycleBoxLayout(orientation='vertical',
+                                  spacing=dp(10),
+                                  default_size=(None, dp(60)),
+                                  default_size_hint=(1, None),
+                                  size_hint_y=None)
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+
+class HistorialScreen(Screen):
+    POR_PAGINA = 100
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        layout = BoxLayout(orientation='vertical', spacing=dp(15), padding=dp(20))
+
+        title = Label(text='Evaluaciones Guardadas',
+                    font_size=dp(24),
+                    bold=True,
+                    color=DARK_TEXT,
+                    size_hint_y=None,
+                    height=dp(50))
+        layout.add_widget(title)
+
+        self.resumen = Label(color=DARK_TEXT, size_hint_y=None, height=dp(25))
+        layout.add_widget(self.resumen)
+
+        self.lista = ListaEvaluaciones(al_abrir=self.abrir, al_exportar=self.exportar)
+        layout.add_widget(self.lista)
+
+        # Las evaluaciones se leen por páginas; las más antiguas se piden con este botón
+        self.btn_mas = Button(text='Cargar más',
+                            size_hint_y=None,
+                            height=dp(50),
+                            background_color=PRIMARY_COLOR,
+                            color=LIGHT_TEXT)
+        self.btn_mas.bind(on_release=lambda x: self.cargar_pagina())
+        layout.add_widget(self.btn_mas)
+
+        btn_volver = Button(text='Volver',
+                          size_hint_y=None,
+                          height=dp(60),
+                          background_color=ACCENT_COLOR,
+                          color=LIGHT_TEXT)
+        btn_volver.bind(on_release=lambda x: setattr(self.manager, 'current', 'menu'))
+        layout.add_widget(btn_volver)
+
+        self.add_widget(layout)
+
+    def on_pre_enter(self, *args):
+        self.lista.data = []
+        self.cargar_pagina()
+
+    def cargar_pagina(self):
+        """Agrega a la lista la siguiente página de evaluaciones guardadas."""
+        almacen = App.get_running_app().almacen
+        filas = []
+        for evaluacion in almacen.listar_evaluaciones(limite=self.POR_PAGINA,
+                                                      inicio=len(self.lista.data)):
+            estado = 'exportada' if evaluacion.estado == 'completa' else 'en curso'
+            filas.append({'evaluacion_id': evaluacion.id,
+                          'texto': f'{evaluacion.finca} / {evaluacion.lote} - {evaluacion.evaluacion}\n'
+                                   f'{evaluacion.motosierrista} ({evaluacion.num_tocones} tocones, {estado})'})
+        self.lista.data = self.lista.data + filas
+        total = almacen.contar_evaluaciones()
+        mostradas = len(self.lista.data)
+        self.resumen.text = f'Mostrando {mostradas} de {total} evaluaciones'
+        self.btn_mas.disabled = mostradas >= total
+
+    def abrir(self, evaluacion_id):
+        evaluacion = App.get_running_app().almacen.obtener_evaluacion(evaluacion_id)
+        self.manager.get_screen('ingreso_tocones').cargar_evaluacion(evaluacion)
+        self.manager.current = 'encabezado'
+
+    def exportar(self, evaluacion_id, instance):
+        evaluacion = App.get_running_app().almacen.obtener_evaluacion(evaluacion_id)
+        datos_tocones = {tocon.numero: tocon.como_datos() for tocon in evaluacion.tocones}
+        self.manager.get_screen('ingreso_tocones').iniciar_exportacion(
+            evaluacion.encabezado(), datos_tocones, evaluacion.firmas, evaluacion.id, instance)
+
+DIMENSIONES_TABLERO = {'Motosierrista': 'motosierrista', 'Finca': 'finca', 'Lote': 'lote'}
+
+class TableroScreen(Screen):
+    """Cumplimiento acumulado por motosierrista, finca o lote, leído de los agregados del almacén."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        layout = BoxLayout(orientation='vertical', spacing=dp(15), padding=dp(20))
+
+        title = Label(text='Tablero de Cumplimiento',
+                    font_size=dp(24),
+                    bold=True,
+                    color=DARK_TEXT,
+                    size_hint_y=None,
+                    height=dp(50))
+        layout.add_widget(title)
+
+        filtros = BoxLayout(orientation='horizontal', spacing=dp(10),
+                            size_hint_y=None, height=dp(40))
+        self.dimension = Spinner(text='Motosierrista',
+                                 values=list(DIMENSIONES_TABLERO),
+                                 background_color=(1, 1, 1, 1))
+        self.mes = Spinner(text='Todos los meses',
+                           values=['Todos los meses'],
+                           background_color=(1, 1, 1, 1))
+        self.dimension.bind(text=lambda *args: self.actualizar())
+        self.mes.bind(text=lambda *args: self.actualizar())
+        filtros.add_widget(self.dimension)
+        filtros.add_widget(self.mes)
+        layout.add_widget(filtros)
+
+        self.total = Label(color=DARK_TEXT, size_hint_y=None, height=dp(40))
+        layout.add_widget(self.total)
+
+        scroll = ScrollView(do_scroll_x=False)
+        self.lista = GridLayout(cols=1, spacing=dp(10), size_hint_y=None)
+        self.lista.bind(minimum_height=self.lista.setter('height'))
+        scroll.add_widget(self.lista)
+        layout.add_widget(scroll)
+
+        btn_volver = Button(text='Volver',
+                          size_hint_y=None,
+                          height=dp(60),
+                          background_color=ACCENT_COLOR,
+                          color=LIGHT_TEXT)
+        btn_volver.bind(on_release=lambda x: setattr(self.manager, 'current', 'menu'))
+        layout.add_widget(btn_volver)
+
+        self.add_widget(layout)
+
+    def on_pre_enter(self, *args):
+        self.mes.values = ['Todos los meses'] + App.get_running_app().almacen.meses_con_datos()
+        self.actualizar()
+
+    def actualizar(self):
+        almacen = App.get_running_app().almacen
+        mes = None if self.mes.text == 'Todos los meses' else self.mes.text
+        total = almacen.resumen_cumplimiento('total', mes)
+        if total and total[0].n:
+            general = total[0]
+            self.total.text = (f'{general.evaluaciones} evaluaciones, {general.n} tocones - '
+                               f'cumplen {general.tasa("n_cumple"):.0f}%')
+        else:
+            self.total.text = 'Sin tocones registrados'
+
+        self.lista.clear_widgets()
+        for grupo in almacen.resumen_cumplimiento(DIMENSIONES_TABLERO[self.dimension.text], mes):
+            if not grupo.n:
+                continue
+            tasa = grupo.tasa('n_cumple')
+            fila = Label(text=f'{grupo.clave or "(sin nombre)"}: {grupo.n} tocones, cumplen {tasa:.0f}%\n'
+                              f'CT/d {grupo.media("ct"):.1f}±{grupo.desviacion("ct") if grupo.n > 1 else 0:.1f}% '
+                              f'(ok {grupo.tasa("n_ct_ok"):.0f}%)  '
+                              f'CD/d {grupo.media("cd"):.1f}% (ok {grupo.tasa("n_cd_ok"):.0f}%)  '
+                              f'AB/d {grupo.media("ab"):.1f}±{grupo.desviacion("ab") if grupo.n > 1 else 0:.1f}% '
+                              f'(ok {grupo.tasa("n_ab_ok"):.0f}%)',
+                         color=COLORES_ESTADO['cumple'] if tasa >= 80 else
+                               COLORES_ESTADO['falla'] if tasa < 50 else DARK_TEXT,
+                         halign='left',
+                         size_hint_y=None,
+                         height=dp(60))
+            fila.bind(width=lambda lbl, ancho: setattr(lbl, 'text_size', (ancho, None)))
+            self.lista.add_widget(fila)
+
+def leer_qr_en_cuadro(pixels, ancho, alto):
+    """Busca códigos QR en un cuadro RGBA de la cámara; corre en un hilo de trabajo."""
+    pyzbar = importar_diferido('pyzbar.pyzbar')
+    # El canal verde basta como escala de grises para el lector
+    grises = bytes(pixels[1::4])
+    return [codigo.data.decode('ascii', 'replace')
+            for codigo in pyzbar.decode((grises, ancho, alto))]
+
+class RecibirQRScreen(Screen):
+    """Lee con la cámara la secuencia de QR de otra tableta y guarda la evaluación."""
+    SEGUNDOS_ENTRE_LECTURAS = 0.25
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.layout = BoxLayout(orientation='vertical', spacing=dp(15), padding=dp(20))
+
+        self.estado = Label(text='Apunte la cámara a los códigos QR',
+                          color=DARK_TEXT,
+                          size_hint_y=None,
+                          height=dp(60))
+        self.layout.add_widget(self.estado)
+
+        btn_volver = Button(text='Volver',
+                          size_hint_y=None,
+                          height=dp(60),
+                          background_color=ACCENT_COLOR,
+                          color=LIGHT_TEXT)
+        btn_volver.bind(on_release=lambda x: setattr(self.manager, 'current', 'menu'))
+        self.layout.add_widget(btn_volver)
+
+        self.add_widget(self.layout)
+        self.camara = None
+        self._evento = None
+        self.reensamblador = None
+
+    def on_enter(self, *args):
+        from transferencia_qr import Reensamblador
+        self.reensamblador = Reensamblador()
+        try:
+            importar_diferido('pyzbar.pyzbar')
+            from kivy.uix.camera import Camera
+        except ImportError:
+            self.estado.text = 'Lector de QR no disponible en este equipo'
+            return
+        # La cámara se crea al entrar y se libera al salir
+        self.camara = Camera(play=True, resolution=(640, 480))
+        self.layout.add_widget(self.camara, index=1)
+        self._evento = Clock.schedule_interval(self._leer_cuadro, self.SEGUNDOS_ENTRE_LECTURAS)
+
+    def on_leave(self, *args):
+        if self._evento is not None:
+            self._evento.cancel()
+            self._evento = None
+        if self.camara is not None:
+            self.camara.play = False
+            self.layout.remove_widget(self.camara)
+            self.camara = None
+
+    def _leer_cuadro(self, dt):
+        textura = self.camara.texture if self.camara else None
+        if textura is None:
+            return
+        pixels, (ancho, alto) = textura.pixels, textura.size
+        # Si el cuadro anterior aún se está leyendo, lanzar() descarta este
+        lanzar('lectura_qr', lambda progreso: leer_qr_en_cuadro(pixels, ancho, alto),
+               al_terminar=self._codigos_leidos,
+               despachar=despachar_en_ui)
+
+    def _codigos_leidos(self, textos):
+        if self.reensamblador is None:
+            # Lectura que terminó después de guardar la evaluación
+            return
+        from transferencia_qr import ErrorTransferencia, Reensamblador
+        for texto in textos:
+            try:
+                self.reensamblador.agregar(texto)
+            except ErrorTransferencia as e:
+                self.estado.text = str(e)
+                continue
+            recibidas = len(self.reensamblador.partes)
+            self.estado.text = f'Partes leídas: {recibidas} de {self.reensamblador.total}'
+
+        if self.reensamblador.completo:
+            try:
+                encabezado, datos_tocones = self.reensamblador.evaluacion()
+            except ErrorTransferencia as e:
+                self.estado.text = f'{e}\nVuelva a leer los códigos'
+                self.reensamblador = Reensamblador()
+                return
+            # Hasta que termine la transición no pasa on_leave: se corta aquí la
+            # lectura para no guardar la misma evaluación dos veces
+            if self._evento is not None:
+                self._evento.cancel()
+                self._evento = None
+            self.reensamblador = None
+            self.guardar_recibida(encabezado, datos_tocones)
+
+    def guardar_recibida(self, encabezado, datos_tocones):
+        app = App.get_running_app()
+        almacen = app.almacen
+        evaluacion_id = almacen.guardar_encabezado(encabezado)
+        for num, datos in datos_tocones.items():
+            ct_d, cd_d, ab_d, _, _, _ = calcular_ratios_tocon(datos['d'], datos['ct'],
+                                                              datos['cd'], datos['ab'],
+                                                              app.umbrales)
+            datos.update(ct_d_ratio=ct_d, cd_d_ratio=cd_d, ab_d_ratio=ab_d)
+            almacen.guardar_tocon(evaluacion_id, tocon_desde_formulario(num, datos))
+        # Llega terminada: cuenta como completa en el historial, los agregados y la consola
+        almacen.marcar_exportada(evaluacion_id, None)
+
+        popup = Popup(title='Evaluación recibida',
+                    content=Label(text=f'{encabezado["finca"]} / {encabezado["lote"]}\n'
+                                       f'{len(datos_tocones)} tocones guardados en el historial'),
+                    size_hint=(0.8, 0.4))
+        popup.open()
+        self.manager.current = 'historial'
+
+# Pantallas a las que vuelve la app al recuperar una sesión interrumpida
+PANTALLAS_SESION = ('encabezado', 'ingreso_tocones', 'formulario_tocon')
+
+class GestorPantallas(ScreenManager):
+    """ScreenManager que construye cada pantalla la primera vez que se pide."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._fabricas = {}
+        self.tiempos_construccion = {}
+
+    def registrar(self, nombre, fabrica):
+        self._fabricas[nombre] = fabrica
+
+    def construir(self, nombre):
+        fabrica = self._fabricas.pop(nombre, None)
+        if fabrica is not None:
+            inicio = time.perf_counter()
+            self.add_widget(fabrica(name=nombre))
+            self.tiempos_construccion[nombre] = round((time.perf_counter() - inicio) * 1000, 2)
+            Logger.debug(f'Pantallas: {nombre} construida en {self.tiempos_construccion[nombre]}ms')
+
+    def has_screen(self, name):
+        return name in self._fabricas or super().has_screen(name)
+
+    def on_current(self, instance, value):
+        if value in PANTALLAS_SESION:
+            App.get_running_app().diario.anotar('pantalla', value)
+        if not traza.activa:
+            return super().on_current(instance, value)
+        anterior = self.current_screen.name if self.current_screen else None
+        construida = value in self._fabricas
+        inicio = time.perf_counter()
+        super().on_current(instance, value)
+        traza.evento('pantalla', (time.perf_counter() - inicio) * 1000,
+                     desde=anterior, hacia=value, construida=construida)
+
+    def get_screen(self, name):
+        # Cambiar `current` también pasa por aquí
+        self.construir(name)
+        return super().get_screen(name)
+
+    def precargar(self, nombres, al_terminar=None):
+        """Construye las pantallas indicadas, una por cuadro, para no trabar la UI."""
+        pendientes = [nombre for nombre in nombres if nombre in self._fabricas]
+
+        def siguiente(dt):
+            if pendientes:
+                self.construir(pendientes.pop(0))
+                Clock.schedule_once(siguiente, 0)
+            elif al_terminar is not None:
+                al_terminar()
+
+        Clock.schedule_once(siguiente, 0)
+
+# Pantallas que probablemente se abran después del menú, en orden
+PANTALLAS_PRECARGA = ['encabezado', 'ingreso_tocones']
+
 class ToconesApp(App):
+    def build_config(self, config):
+        # Criterios de cumplimiento editables en tocones.ini sin recompilar
+        config.setdefaults('umbrales', asdict(UMBRALES))
+        config.setdefaults('muestreo', {
+            'tocones': 12
+        })
+        # Traza de tiempos para diagnosticar lentitud; se activa desde los ajustes
+        config.setdefaults('diagnostico', {
+            'traza': 0,
+            'cuadro_lento_ms': 50
+        })
+        # Servidor central; sin url las evaluaciones solo quedan en la bandeja
+        config.setdefaults('sincronizacion', {
+            'url': '',
+            'token': '',
+            'lote': 20,
+            'intervalo': 60
+        })
+        # Polígonos de lotes: archivos .geojson en la carpeta lotes/ de la app
+        config.setdefaults('lotes', {
+            'propiedad_finca': 'finca',
+            'propiedad_lote': 'lote',
+            'precision_gps': 30,
+            'espera_gps': 30
+        })
+
     def build(self):
         Window.clearcolor = SECONDARY_COLOR
-        sm = ScreenManager()
+        # Solo los campos de Umbrales: una clave de más en tocones.ini no rompe el arranque
+        self.umbrales = Umbrales(**{campo.name: self.config.getfloat('umbrales', campo.name)
+                                    for campo in fields(Umbrales)})
+        self.almacen = AlmacenEvaluaciones(os.path.join(self.user_data_dir, 'evaluaciones.db'),
+                                           self.umbrales)
+        # El histórico y las miniaturas se crean la primera vez que se piden
+        self._historico = None
+        self._miniaturas = None
+        # Bitácora de lo que se está escribiendo, para recuperarlo si el sistema cierra la app
+        self.diario = Diario(os.path.join(self.user_data_dir, 'sesion.diario'))
+        # Fotos reducidas de los tocones
+        self.carpeta_fotos = os.path.join(self.user_data_dir, 'fotos')
+        self._indice_lotes = None
+        self.cliente_sincronizacion = None
+        # Listado de personal editable sin recompilar; sin archivo se usa el de fábrica
+        self.directorio_personal = DirectorioPersonal(
+            os.path.join(self.user_data_dir, 'personal.csv'), self.almacen.nombres_usados)
+        traza.configurar(os.path.join(self.user_data_dir, 'traza.jsonl'),
+                         self.config.getboolean('diagnostico', 'traza'))
+        self._ultimo_cuadro = None
+        # Solo el menú se construye antes del primer cuadro
+        sm = GestorPantallas()
         sm.add_widget(MenuPrincipal(name='menu'))
-        sm.add_widget(EncabezadoTocones(name='encabezado'))
-        sm.add_widget(IngresoToconesScreen(name='ingreso_tocones'))
+        sm.registrar('encabezado', EncabezadoTocones)
+        sm.registrar('ingreso_tocones', IngresoToconesScreen)
+        sm.registrar('historial', HistorialScreen)
+        sm.registrar('tablero', TableroScreen)
+        sm.registrar('recibir_qr', RecibirQRScreen)
+        informe_arranque.marcar('build')
         return sm
 
+    def on_start(self):
+        Window.bind(on_flip=self._primer_cuadro)
+
+    def build_settings(self, settings):
+        settings.add_json_panel('Diagnóstico', self.config, data=json.dumps([
+            {'type': 'bool', 'title': 'Registrar traza de tiempos',
+             'desc': 'Guarda tiempos de pantallas, cálculos y exportación',
+             'section': 'diagnostico', 'key': 'traza'},
+            {'type': 'numeric', 'title': 'Cuadro lento (ms)',
+             'desc': 'Cuadros más largos que esto se anotan en la traza',
+             'section': 'diagnostico', 'key': 'cuadro_lento_ms'},
+        ]))
+
+    def on_config_change(self, config, section, key, value):
+        if (section, key) == ('diagnostico', 'traza'):
+            traza.configurar(activa=config.getboolean('diagnostico', 'traza'))
+            self._vigilar_cuadros()
+
+    def _vigilar_cuadros(self):
+        # El reloj solo se engancha a cada cuadro mientras la traza está encendida
+        Clock.unschedule(self._medir_cuadro)
+        self._ultimo_cuadro = None
+        if traza.activa:
+            Clock.schedule_interval(self._medir_cuadro, 0)
+
+    def _medir_cuadro(self, dt):
+        ahora = time.perf_counter()
+        if self._ultimo_cuadro is not None:
+            ms = (ahora - self._ultimo_cuadro) * 1000
+            if ms > self.config.getfloat('diagnostico', 'cuadro_lento_ms'):
+                traza.evento('cuadro_lento', ms, pantalla=self.root.current)
+        self._ultimo_cuadro = ahora
+
+    def on_pause(self):
+        traza.vaciar()
+        # Android puede matar la app pausada sin avisar
+        self.diario.vaciar()
+        return True
+
+    def on_stop(self):
+        traza.vaciar()
+        self.diario.cerrar()
+        if self.cliente_sincronizacion is not None:
+            self.cliente_sincronizacion.cerrar()
+        self.almacen.cerrar()
+
+    @property
+    def historico(self):
+        """Copia compacta de las evaluaciones completas para consultas de largo plazo."""
+        if self._historico is None:
+            from historico import Historico
+            self._historico = Historico(os.path.join(self.user_data_dir, 'historico.tch'))
+        return self._historico
+
+    @property
+    def miniaturas(self):
+        """Caché acotada de las miniaturas de las fotos de los tocones."""
+        if self._miniaturas is None:
+            from fotos import CargadorMiniaturas
+            self._miniaturas = CargadorMiniaturas(self.carpeta_fotos, textura_miniatura,
+                                                  despachar=despachar_en_ui)
+        return self._miniaturas
+
+    def sincronizar(self):
+        """Sube la bandeja de salida en segundo plano si hay envíos que ya tocan."""
+        from sincronizacion import ClienteSincronizacion, sincronizar as subir_bandeja
+        url = self.config.get('sincronizacion', 'url').strip()
+        proximo = self.almacen.proximo_envio()
+        if not url or proximo is None or proximo > datetime.now().isoformat(timespec='seconds'):
+            return
+        if self.cliente_sincronizacion is None or self.cliente_sincronizacion.url != url:
+            try:
+                self.cliente_sincronizacion = ClienteSincronizacion(
+                    url, self.config.get('sincronizacion', 'token').strip() or None)
+            except ValueError as e:
+                Logger.warning(f'Sincronizacion: {e}')
+                return
+        cliente = self.cliente_sincronizacion
+        lote = self.config.getint('sincronizacion', 'lote')
+        lanzar('sincronizacion', lambda progreso: subir_bandeja(self.almacen, cliente, lote),
+               al_terminar=lambda enviadas: Logger.info(
+                   f'Sincronizacion: {enviadas} evaluaciones enviadas'),
+               al_fallar=lambda error: Logger.warning(f'Sincronizacion: {error}'),
+               despachar=despachar_en_ui, red=True)
+
+    def _primer_cuadro(self, *args):
+        Window.unbind(on_flip=self._primer_cuadro)
+        informe_arranque.marcar('primer_cuadro')
+        Logger.info(f'ToconesApp: {informe_arranque.resumen()}')
+        Clock.schedule_once(lambda dt: self.restaurar_sesion(), 0)
+
+        # Con el menú ya visible se piden permisos y se precarga lo demás
+        Clock.schedule_once(lambda dt: solicitar_permisos(), 0)
+        precargar_en_segundo_plano(MODULOS_EXPORTACION)
+        self.root.precargar(PANTALLAS_PRECARGA, al_terminar=self._guardar_informe_arranque)
+        # Reintento periódico: así la bandeja se vacía sola cuando vuelve la señal
+        Clock.schedule_interval(lambda dt: self.sincronizar(),
+                                self.config.getfloat('sincronizacion', 'intervalo'))
+        Clock.schedule_once(lambda dt: self.sincronizar(), 5)
+        self._vigilar_cuadros()
+
+    def indice_lotes(self):
+        """Índice de los polígonos de lotes; se arma o se lee de la caché cuando cambian.
+
+        Corre en un hilo de trabajo. Usa los .geojson de ``lotes/`` en la
+        carpeta de la app y, si viene en el paquete, ``assets/lotes.geojson``.
+        """
+        carpeta = os.path.join(self.user_data_dir, 'lotes')
+        rutas = []
+        if os.path.isdir(carpeta):
+            rutas = [os.path.join(carpeta, nombre) for nombre in os.listdir(carpeta)
+                     if nombre.lower().endswith(('.geojson', '.json'))]
+        if os.path.exists('assets/lotes.geojson'):
+            rutas.append('assets/lotes.geojson')
+        if not rutas:
+            raise ErrorTrabajo('lotes', f'No hay polígonos de lotes en {carpeta}')
+        propiedades = (self.config.get('lotes', 'propiedad_finca'),
+                       self.config.get('lotes', 'propiedad_lote'))
+        from lotes import cargar_indice, firma_geojson
+        try:
+            # Si llegaron lotes nuevos a la carpeta el índice se rehace
+            if (self._indice_lotes is None
+                    or self._indice_lotes.firma != firma_geojson(rutas, *propiedades)):
+                with traza.medir('lotes.indice', archivos=len(rutas)):
+                    self._indice_lotes = cargar_indice(
+                        rutas, os.path.join(self.user_data_dir, 'lotes.indice'), *propiedades)
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+            raise ErrorTrabajo('lotes', str(e), e) from e
+        return self._indice_lotes
+
+    def restaurar_sesion(self):
+        """Reabre la sesión anotada en la bitácora si la app se cerró a mitad de un lote."""
+        with traza.medir('sesion.restaurar'):
+            estado = self.diario.recuperar()
+            if not estado:
+                return
+            encabezado = self.root.get_screen('encabezado')
+            ingreso = self.root.get_screen('ingreso_tocones')
+            evaluacion = None
+            if estado.get('evaluacion_id') is not None:
+                evaluacion = self.almacen.obtener_evaluacion(estado['evaluacion_id'])
+            if evaluacion is not None:
+                # Lo ya guardado sale del almacén; la bitácora agrega lo que faltaba
+                ingreso.cargar_evaluacion(evaluacion)
+            encabezado.restaurar(estado)
+            ingreso.restaurar(estado)
+            pantalla = estado.get('pantalla', 'encabezado')
+            numero = estado.get('formulario.numero')
+            if pantalla == 'formulario_tocon' and numero in ingreso.datos_tocones:
+                ingreso.abrir_formulario_tocon(numero)
+                self.root.get_screen('formulario_tocon').restaurar(estado)
+            else:
+                self.root.current = 'ingreso_tocones' if pantalla == 'ingreso_tocones' else 'encabezado'
+        Logger.info(f'ToconesApp: sesión recuperada ({len(estado)} valores)')
+
+    def _guardar_informe_arranque(self):
+        informe_arranque.extras['pantallas_ms'] = dict(self.root.tiempos_construccion)
+        # benchmark.py pide el informe en otra ruta y que la app se cierre al terminar
+        ruta_medicion = os.environ.get('TOCONES_INFORME_ARRANQUE')
+        try:
+            informe_arranque.guardar(ruta_medicion or
+                                     os.path.join(self.user_data_dir, 'arranque.jsonl'))
+        except OSError as e:
+            Logger.warning(f'ToconesApp: no se pudo guardar el informe de arranque: {e}')
+        if ruta_medicion:
+            self.stop()
+
 if __name__ == '__main__':
     ToconesApp().run()
\ No newline at end of file
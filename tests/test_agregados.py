@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+import agregados
+from almacen import AlmacenEvaluaciones, Tocon
+from calculos import Umbrales
+
+
+def _resumen(almacen, dimension):
+    return [(a.clave, a.evaluaciones, a.n, a.n_cumple, round(a.suma_ct, 6), round(a.suma2_ab, 6))
+            for a in almacen.resumen_cumplimiento(dimension)]
+
+
+class PruebasAgregados(unittest.TestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.carpeta.name, 'evaluaciones.db')
+        self.almacen = AlmacenEvaluaciones(self.ruta)
+
+    def tearDown(self):
+        self.almacen.cerrar()
+        self.carpeta.cleanup()
+
+    def _evaluacion(self, finca, lote, fecha, tocones):
+        evaluacion_id = self.almacen.guardar_encabezado(
+            {'finca': finca, 'lote': lote, 'evaluacion': fecha, 'motosierrista': 'Pedro'})
+        for numero, (d, ct, cd, ab) in enumerate(tocones, 1):
+            self.almacen.guardar_tocon(evaluacion_id, Tocon(numero, d=d, ct=ct, cd=cd, ab=ab))
+        return evaluacion_id
+
+    def _igual_que_reconstruido(self):
+        incremental = {d: _resumen(self.almacen, d) for d in agregados.DIMENSIONES + ['total']}
+        with self.almacen._con:
+            agregados.reconstruir(self.almacen._con, self.almacen.umbrales)
+        self.assertEqual({d: _resumen(self.almacen, d) for d in incremental}, incremental)
+
+    def test_cambios_incrementales_coinciden_con_reconstruir(self):
+        # 65 % / 22 % / 5 % cumple todo; el segundo falla CT; el tercero no tiene medidas
+        primera = self._evaluacion('A', '1', '10/03/2026',
+                                   [(40, 26, 8.8, 2), (40, 10, 8.8, 2), (None, None, None, None)])
+        segunda = self._evaluacion('B', '7', '02/04/2026', [(50, 32.5, 11, 4)])
+        self.almacen.marcar_exportada(primera, 'a.xlsx')
+        total = self.almacen.resumen_cumplimiento('total')[0]
+        # Una evaluación completa; de los tres tocones con medidas cumplen dos
+        self.assertEqual((total.evaluaciones, total.n, total.n_cumple), (1, 3, 2))
+
+        # Corregir un tocón resta su aporte anterior
+        self.almacen.guardar_tocon(primera, Tocon(2, d=40, ct=26, cd=8.8, ab=2))
+        # Cambiar la finca mueve todos los aportes de grupo
+        self.almacen.guardar_encabezado({'finca': 'C', 'lote': '7', 'evaluacion': '02/04/2026',
+                                         'motosierrista': 'Pedro'}, segunda)
+        self._igual_que_reconstruido()
+        self.assertEqual([a.clave for a in self.almacen.resumen_cumplimiento('finca')],
+                         ['A', 'C'])
+
+        self.almacen.eliminar(primera)
+        self._igual_que_reconstruido()
+        self.assertEqual([a.clave for a in self.almacen.resumen_cumplimiento('finca')], ['C'])
+
+    def test_cambiar_umbrales_reconstruye_al_abrir(self):
+        self._evaluacion('A', '1', '10/03/2026', [(40, 26, 8.8, 2)])
+        self.assertEqual(self.almacen.resumen_cumplimiento('total')[0].n_cumple, 1)
+        self.almacen.cerrar()
+        self.almacen = AlmacenEvaluaciones(self.ruta, Umbrales(ab_max=4.0))
+        self.assertEqual(self.almacen.resumen_cumplimiento('total')[0].n_cumple, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
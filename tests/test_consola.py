@@ -0,0 +1,64 @@
+import csv
+import os
+import tempfile
+import unittest
+
+import consola
+from exportador import COLUMNAS_EVALUACION, filas_evaluacion
+
+
+class PruebasLeerArchivo(unittest.TestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.carpeta.name, 'evaluaciones.csv')
+
+    def tearDown(self):
+        self.carpeta.cleanup()
+
+    def _escribir(self, cantidad, lote=None):
+        with open(self.ruta, 'w', newline='', encoding='utf-8') as f:
+            escritor = csv.writer(f)
+            escritor.writerow(COLUMNAS_EVALUACION)
+            for i in range(cantidad):
+                encabezado = {'lote': lote or f'L{i}', 'evaluacion': '01/02/2026'}
+                for fila in filas_evaluacion(encabezado,
+                                             {1: {'d': 50, 'ct': 10, 'cd': 15, 'ab': 5},
+                                              2: {'d': 40, 'ct': 8, 'cd': 12, 'ab': 4}}):
+                    escritor.writerow(fila)
+
+    def test_entrega_las_evaluaciones_en_bloques(self):
+        cantidad = consola.EVALUACIONES_POR_BLOQUE * 2 + 3
+        self._escribir(cantidad)
+        bloques = list(consola._leer_archivo_seguro(self.ruta))
+        self.assertEqual([len(b) for b, _ in bloques],
+                         [consola.EVALUACIONES_POR_BLOQUE] * 2 + [3])
+        self.assertEqual(bloques[-1][0][-1][0]['lote'], f'L{cantidad - 1}')
+        self.assertEqual(sorted(bloques[0][0][0][1]), [1, 2])
+
+    def test_separa_evaluaciones_seguidas_con_el_mismo_encabezado(self):
+        # Dos muestras del mismo lote y día, o dos exportaciones concatenadas
+        self._escribir(1, lote='L')
+        with open(self.ruta, newline='', encoding='utf-8') as f:
+            filas = list(csv.reader(f))
+        with open(self.ruta, 'a', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows(filas[1:])
+        leidas = list(consola.leer_archivo(self.ruta))
+        self.assertEqual(len(leidas), 2)
+        self.assertEqual([sorted(datos) for _, datos in leidas], [[1, 2], [1, 2]])
+
+    def test_en_paralelo_da_lo_mismo_y_en_orden(self):
+        self._escribir(consola.EVALUACIONES_POR_BLOQUE + 5)
+        secuencial = list(consola.evaluaciones([self.ruta], procesos=1))
+        self.assertEqual(list(consola.evaluaciones([self.ruta], procesos=2)), secuencial)
+
+    def test_archivo_que_no_es_de_evaluaciones_se_anota(self):
+        with open(self.ruta, 'w', encoding='utf-8') as f:
+            f.write('x,y\n1,2\n')
+        errores = []
+        self.assertEqual(list(consola.evaluaciones([self.ruta], procesos=1, errores=errores)), [])
+        self.assertEqual(len(errores), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
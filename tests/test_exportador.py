@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from exportador import COLUMNAS_EVALUACION, EscritorXlsx, escribir_filas, filas_evaluacion
+
+
+class PruebasEscritorXlsx(unittest.TestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.carpeta.name, 'evaluacion.xlsx')
+
+    def tearDown(self):
+        self.carpeta.cleanup()
+
+    def test_escribe_un_zip_valido(self):
+        self.assertEqual(escribir_filas(self.ruta, ['a', 'b'], [[1, 'x'], [2, None]]), 2)
+        with zipfile.ZipFile(self.ruta) as archivo:
+            self.assertIsNone(archivo.testzip())
+
+    def test_fallo_al_cerrar_no_reemplaza_el_archivo(self):
+        with open(self.ruta, 'wb') as f:
+            f.write(b'anterior')
+        escritor = EscritorXlsx(self.ruta, ['a'])
+        with self.assertRaises(OSError):
+            with escritor:
+                escritor.escribir_fila([1])
+                escritor._zip.close = mock.Mock(side_effect=OSError('disco lleno'))
+        # Se devuelve el close verdadero para liberar el archivo temporal
+        del escritor._zip.close
+        escritor._zip.close()
+        with open(self.ruta, 'rb') as f:
+            self.assertEqual(f.read(), b'anterior')
+        self.assertFalse(os.path.exists(self.ruta + '.tmp'))
+
+
+class PruebasFilasEvaluacion(unittest.TestCase):
+
+    def test_cada_valor_va_en_la_columna_de_su_campo(self):
+        datos = {2: {'d': 40, 'ct': 8, 'cd': 12, 'ab': 4},
+                 1: {'d': 50, 'ct': 10, 'cd': 15, 'ab': 5, 'foto': 'abc'}}
+        filas = [dict(zip(COLUMNAS_EVALUACION, fila)) for fila in
+                 filas_evaluacion({'finca': 'F', 'lote': 'L'}, datos, firma_evaluador='f.png')]
+        self.assertEqual([(f['tocon'], f['tocon_num']) for f in filas], [(1, 1), (2, 2)])
+        self.assertEqual(filas[0]['finca'], 'F')
+        self.assertEqual(filas[0]['diametro'], 50)
+        self.assertEqual(filas[0]['CT/d*100'], 20.0)
+        self.assertEqual(filas[0]['foto'], 'abc')
+        self.assertIsNone(filas[1]['foto'])
+        self.assertEqual([f['firma_evaluad'] for f in filas], ['f.png', None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from firmas import DESCARTADO, PUNTOS_POR_SEGMENTO, TrazoEnCurso
+
+
+class PruebasTrazoEnCurso(unittest.TestCase):
+
+    def test_guarda_el_trazo_relativo_al_panel(self):
+        en_curso = TrazoEnCurso(110, 220, origen=(100, 200))
+        self.assertEqual(en_curso.agregar(110.5, 220), DESCARTADO)
+        en_curso.agregar(130, 250)
+        self.assertEqual(list(en_curso.trazo.puntos), [10, 20, 30, 50])
+        self.assertEqual(en_curso.segmento, [110, 220, 130, 250])
+
+    def test_corta_el_segmento_lleno_desde_su_ultimo_punto(self):
+        en_curso = TrazoEnCurso(0, 0)
+        cortes = 0
+        # Zigzag: cada punto cambia de dirección y se agrega
+        for i in range(1, 3 * PUNTOS_POR_SEGMENTO):
+            if en_curso.agregar(i * 10, 10 * (i % 2)) != DESCARTADO:
+                anterior = en_curso.segmento[-2:]
+                if en_curso.cortar_si_lleno():
+                    cortes += 1
+                    self.assertEqual(en_curso.segmento, anterior)
+        # Los segmentos comparten sus extremos: se corta a los 64, 127 y 190 puntos
+        self.assertEqual(cortes, 3)
+        self.assertEqual(len(en_curso.trazo), 3 * PUNTOS_POR_SEGMENTO)
+
+
+if __name__ == '__main__':
+    unittest.main()
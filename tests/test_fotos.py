@@ -0,0 +1,43 @@
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import fotos
+from fotos import CargadorMiniaturas
+
+
+class PruebasCargadorMiniaturas(unittest.TestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.cargador = CargadorMiniaturas(self.carpeta.name, lambda ancho, alto, pixeles: pixeles)
+
+    def tearDown(self):
+        self.carpeta.cleanup()
+
+    def _pedir(self, nombre):
+        listo = threading.Event()
+        recibido = []
+
+        def al_listo(nombre, valor):
+            recibido.append(valor)
+            listo.set()
+
+        self.assertIsNone(self.cargador.pedir(nombre, al_listo))
+        self.assertTrue(listo.wait(5))
+        return recibido
+
+    def test_error_inesperado_de_pil_no_deja_la_miniatura_esperando(self):
+        with mock.patch.object(fotos, 'decodificar_miniatura',
+                               side_effect=ValueError('imagen rota')):
+            self.assertEqual(self._pedir('a'), [None])
+        self.assertEqual(self.cargador._esperando, {})
+
+        # Una vez arreglada la miniatura, se vuelve a pedir y llega
+        with mock.patch.object(fotos, 'decodificar_miniatura', return_value=(1, 1, b'rgba')):
+            self.assertEqual(self._pedir('a'), [b'rgba'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+
+from historico import FILAS_POR_BLOQUE, Historico, _leer_bloques
+
+
+def _evaluacion(evaluacion_id, tocones):
+    encabezado = {'finca': 'La Esperanza', 'lote': 'L-1', 'evaluacion': '15/03/2026',
+                  'edad': '9.9'}
+    datos = {numero: {'d': 30.0, 'ct': 20.0, 'cd': 6.6, 'ab': 2.0}
+             for numero in range(1, tocones + 1)}
+    return evaluacion_id, encabezado, datos
+
+
+class PruebasHistorico(unittest.TestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.historico = Historico(os.path.join(self.carpeta.name, 'historico.tch'))
+
+    def tearDown(self):
+        self.carpeta.cleanup()
+
+    def bloques(self):
+        with open(self.historico.ruta, 'rb') as f:
+            return _leer_bloques(f.read())
+
+    def test_evaluacion_en_el_limite_de_un_bloque_no_se_pierde(self):
+        # 200 × 30 = 6000 filas: la evaluación 137 cruza las 4096 filas
+        self.historico.agregar_varias([_evaluacion(i, 30) for i in range(200)])
+        self.assertEqual(self.historico.resumen()['tocones'], 6000)
+        self.assertEqual(self.historico.resumen()['evaluaciones'], 200)
+        bloques = self.bloques()
+        self.assertGreater(len(bloques), 1)
+        vistas = [e for bloque in bloques for e in bloque.evaluaciones]
+        self.assertEqual(len(vistas), len(set(vistas)))
+        self.historico.compactar()
+        self.assertEqual(self.historico.resumen()['tocones'], 6000)
+
+    def test_evaluacion_mas_grande_que_un_bloque(self):
+        self.historico.agregar_varias([_evaluacion(1, 10), _evaluacion(2, FILAS_POR_BLOQUE + 5)])
+        self.assertEqual(self.historico.resumen()['tocones'], FILAS_POR_BLOQUE + 15)
+
+    def test_volver_a_archivar_reemplaza(self):
+        self.historico.agregar(*_evaluacion(1, 12))
+        self.historico.agregar(*_evaluacion(1, 8))
+        self.assertEqual(self.historico.resumen()['tocones'], 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
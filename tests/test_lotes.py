@@ -0,0 +1,33 @@
+import math
+import unittest
+
+from lotes import IndiceLotes
+
+
+def _cuadro(finca, lote, x0, y0, x1, y1):
+    return {'type': 'Feature', 'properties': {'finca': finca, 'lote': lote},
+            'geometry': {'type': 'Polygon',
+                         'coordinates': [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]]}}
+
+
+class PruebasIndiceLotes(unittest.TestCase):
+
+    def test_punto_junto_al_borde_este_de_la_extension(self):
+        # (lon - x0) / ancho redondea a 1.0 aunque el punto está dentro del lote
+        x1 = 0.123456789
+        indice = IndiceLotes.desde_features([_cuadro('F', '1', x1 - 0.6, 0, x1, 1)])
+        lon = math.nextafter(x1, -math.inf)
+        self.assertEqual(indice.buscar(lon, 0.5), ('F', '1'))
+        self.assertEqual(indice.buscar(x1 - 0.3, math.nextafter(1, 0)), ('F', '1'))
+
+    def test_punto_fuera_de_la_extension(self):
+        indice = IndiceLotes.desde_features([_cuadro('F', '1', 0, 0, 1, 1),
+                                             _cuadro('F', '2', 1, 0, 2, 1)])
+        self.assertEqual(indice.buscar(1.5, 0.5), ('F', '2'))
+        self.assertIsNone(indice.buscar(2.5, 0.5))
+        self.assertIsNone(indice.buscar(-0.5, 0.5))
+        self.assertIsNone(IndiceLotes.desde_features([]).buscar(0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
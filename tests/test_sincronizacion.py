@@ -0,0 +1,110 @@
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+from almacen import AlmacenEvaluaciones, Tocon
+from sincronizacion import ClienteSincronizacion, ServidorPrueba, _ManejadorPrueba, sincronizar
+from trabajos import ErrorTrabajo
+
+
+def _espera(intentos):
+    return 60 * intentos
+
+
+class _ServidorRechazo(ServidorPrueba):
+    """Responde 200 pero no acepta ninguna evaluación."""
+
+    def recibir(self, evaluaciones):
+        return []
+
+
+class _ManejadorLista(_ManejadorPrueba):
+    """Responde JSON que no es un objeto, como algunos proxies."""
+
+    def _responder(self, estado, contenido):
+        super()._responder(estado, ['ok'])
+
+
+class PruebasSincronizacion(unittest.TestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.almacen = AlmacenEvaluaciones(os.path.join(self.carpeta.name, 'evaluaciones.db'))
+        self.claves = []
+        for lote in ('1', '2', '3'):
+            evaluacion_id = self.almacen.guardar_encabezado(
+                {'finca': 'F', 'lote': lote, 'evaluacion': '15/03/2026'})
+            self.almacen.guardar_tocon(evaluacion_id, Tocon(1, d=40.0, ct=26.0, cd=9.0, ab=3.0))
+            self.almacen.marcar_exportada(evaluacion_id, f'lote{lote}.xlsx')
+            self.claves.append(self.almacen.encolar_envio(evaluacion_id))
+        self.servidor = None
+
+    def tearDown(self):
+        if self.servidor is not None:
+            self.servidor.shutdown()
+            self.servidor.server_close()
+        self.almacen.cerrar()
+        self.carpeta.cleanup()
+
+    def _levantar(self, clase=ServidorPrueba):
+        self.servidor = clase(('127.0.0.1', 0))
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return ClienteSincronizacion(
+            f'http://127.0.0.1:{self.servidor.server_address[1]}/evaluaciones', tiempo_espera=5)
+
+    def test_envia_la_bandeja_por_lotes(self):
+        cliente = self._levantar()
+        try:
+            self.assertEqual(sincronizar(self.almacen, cliente, tamano_lote=2, espera=_espera), 3)
+        finally:
+            cliente.cerrar()
+        self.assertEqual(sorted(self.servidor.recibidas), sorted(self.claves))
+        self.assertIsNone(self.almacen.proximo_envio())
+
+    def test_sin_conexion_aplaza_con_espera(self):
+        # Un puerto recién liberado: nadie escucha
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            puerto = s.getsockname()[1]
+        cliente = ClienteSincronizacion(f'http://127.0.0.1:{puerto}/evaluaciones', tiempo_espera=2)
+        antes = datetime.now()
+        with self.assertRaises(ErrorTrabajo) as error:
+            sincronizar(self.almacen, cliente, tamano_lote=2, espera=_espera)
+        self.assertEqual(error.exception.fase, 'red')
+        # Se detuvo en el primer lote: solo esos dos quedan aplazados
+        self.assertEqual(len(self.almacen.pendientes_envio()), 1)
+
+        cliente = self._levantar()
+        try:
+            self.assertEqual(sincronizar(self.almacen, cliente, espera=_espera), 1)
+        finally:
+            cliente.cerrar()
+        self.assertEqual(len(self.servidor.recibidas), 1)
+        # Primer reintento: _espera(1) = 60 s después del fallo
+        self.assertGreaterEqual(self.almacen.proximo_envio(),
+                                (antes + timedelta(seconds=59)).isoformat(timespec='seconds'))
+
+    def test_rechazadas_se_reintentan_mas_tarde(self):
+        cliente = self._levantar(_ServidorRechazo)
+        try:
+            self.assertEqual(sincronizar(self.almacen, cliente, tamano_lote=5, espera=_espera), 0)
+        finally:
+            cliente.cerrar()
+        self.assertEqual(self.almacen.pendientes_envio(), [])
+        self.assertEqual(self.almacen.contar_pendientes_envio(), 3)
+
+    def test_respuesta_que_no_es_objeto_no_corta_el_envio(self):
+        cliente = self._levantar()
+        self.servidor.RequestHandlerClass = _ManejadorLista
+        try:
+            self.assertEqual(sincronizar(self.almacen, cliente, espera=_espera), 3)
+        finally:
+            cliente.cerrar()
+        self.assertIsNone(self.almacen.proximo_envio())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import random
+import unittest
+
+from transferencia_qr import (ErrorTransferencia, Reensamblador, base45_codificar,
+                              base45_decodificar, partes_evaluacion)
+
+ENCABEZADO = {'finca': 'La Ñata', 'lote': '12', 'especie': 'Pino', 'plantacion': '01/03/2010',
+              'evaluacion': '15/03/2026', 'supervisor': 'Ana', 'evaluador': 'Luis',
+              'motosierrista': 'Pedro', 'edad': '16', 'muestra': 40}
+
+
+def _tocones(cantidad, desfase=0.0):
+    return {num: {'d': 30.5 + num + desfase, 'altura': None, 'ct': 19.75, 'cd': 7.0, 'ab': 2.5,
+                  'altura1': 1.25} for num in range(1, cantidad + 1)}
+
+
+class PruebasBase45(unittest.TestCase):
+
+    def test_ida_y_vuelta(self):
+        for datos in (b'', b'\x00', b'\xff\xff', bytes(range(256))):
+            self.assertEqual(base45_decodificar(base45_codificar(datos)), datos)
+
+    def test_caracter_invalido(self):
+        with self.assertRaises(ErrorTransferencia):
+            base45_decodificar('abc')
+
+
+class PruebasReensamblador(unittest.TestCase):
+
+    def test_partes_desordenadas_y_repetidas(self):
+        partes = partes_evaluacion(ENCABEZADO, _tocones(40), caracteres_por_parte=60)
+        self.assertGreater(len(partes), 2)
+        lecturas = partes + partes[:2]
+        random.Random(1).shuffle(lecturas)
+        reensamblador = Reensamblador()
+        for texto in lecturas:
+            reensamblador.agregar(texto)
+        encabezado, datos = reensamblador.evaluacion()
+        self.assertEqual(encabezado['finca'], 'La Ñata')
+        self.assertEqual(encabezado['muestra'], 40)
+        self.assertEqual(datos, _tocones(40))
+
+    def test_parte_danada_no_fija_la_evaluacion(self):
+        partes = partes_evaluacion(ENCABEZADO, _tocones(12), caracteres_por_parte=60)
+        prefijo, contenido = partes[0].rsplit(':', 1)
+        reensamblador = Reensamblador()
+        with self.assertRaises(ErrorTransferencia):
+            reensamblador.agregar(f'{prefijo}:{contenido[::-1]}')
+        self.assertIsNone(reensamblador.identificador)
+        for texto in partes:
+            reensamblador.agregar(texto)
+        self.assertTrue(reensamblador.completo)
+
+    def test_parte_vieja_leida_primero_se_descarta(self):
+        viejas = partes_evaluacion(ENCABEZADO, _tocones(30, desfase=0.5), caracteres_por_parte=60)
+        nuevas = partes_evaluacion(ENCABEZADO, _tocones(30), caracteres_por_parte=60)
+        reensamblador = Reensamblador()
+        reensamblador.agregar(viejas[0])
+        for texto in nuevas:
+            reensamblador.agregar(texto)
+        self.assertEqual(reensamblador.evaluacion()[1], _tocones(30))
+        # Ya completa, una parte de otra evaluación no la pisa
+        with self.assertRaises(ErrorTransferencia):
+            reensamblador.agregar(viejas[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
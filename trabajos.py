@@ -0,0 +1,78 @@
+"""Trabajos en segundo plano para no congelar la interfaz.
+
+El trabajo corre en un pequeño pool de hilos (los de red, en uno aparte) y todas las notificaciones
+(progreso, fin, fallo) pasan por ``despachar``, que en la app es
+``Clock.schedule_once`` para volver al hilo de Kivy. El módulo no importa
+Kivy para poder usarse también desde herramientas de consola.
+"""
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# Dos hilos bastan: uno para la exportación y otro para tareas cortas
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='trabajo')
+# La red va en su propio hilo: un envío que espera timeouts no frena la exportación
+_pool_red = ThreadPoolExecutor(max_workers=1, thread_name_prefix='red')
+_en_curso = set()
+_bloqueo = threading.Lock()
+
+
+class ErrorTrabajo(Exception):
+    """Fallo de un trabajo con la fase en la que ocurrió."""
+
+    def __init__(self, fase, mensaje, causa=None):
+        super().__init__(mensaje)
+        self.fase = fase
+        self.mensaje = mensaje
+        self.causa = causa
+
+    def __str__(self):
+        return f'{self.fase}: {self.mensaje}'
+
+
+def _despachar_directo(funcion, *args):
+    funcion(*args)
+
+
+def en_curso(clave):
+    with _bloqueo:
+        return clave in _en_curso
+
+
+def lanzar(clave, funcion, al_progreso=None, al_terminar=None, al_fallar=None,
+           despachar=_despachar_directo, red=False):
+    """Ejecuta ``funcion(progreso)`` en segundo plano.
+
+    Devuelve el ``Future`` o ``None`` si ya hay un trabajo con la misma clave,
+    lo que evita lanzar dos veces la misma exportación con un doble toque.
+    ``red=True`` lo corre en el hilo de red, separado de los trabajos locales.
+    """
+    with _bloqueo:
+        if clave in _en_curso:
+            return None
+        _en_curso.add(clave)
+
+    def progreso(fraccion, mensaje=''):
+        if al_progreso is not None:
+            despachar(al_progreso, fraccion, mensaje)
+
+    def ejecutar():
+        try:
+            resultado = funcion(progreso)
+        except ErrorTrabajo as e:
+            _terminar(al_fallar, e)
+        except Exception as e:
+            # Errores no previstos se convierten al mismo formato estructurado
+            error = ErrorTrabajo('inesperado', str(e) or type(e).__name__, e)
+            error.traza = traceback.format_exc()
+            _terminar(al_fallar, error)
+        else:
+            _terminar(al_terminar, resultado)
+
+    def _terminar(callback, valor):
+        with _bloqueo:
+            _en_curso.discard(clave)
+        if callback is not None:
+            despachar(callback, valor)
+
+    return (_pool_red if red else _pool).submit(ejecutar)
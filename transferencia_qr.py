@@ -0,0 +1,257 @@
+"""Transferencia de evaluaciones completas entre equipos sin red mediante QR.
+
+La evaluación (encabezado y medidas de cada tocón) se codifica en binario
+compacto, se comprime y se reparte en varias partes de texto aptas para el
+modo alfanumérico de QR (Base45). Cada parte lleva el identificador de la
+evaluación, su número de secuencia, el total y un CRC propio; el
+``Reensamblador`` acepta las partes en cualquier orden y con repeticiones.
+No importa Kivy.
+"""
+import zlib
+
+from almacen import CAMPOS_ENCABEZADO, CAMPOS_MEDIDAS
+
+VERSION = 1
+PREFIJO = 'TC1'
+# Caracteres Base45 por parte: cabe holgado en un QR versión ~15 con corrección M
+CARACTERES_POR_PARTE = 420
+
+_BASE45 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:'
+_VALOR_BASE45 = {c: i for i, c in enumerate(_BASE45)}
+# Las medidas se guardan en centésimas; basta para lo que se anota en campo
+_ESCALA = 100
+
+
+class ErrorTransferencia(ValueError):
+    pass
+
+
+def base45_codificar(datos):
+    salida = []
+    for i in range(0, len(datos) - 1, 2):
+        valor = datos[i] * 256 + datos[i + 1]
+        valor, c = divmod(valor, 45)
+        e, d = divmod(valor, 45)
+        salida.append(_BASE45[c] + _BASE45[d] + _BASE45[e])
+    if len(datos) % 2:
+        d, c = divmod(datos[-1], 45)
+        salida.append(_BASE45[c] + _BASE45[d])
+    return ''.join(salida)
+
+
+def base45_decodificar(texto):
+    try:
+        valores = [_VALOR_BASE45[c] for c in texto]
+    except KeyError as e:
+        raise ErrorTransferencia(f'Carácter no válido: {e}') from None
+    salida = bytearray()
+    for i in range(0, len(valores), 3):
+        grupo = valores[i:i + 3]
+        if len(grupo) == 3:
+            valor = grupo[0] + grupo[1] * 45 + grupo[2] * 2025
+            if valor > 0xFFFF:
+                raise ErrorTransferencia('Base45 fuera de rango')
+            salida += valor.to_bytes(2, 'big')
+        elif len(grupo) == 2:
+            valor = grupo[0] + grupo[1] * 45
+            if valor > 0xFF:
+                raise ErrorTransferencia('Base45 fuera de rango')
+            salida.append(valor)
+        else:
+            raise ErrorTransferencia('Longitud Base45 inválida')
+    return bytes(salida)
+
+
+def _varint(salida, valor):
+    while valor > 0x7F:
+        salida.append((valor & 0x7F) | 0x80)
+        valor >>= 7
+    salida.append(valor)
+
+
+def _leer_varint(datos, pos):
+    valor = desplazamiento = 0
+    while True:
+        byte = datos[pos]
+        pos += 1
+        valor |= (byte & 0x7F) << desplazamiento
+        if byte < 0x80:
+            return valor, pos
+        desplazamiento += 7
+
+
+def _texto(salida, texto):
+    crudo = str(texto or '').encode('utf-8')
+    _varint(salida, len(crudo))
+    salida += crudo
+
+
+def codificar_evaluacion(encabezado, datos_tocones):
+    """Empaqueta encabezado y tocones en bytes comprimidos.
+
+    Cada tocón ocupa un byte con las medidas presentes y un varint por medida
+    (en centésimas, con signo en zigzag).
+    """
+    salida = bytearray([VERSION])
+    for campo in CAMPOS_ENCABEZADO:
+        _texto(salida, encabezado.get(campo))
+    tocones = [(num, datos) for num, datos in sorted(datos_tocones.items()) if datos]
+    _varint(salida, len(tocones))
+    for num, datos in tocones:
+        _varint(salida, num)
+        presentes = 0
+        valores = []
+        for bit, campo in enumerate(CAMPOS_MEDIDAS):
+            valor = datos.get(campo)
+            if valor is not None:
+                presentes |= 1 << bit
+                entero = int(round(float(valor) * _ESCALA))
+                valores.append((entero << 1) ^ (entero >> 63))
+        salida.append(presentes)
+        for valor in valores:
+            _varint(salida, valor)
+    # Deflate crudo: sin cabecera zlib, que aquí sería redundante con el CRC
+    compresor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    return compresor.compress(bytes(salida)) + compresor.flush()
+
+
+def decodificar_evaluacion(datos):
+    """Inverso de ``codificar_evaluacion``: devuelve (encabezado, datos_tocones)."""
+    try:
+        datos = zlib.decompress(datos, -15)
+        if datos[0] != VERSION:
+            raise ErrorTransferencia(f'Versión {datos[0]} no soportada')
+        pos = 1
+        encabezado = {}
+        for campo in CAMPOS_ENCABEZADO:
+            largo, pos = _leer_varint(datos, pos)
+            encabezado[campo] = datos[pos:pos + largo].decode('utf-8')
+            pos += largo
+        encabezado['muestra'] = int(encabezado['muestra'] or 0) or None
+        num_tocones, pos = _leer_varint(datos, pos)
+        datos_tocones = {}
+        for _ in range(num_tocones):
+            num, pos = _leer_varint(datos, pos)
+            presentes = datos[pos]
+            pos += 1
+            tocon = {}
+            for bit, campo in enumerate(CAMPOS_MEDIDAS):
+                if presentes & (1 << bit):
+                    valor, pos = _leer_varint(datos, pos)
+                    tocon[campo] = ((valor >> 1) ^ -(valor & 1)) / _ESCALA
+                else:
+                    tocon[campo] = None
+            datos_tocones[num] = tocon
+    except (zlib.error, IndexError, UnicodeDecodeError, ValueError) as e:
+        if isinstance(e, ErrorTransferencia):
+            raise
+        raise ErrorTransferencia(f'Datos dañados: {e}') from e
+    return encabezado, datos_tocones
+
+
+def fragmentar(datos, caracteres_por_parte=CARACTERES_POR_PARTE):
+    """Divide los bytes en partes de texto listas para codificar en QR."""
+    identificador = f'{zlib.crc32(datos) & 0xFFFFFFFF:08X}'
+    # Bytes enteros por parte: cada 2 bytes son 3 caracteres Base45
+    bytes_por_parte = max(2, (caracteres_por_parte // 3) * 2)
+    trozos = [datos[i:i + bytes_por_parte] for i in range(0, len(datos), bytes_por_parte)] or [b'']
+    total = len(trozos)
+    return [f'{PREFIJO}:{identificador}:{seq}:{total}:'
+            f'{zlib.crc32(trozo) & 0xFFFFFFFF:08X}:{base45_codificar(trozo)}'
+            for seq, trozo in enumerate(trozos, 1)]
+
+
+def partes_evaluacion(encabezado, datos_tocones, caracteres_por_parte=CARACTERES_POR_PARTE):
+    return fragmentar(codificar_evaluacion(encabezado, datos_tocones), caracteres_por_parte)
+
+
+class Reensamblador:
+    """Junta las partes leídas (en cualquier orden) hasta tener la evaluación completa."""
+
+    def __init__(self):
+        self.identificador = None
+        self.total = None
+        self.partes = {}
+
+    def agregar(self, texto):
+        """Agrega una parte leída; devuelve True si era nueva y válida.
+
+        Las partes con CRC incorrecto lanzan ErrorTransferencia. Una parte
+        válida de otra evaluación descarta lo leído si aún estaba incompleto
+        (un QR viejo o de otra tableta leído primero no traba la lectura); con
+        la evaluación ya completa, lanza ErrorTransferencia.
+        """
+        campos = texto.strip().split(':', 5)
+        if len(campos) != 6 or campos[0] != PREFIJO:
+            raise ErrorTransferencia('No es un QR de evaluación de tocones')
+        _, identificador, seq, total, crc, contenido = campos
+        try:
+            seq, total = int(seq), int(total)
+        except ValueError:
+            raise ErrorTransferencia('Encabezado de parte inválido') from None
+        if not 1 <= seq <= total:
+            raise ErrorTransferencia('Número de parte inválido')
+        otra = identificador != self.identificador or total != self.total
+        if not otra and seq in self.partes:
+            return False
+        trozo = base45_decodificar(contenido)
+        if f'{zlib.crc32(trozo) & 0xFFFFFFFF:08X}' != crc:
+            raise ErrorTransferencia(f'Parte {seq} dañada')
+        if otra:
+            if self.completo:
+                raise ErrorTransferencia('La parte pertenece a otra evaluación')
+            # La evaluación se fija recién con una parte válida
+            self.identificador, self.total = identificador, total
+            self.partes = {}
+        self.partes[seq] = trozo
+        return True
+
+    @property
+    def completo(self):
+        return self.total is not None and len(self.partes) == self.total
+
+    def faltantes(self):
+        if self.total is None:
+            return []
+        return [seq for seq in range(1, self.total + 1) if seq not in self.partes]
+
+    def datos(self):
+        if not self.completo:
+            raise ErrorTransferencia(f'Faltan partes: {self.faltantes()}')
+        datos = b''.join(self.partes[seq] for seq in range(1, self.total + 1))
+        if f'{zlib.crc32(datos) & 0xFFFFFFFF:08X}' != self.identificador:
+            raise ErrorTransferencia('La evaluación reensamblada no coincide')
+        return datos
+
+    def evaluacion(self):
+        return decodificar_evaluacion(self.datos())
+
+
+# --- Matrices QR --------------------------------------------------------
+
+def matriz_qr(texto, borde=4):
+    """Calcula los módulos del QR (filas de bool, True = negro) sin generar imagen."""
+    import qrcode  # diferido: solo lo necesita la exportación
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=borde)
+    qr.add_data(texto)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def rgba_qr(matriz):
+    """Bytes RGBA de la matriz a un píxel por módulo, fila de arriba primero."""
+    negro, blanco = b'\x00\x00\x00\xff', b'\xff\xff\xff\xff'
+    return b''.join(negro if modulo else blanco for fila in matriz for modulo in fila)
+
+
+def png_qr(matriz, escala=8):
+    """PNG del QR ampliado ``escala`` veces; solo se usa al compartirlo."""
+    from firmas import codificar_png
+    lado = len(matriz) * escala
+    mapa = bytearray()
+    for fila in matriz:
+        linea = bytearray()
+        for modulo in fila:
+            linea += (b'\x01' if modulo else b'\x00') * escala
+        mapa += bytes(linea) * escala
+    return codificar_png(lado, lado, mapa)